@@ -0,0 +1,161 @@
+"""
+A vectorised engine for walkers in scenes without elements. Without elements the increments of a walker do not depend
+on where it is, so all increments are drawn at once, and the restart option is a renewal process: after every step
+the walker restarts with a probability of RESTART_PROBABILITY, and its location is the sum of the increments since
+its last restart. Like Simulation.run, the recorded location of a step is the location before the restart.
+"""
+import math
+from typing import Optional
+
+import numpy as np
+
+import events
+import levy
+from walker import FIFTY_PERCENT, TEN_PERCENT
+
+RESTART_PROBABILITY = TEN_PERCENT
+SUPPORTED_WALKER_TYPES = (1, 2, 3, 5, 6)  # the steps of type 4 walkers depend on their location
+AXIS_ANGLES = np.array([math.radians(0), math.radians(180), math.radians(90), math.radians(270)])
+
+
+def sample_increments(walker_type: int, num_increments: int, levy_options: Optional[dict] = None) -> np.ndarray:
+    """
+    Draws independent increments of a walker type, with the distributions of the Walker.random_walk* methods.
+
+    Parameters:
+        walker_type (int): The walker type (one of SUPPORTED_WALKER_TYPES).
+        num_increments (int): The number of increments.
+        levy_options (dict, optional): The "alpha", "min_length" and "max_length" of the steps of type 5 walkers
+            (see levy.global_lengths).
+
+    Returns:
+        np.ndarray: The increments, of shape (num_increments, 2).
+    """
+
+    if walker_type == 1:
+        angles, lengths = np.random.uniform(0, 2 * math.pi, num_increments), 1.0
+    elif walker_type == 2:
+        angles, lengths = np.random.uniform(0, 2 * math.pi, num_increments), np.random.uniform(0.5, 1.5, num_increments)
+    elif walker_type == 3:
+        angles, lengths = AXIS_ANGLES[np.random.randint(0, len(AXIS_ANGLES), num_increments)], 1.0
+    elif walker_type == 5:
+        lengths = levy.global_lengths(num_increments, **(levy_options or {}))
+        angles = np.random.uniform(0, 2 * math.pi, num_increments)
+    elif walker_type == 6:
+        angles = np.random.uniform(0, 2 * math.pi, num_increments)
+        lengths = (np.random.random(num_increments) >= FIFTY_PERCENT).astype(float)
+    else:
+        raise ValueError(f'Walker type {walker_type} is not supported by the batch engine')
+    return np.stack((lengths * np.cos(angles), lengths * np.sin(angles)), axis=-1)
+
+
+def restart_mask(num_walkers: int, num_steps: int, restart_option: bool) -> np.ndarray:
+    """
+    Draws the restarts of every walker.
+
+    Parameters:
+        num_walkers (int): The number of walkers.
+        num_steps (int): The number of steps.
+        restart_option (bool): If False, no walker restarts.
+
+    Returns:
+        np.ndarray: A bool array of shape (walkers, steps), True where the walker restarts after the step.
+    """
+
+    if not restart_option:
+        return np.zeros((num_walkers, num_steps), dtype=bool)
+    return np.random.random((num_walkers, num_steps)) < RESTART_PROBABILITY
+
+
+def segment_starts(restarts: np.ndarray) -> np.ndarray:
+    """
+    Finds, for every step, the step after which the walker last restarted before it.
+
+    Parameters:
+        restarts (np.ndarray): The restart mask of shape (walkers, steps), see restart_mask.
+
+    Returns:
+        np.ndarray: An int array of shape (walkers, steps) with the last restart step before every step, -1 if the
+        walker did not restart before it.
+    """
+
+    steps = np.arange(restarts.shape[1])
+    last_restart = np.maximum.accumulate(np.where(restarts, steps, -1), axis=1)
+    return np.concatenate((np.full((restarts.shape[0], 1), -1), last_restart[:, :-1]), axis=1)
+
+
+def renewal_paths(walker_type: int, num_walkers: int, num_steps: int, restart_option: bool,
+                  levy_options: Optional[dict] = None, dtype: type = np.float64) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Simulates the full paths of walkers that start at the origin, for when every location is needed. The increments
+    are drawn and summed in float64 whatever the dtype of the paths, so float32 paths are the float64 paths rounded
+    once, without a drift that grows with the number of steps.
+
+    Parameters:
+        walker_type (int): The walker type (one of SUPPORTED_WALKER_TYPES).
+        num_walkers (int): The number of walkers.
+        num_steps (int): The number of steps.
+        restart_option (bool): A flag indicating whether the walkers have the restart option.
+        levy_options (dict, optional): The parameters of the steps of type 5 walkers (see sample_increments).
+        dtype (type): The dtype of the paths, np.float64 or np.float32.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The paths, of shape (walkers, steps + 1, 2) and starting with the origin, and
+        the event codes of every step (see events.py), of shape (walkers, steps).
+    """
+
+    increments = sample_increments(walker_type, num_walkers * num_steps,
+                                   levy_options).reshape(num_walkers, num_steps, 2)
+    restarts = restart_mask(num_walkers, num_steps, restart_option)
+    totals = np.zeros((num_walkers, num_steps + 1, 2))
+    np.cumsum(increments, axis=1, out=totals[:, 1:])
+    starts = segment_starts(restarts) + 1
+    paths = np.zeros((num_walkers, num_steps + 1, 2), dtype=dtype)
+    paths[:, 1:] = totals[:, 1:] - np.take_along_axis(totals, starts[:, :, np.newaxis], axis=1)
+    step_events = np.where(restarts, events.EVENT_RESTART, events.EVENT_NONE).astype(np.uint8)
+    return paths, step_events
+
+
+def final_segment_lengths(num_walkers: int, num_steps: int, restart_option: bool) -> np.ndarray:
+    """
+    Samples the number of steps since the last restart at the end of the run. The gap between restarts is geometric,
+    so only the last gap has to be drawn: P(length = n) = p * (1 - p) ** (n - 1) for n < num_steps, and the rest of
+    the probability is on num_steps (no restart during the run).
+
+    Parameters:
+        num_walkers (int): The number of walkers.
+        num_steps (int): The number of steps.
+        restart_option (bool): If False, every segment is the whole run.
+
+    Returns:
+        np.ndarray: The length of the final segment of every walker.
+    """
+
+    if not restart_option:
+        return np.full(num_walkers, num_steps)
+    return np.minimum(np.random.geometric(RESTART_PROBABILITY, num_walkers), num_steps)
+
+
+def renewal_endpoints(walker_type: int, num_walkers: int, num_steps: int, restart_option: bool,
+                      levy_options: Optional[dict] = None) -> np.ndarray:
+    """
+    Simulates only the final segment of every walker, for when only the end of the paths is needed. With the
+    restart option this costs about 1 / RESTART_PROBABILITY increments per walker, whatever the number of steps.
+
+    Parameters:
+        walker_type (int): The walker type (one of SUPPORTED_WALKER_TYPES).
+        num_walkers (int): The number of walkers.
+        num_steps (int): The number of steps.
+        restart_option (bool): A flag indicating whether the walkers have the restart option.
+        levy_options (dict, optional): The parameters of the steps of type 5 walkers (see sample_increments).
+
+    Returns:
+        np.ndarray: The last location of every path, of shape (walkers, 2).
+    """
+
+    if num_steps == 0 or num_walkers == 0:
+        return np.zeros((num_walkers, 2))
+    lengths = final_segment_lengths(num_walkers, num_steps, restart_option)
+    increments = sample_increments(walker_type, int(lengths.sum()), levy_options)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return np.add.reduceat(increments, offsets, axis=0)
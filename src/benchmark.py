@@ -0,0 +1,461 @@
+"""
+A benchmark suite with fixed-seed scenarios. Every case builds a scene (empty, or heavy with a generated scenario),
+runs walkers of one type through an engine and times every stage: building the simulation ("setup"), running it
+("run"), computing the statistics of run2d ("stats", 2D only) and drawing it with Interactive ("render", only in
+the render cases and only if the GUI dependencies are installed). Every case runs in its own process, so its peak
+resident memory is its own.
+
+Usage:
+    python benchmark.py run [--suite quick|full] [--filter TEXT] [--repeat N] [--output results.json]
+    python benchmark.py compare baseline.json results.json [--threshold 0.1]
+    python benchmark.py precision [--tolerance 1e-4]
+    python benchmark.py scaling [--tolerance 3]
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import zlib
+from typing import Any, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+import helper
+import run2d
+import scenario
+import batch_engine
+import lattice_engine
+from simulation import Simulation
+from simulation3d import Simulation3d
+from walker import Walker
+from walker3d import Walker3d
+
+SUITES = ("quick", "full")
+WALKER_TYPES = (1, 2, 3, 4, 5, 6)
+SCENES = {  # the layout and the element counts of every scene, by dimension
+    "empty": ("uniform", {2: {}, 3: {}}),
+    "heavy": ("uniform", {2: {"portals": 5, "obstacles": 40, "traps": 10, "slow_zones": 10},
+                          3: {"portals": 5, "obstacles": 20, "traps": 10, "slow_zones": 10, "black_holes": 5}}),
+    "maze": ("maze", {2: {"traps": 10}, 3: {"traps": 10}}),
+    "zones": ("uniform", {2: {"traps": 10, "slow_zones": 10}, 3: {"traps": 10, "slow_zones": 10}}),
+}
+SCENE_EXTENTS = {"zones": 15.0}  # the half widths of the scenes that are not spread over the default extent
+WALKER_STEPS = {"quick": 20000, "full": 200000}  # walkers * steps of the walker type cases
+SCALING_WALKERS = {"quick": (10, 1000, 10000), "full": (10, 1000, 10000, 100000)}
+SCALING_WALKER_STEPS = {"quick": 10 ** 6, "full": 10 ** 7}  # walkers * steps of the scaling cases
+MIN_SCALING_STEPS = 10
+RENDER_WALKERS, RENDER_STEPS = 5, 50
+DEFAULT_THRESHOLD = 0.1
+MIN_STAGE_SECONDS = 0.001  # shorter stages are too noisy to be compared
+BASE_SEED = 1234
+PRECISION_TOLERANCE = 1e-4  # the largest relative drift of a float32 statistic from its float64 value
+PRECISION_SWEEP = {"num_steps": 1000, "num_steps_for_statistics": [100, 500, 1000], "num_concurrent_walkers": 50,
+                   "num_runs": 5, "portals_list": [], "obstacles_list": [], "traps_amount": 0, "slow_zone_amount": 0,
+                   "ice_option": False, "restart_option": True, "check_interactive_or_non": False}
+SCALING_CHECK_WALKERS = (10, 100, 1000, 10000, 100000)
+SCALING_CHECK_STEPS = 20
+SCALING_CHECK_WALKER_STEPS = 10 ** 5  # the smaller runs of the scaling check are repeated up to this many steps
+# the largest ratio between the per-step costs of the scaling check. The cost of a step grows by up to about 2x from
+# 10 to 10^5 walkers as the walkers stop fitting in the CPU caches, which is accepted; membership lookups that scan
+# the walkers grow by orders of magnitude
+SCALING_TOLERANCE = 3.0
+PRECISION_CASES = {  # the engine settings of the precision sweeps
+    "batch-t2": {"walker_type": 2, "batch_engine": True},
+    "batch-t5": {"walker_type": 5, "batch_engine": True},
+    "lattice-t3-traps": {"walker_type": 3, "lattice_engine": True, "traps_amount": 3},
+    "simulation-t1-traps": {"walker_type": 1, "traps_amount": 2, "slow_zone_amount": 2},
+}
+
+
+def benchmark_cases(suite: str) -> list[dict[str, Any]]:
+    """
+    Lists the cases of a suite.
+
+    Parameters:
+        suite (str): "quick" or "full" (more walker steps and up to 10^5 walkers).
+
+    Returns:
+        list[dict[str, Any]]: The cases, with their "name", "engine", "dimension", "walker_type", "scene",
+        "num_walkers", "num_steps" and "stages". The lattice cases use a maze scene, which has only
+        obstacles and traps. The zones scaling cases run among traps and slow zones that cover the origin, so
+        every step looks up the trap and slow zone membership of its walker. The endpoints cases run the batch engine of an "endpoint_stats" sweep, which only
+        simulates the final segment since the last restart of every walker.
+    """
+
+    cases = []
+
+    def add(engine: str, dimension: int, walker_type: int, scene: str, num_walkers: int, num_steps: int,
+            stages: tuple = ("setup", "run")) -> None:
+        name = f'{engine}-{dimension}d-t{walker_type}-{scene}-w{num_walkers}-s{num_steps}'
+        cases.append({"name": name, "engine": engine, "dimension": dimension, "walker_type": walker_type,
+                      "scene": scene, "num_walkers": num_walkers, "num_steps": num_steps, "stages": stages})
+
+    for dimension in (2, 3):
+        stages = ("setup", "run", "stats") if dimension == 2 else ("setup", "run")
+        for walker_type in WALKER_TYPES:
+            for scene in ("empty", "heavy"):
+                add("simulation", dimension, walker_type, scene, 10, WALKER_STEPS[suite] // 10, stages)
+    for num_walkers in SCALING_WALKERS[suite]:
+        num_steps = max(MIN_SCALING_STEPS, SCALING_WALKER_STEPS[suite] // num_walkers)
+        add("simulation", 2, 1, "empty", num_walkers, num_steps)
+        add("batch", 2, 1, "empty", num_walkers, num_steps)
+        add("endpoints", 2, 1, "empty", num_walkers, num_steps)
+        add("lattice", 2, 3, "maze", num_walkers, num_steps)
+        add("simulation", 2, 1, "zones", num_walkers, num_steps)
+    add("simulation", 2, 1, "heavy", RENDER_WALKERS, RENDER_STEPS, ("setup", "run", "render"))
+    return cases
+
+
+def case_seed(name: str) -> int:
+    """returns the fixed seed of a case"""
+    return BASE_SEED + zlib.crc32(name.encode())
+
+
+def build_simulation(case: dict[str, Any]):
+    """
+    Builds the simulation of a case, with the elements of its scene.
+
+    Parameters:
+        case (dict[str, Any]): The case (see benchmark_cases).
+
+    Returns:
+        Simulation or Simulation3d: The simulation.
+    """
+
+    dimension, walker_type = case["dimension"], case["walker_type"]
+    layout, counts = SCENES[case["scene"]]
+    elements = scenario.generate_scenario(dimension, counts[dimension], layout, case_seed(case["name"]),
+                                          SCENE_EXTENTS.get(case["scene"])).elements()
+    if dimension == 2:
+        walkers = [Walker(walker_type, True) for _ in range(case["num_walkers"])]
+        return Simulation(walkers, elements["portals"], elements["obstacles"], elements["traps"],
+                          elements["slow_zones"], case["num_steps"], False)
+    walkers = [Walker3d(walker_type, True) for _ in range(case["num_walkers"])]
+    return Simulation3d(walkers, elements["portals"], elements["obstacles"], [], elements["traps"],
+                        elements["slow_zones"], elements["black_holes"], case["num_steps"], False)
+
+
+def run_stages(case: dict[str, Any]) -> dict[str, float]:
+    """
+    Runs the stages of a case once.
+
+    Parameters:
+        case (dict[str, Any]): The case (see benchmark_cases).
+
+    Returns:
+        dict[str, float]: The duration of every stage, in seconds.
+    """
+
+    seed = case_seed(case["name"])
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    times = {}
+    start = time.perf_counter()
+    simulation = build_simulation(case)
+    times["setup"] = time.perf_counter() - start
+    start = time.perf_counter()
+    if case["engine"] == "batch":
+        paths, step_events = batch_engine.renewal_paths(case["walker_type"], case["num_walkers"], case["num_steps"],
+                                                        True)
+    elif case["engine"] == "endpoints":
+        paths = batch_engine.renewal_endpoints(case["walker_type"], case["num_walkers"], case["num_steps"], True)
+    elif case["engine"] == "lattice":
+        paths, step_events = lattice_engine.lattice_paths(case["num_walkers"], case["num_steps"], True,
+                                                          simulation.boxes, simulation.traps)
+    else:
+        paths = simulation.run()
+        step_events = simulation.events
+    times["run"] = time.perf_counter() - start
+    if "stats" in case["stages"]:
+        start = time.perf_counter()
+        if case["engine"] == "endpoints":
+            run2d.calculate_endpoint_stats(paths, run2d.new_stats(True), case["num_steps"])
+        else:
+            run2d.calculate_stats(paths, run2d.new_stats(), case["num_steps"], step_events)
+        times["stats"] = time.perf_counter() - start
+    if "render" in case["stages"]:
+        try:
+            from interactive import Interactive
+        except ImportError:
+            return times
+        render_simulation = build_simulation(case)
+        start = time.perf_counter()
+        Interactive(render_simulation).plot_walk()
+        times["render"] = time.perf_counter() - start
+    return times
+
+
+def peak_rss_mb() -> Optional[float]:
+    """returns the peak resident memory of the process in MiB, None where it is not available"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10  # bytes on macOS, KiB elsewhere
+
+
+def run_case(case: dict[str, Any], repeat: int) -> dict[str, Any]:
+    """
+    Runs a case repeatedly in this process and keeps the fastest time of every stage.
+
+    Parameters:
+        case (dict[str, Any]): The case (see benchmark_cases).
+        repeat (int): The number of repetitions.
+
+    Returns:
+        dict[str, Any]: The "stages" times, the "walker_steps_per_second" of the run stage and the "peak_rss_mb".
+    """
+
+    stages: dict[str, float] = {}
+    for _ in range(repeat):
+        for stage, seconds in run_stages(case).items():
+            stages[stage] = min(seconds, stages.get(stage, seconds))
+    walker_steps = case["num_walkers"] * case["num_steps"]
+    return {"stages": stages, "walker_steps_per_second": walker_steps / max(stages["run"], 1e-9),
+            "peak_rss_mb": peak_rss_mb(), "num_walkers": case["num_walkers"], "num_steps": case["num_steps"]}
+
+
+def run_suite(suite: str, name_filter: str = "", repeat: int = 1) -> dict[str, Any]:
+    """
+    Runs every case of a suite whose name contains the filter, each in a new process.
+
+    Parameters:
+        suite (str): "quick" or "full".
+        name_filter (str): Only the cases whose name contains it are run.
+        repeat (int): The number of repetitions of every case.
+
+    Returns:
+        dict[str, Any]: The "metadata" of the run and the "results" of every case, keyed by the case name.
+    """
+
+    results = {}
+    environment = {**os.environ, "MPLBACKEND": "Agg"}
+    for case in benchmark_cases(suite):
+        if name_filter not in case["name"]:
+            continue
+        command = [sys.executable, os.path.abspath(__file__), "case", case["name"], "--suite", suite,
+                   "--repeat", str(repeat)]
+        completed = subprocess.run(command, capture_output=True, text=True, env=environment,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        if completed.returncode != 0:
+            print(f'{case["name"]}: failed\n{completed.stderr}', file=sys.stderr)
+            continue
+        results[case["name"]] = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(format_result(case["name"], results[case["name"]]))
+    return {"metadata": run_metadata(suite, repeat), "results": results}
+
+
+def run_metadata(suite: str, repeat: int) -> dict[str, Any]:
+    """returns the suite, the environment and the git commit of a benchmark run"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"suite": suite, "repeat": repeat, "commit": commit, "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def format_result(name: str, result: dict[str, Any]) -> str:
+    """returns a single line summary of the result of a case"""
+    stages = ", ".join(f'{stage} {seconds * 1000:.1f}ms' for stage, seconds in result["stages"].items())
+    rss = "" if result["peak_rss_mb"] is None else f', {result["peak_rss_mb"]:.0f}MiB'
+    return f'{name}: {result["walker_steps_per_second"]:,.0f} steps/s ({stages}{rss})'
+
+
+def compare_results(baseline: dict[str, Any], current: dict[str, Any],
+                    threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """
+    Compares two benchmark runs (as saved by the run command).
+
+    Parameters:
+        baseline (dict[str, Any]): The reference run.
+        current (dict[str, Any]): The run to check.
+        threshold (float): The relative slowdown (or memory growth) above which a case regressed.
+
+    Returns:
+        list[str]: A description of every regression, empty if nothing regressed.
+    """
+
+    regressions = []
+    for name, result in current["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        for stage, seconds in result["stages"].items():
+            reference_seconds = reference["stages"].get(stage)
+            if reference_seconds is None or max(seconds, reference_seconds) < MIN_STAGE_SECONDS:
+                continue
+            if seconds > reference_seconds * (1 + threshold):
+                regressions.append(f'{name}: {stage} took {seconds * 1000:.1f}ms, '
+                                   f'{seconds / reference_seconds - 1:+.0%} against {reference_seconds * 1000:.1f}ms')
+        if None not in (result["peak_rss_mb"], reference["peak_rss_mb"]) and \
+                result["peak_rss_mb"] > reference["peak_rss_mb"] * (1 + threshold):
+            regressions.append(f'{name}: peak RSS {result["peak_rss_mb"]:.0f}MiB, '
+                               f'{result["peak_rss_mb"] / reference["peak_rss_mb"] - 1:+.0%} against '
+                               f'{reference["peak_rss_mb"]:.0f}MiB')
+    return regressions
+
+
+def membership_scaling(dimension: int, walker_counts: tuple = SCALING_CHECK_WALKERS,
+                       num_steps: int = SCALING_CHECK_STEPS) -> dict[int, float]:
+    """
+    Measures the cost of a walker step among traps and slow zones (the zones scene) for growing numbers of walkers.
+    The trap and slow zone membership of the walkers is looked up in the WalkerStore of the simulation, so the cost
+    of a step should not depend on the number of walkers.
+
+    Parameters:
+        dimension (int): 2 or 3.
+        walker_counts (tuple): The numbers of walkers.
+        num_steps (int): The number of steps of every run.
+
+    Returns:
+        dict[int, float]: The fastest time of a walker step, in seconds, by the number of walkers.
+    """
+
+    costs = {}
+    for num_walkers in walker_counts:
+        case = {"name": f'scaling-{dimension}d-zones-w{num_walkers}', "engine": "simulation",
+                "dimension": dimension, "walker_type": 1, "scene": "zones", "num_walkers": num_walkers,
+                "num_steps": num_steps, "stages": ("setup", "run")}
+        repeat = max(1, SCALING_CHECK_WALKER_STEPS // (num_walkers * num_steps))
+        costs[num_walkers] = min(run_stages(case)["run"] for _ in range(repeat)) / (num_walkers * num_steps)
+    return costs
+
+
+def sweep_stats(config: dict[str, Any], seed: int) -> tuple[dict[str, dict[int, float]], int]:
+    """
+    Runs the sweep of a non-interactive configuration with a seed, without exporting it.
+
+    Parameters:
+        config (dict[str, Any]): The configuration of the sweep.
+        seed (int): The seed of random and np.random.
+
+    Returns:
+        tuple[dict[str, dict[int, float]], int]: The statistics, and the bytes of the paths of the largest N.
+    """
+
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    stats = run2d.new_stats()
+    path_bytes = 0
+    for num_steps in config["num_steps_for_statistics"]:
+        paths, step_events = [], []
+        for _ in range(config["num_runs"]):
+            run_paths, run_events = run2d.simulate_run(config, num_steps)
+            paths += run_paths
+            step_events.append(run_events)
+        path_bytes = max(path_bytes, helper.paths_to_array(paths).nbytes)
+        run2d.calculate_stats(paths, stats, num_steps, np.concatenate(step_events))
+    return stats, path_bytes
+
+
+def precision_drift(config: dict[str, Any], seed: int = BASE_SEED) -> tuple[dict[str, float], int, int]:
+    """
+    Runs a sweep in float64 and in float32 with the same seed, and measures how far the float32 statistics drift.
+    The engines draw the same numbers in both precisions, so the difference is only the rounding of the paths.
+
+    Parameters:
+        config (dict[str, Any]): The configuration of the sweep.
+        seed (int): The seed of random and np.random.
+
+    Returns:
+        tuple[dict[str, float], int, int]: The largest relative drift of every statistic over the N values, and the
+        bytes of the float64 and the float32 paths of the largest N.
+    """
+
+    reference, reference_bytes = sweep_stats({**config, "precision": "float64"}, seed)
+    stats, path_bytes = sweep_stats({**config, "precision": "float32"}, seed)
+    drifts = {}
+    for name, values in reference.items():
+        drift = 0.0
+        for num_steps, value in values.items():
+            other = stats[name].get(num_steps, math.nan)
+            if math.isnan(value) and math.isnan(other):
+                continue
+            drift = max(drift, abs(other - value) / max(abs(value), 1e-12))
+        drifts[name] = drift
+    return drifts, reference_bytes, path_bytes
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Runs the benchmark suite or compares two of its runs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the suite and save the results as JSON")
+    run_parser.add_argument("--suite", default="quick", choices=SUITES)
+    run_parser.add_argument("--filter", default="", help="only run the cases whose name contains this text")
+    run_parser.add_argument("--repeat", type=int, default=1)
+    run_parser.add_argument("--output", default="benchmark_results.json")
+    compare_parser = commands.add_parser("compare", help="flag the regressions of a run against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    precision_parser = commands.add_parser("precision", help="check the drift of float32 sweeps against float64")
+    precision_parser.add_argument("--tolerance", type=float, default=PRECISION_TOLERANCE)
+    scaling_parser = commands.add_parser("scaling", help="check that the cost of a step among traps and slow zones "
+                                                         "does not grow with the number of walkers")
+    scaling_parser.add_argument("--tolerance", type=float, default=SCALING_TOLERANCE)
+    case_parser = commands.add_parser("case", help="run a single case in this process and print its result")
+    case_parser.add_argument("name")
+    case_parser.add_argument("--suite", default="quick", choices=SUITES)
+    case_parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run_suite(args.suite, args.filter, args.repeat)
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f'saved {len(results["results"])} results to {args.output}')
+    elif args.command == "compare":
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        with open(args.current) as file:
+            current = json.load(file)
+        regressions = compare_results(baseline, current, args.threshold)
+        for regression in regressions:
+            print(regression)
+        print(f'{len(regressions)} regressions beyond {args.threshold:.0%}')
+        return 1 if regressions else 0
+    elif args.command == "precision":
+        failures = 0
+        for name, settings in PRECISION_CASES.items():
+            drifts, reference_bytes, path_bytes = precision_drift({**PRECISION_SWEEP, **settings})
+            worst = max(drifts, key=drifts.get)
+            failed = [stat for stat, drift in drifts.items() if drift > args.tolerance]
+            failures += len(failed)
+            print(f'{name}: paths {reference_bytes / 2 ** 20:.1f}MiB -> {path_bytes / 2 ** 20:.1f}MiB, '
+                  f'largest drift {drifts[worst]:.2e} ({worst}){"" if not failed else ", FAILED: " + ", ".join(failed)}')
+        print(f'{failures} statistics drifted beyond {args.tolerance:.0e}')
+        return 1 if failures else 0
+    elif args.command == "scaling":
+        failures = 0
+        for dimension in (2, 3):
+            costs = membership_scaling(dimension)
+            ratio = max(costs.values()) / min(costs.values())
+            failed = ratio > args.tolerance
+            failures += failed
+            print(f'{dimension}d: ' + ", ".join(f'{num_walkers} walkers {cost * 1e6:.1f}us'
+                                                 for num_walkers, cost in costs.items()) +
+                  f' per step, ratio {ratio:.2f}{", FAILED" if failed else ""}')
+        print(f'{failures} dimensions scaled beyond {args.tolerance:g}x')
+        return 1 if failures else 0
+    else:
+        cases = {case["name"]: case for case in benchmark_cases(args.suite)}
+        if args.name not in cases:
+            print(f'Unknown case: {args.name}', file=sys.stderr)
+            return 1
+        print(json.dumps(run_case(cases[args.name], args.repeat)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
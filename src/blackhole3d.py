@@ -1,6 +1,7 @@
 import numpy as np
 
 import helper
+import walker3d
 
 GRAVITY_FORCE = 6.674 * (10 ** -11)
 WALKER_MASS = 1e-14
@@ -11,6 +12,20 @@ FORCE_THRESHOLD = 0.01  # This is the threshold for the gravitational force that
 SMALL_CONSTANT = 1e-9
 
 
+def horizon_squared(mass: float) -> float:
+    """
+    Solves G * (m1 * m2) / (r^2 + SMALL_CONSTANT) > FORCE_THRESHOLD for r^2, so the event horizon test is a single
+    comparison of the squared distance.
+
+    Parameters:
+        mass (float): The mass of the black hole.
+
+    Returns:
+        float: The squared distance below which the force is greater than the threshold.
+    """
+    return (GRAVITY_FORCE * WALKER_MASS * mass) / FORCE_THRESHOLD - SMALL_CONSTANT
+
+
 class BlackHole3d:
     """
     The BlackHole3d class represents a black hole in a 3D simulation.
@@ -19,21 +34,42 @@ class BlackHole3d:
         center_loc (tuple[float, float, float]): The location of the center of the black hole.
         radius (float): The radius of the black hole.
         mass (float): The mass of the black hole.
+        radius_squared (float): The squared radius of the black hole, computed by `invalidate`.
+        horizon_radius (float): The radius of the event horizon zone, computed by `invalidate`.
+        horizon_squared (float): The squared distance below which a location is in the event horizon zone,
+            computed by `invalidate`.
     """
 
-    def __init__(self)->None:
+    def __init__(self, center_loc=None, radius=VISUAL_BLACK_HOLE_RADIUS, mass=BLACK_HOLE_MASS) -> None:
+        """
+        Constructs a new BlackHole3d instance, by default with a random location, a predefined radius, and a
+        predefined mass.
+
+        Parameters:
+            center_loc (tuple[float, float, float], optional): The center location of the black hole. If not provided, a random location is generated.
+            radius (float): The radius of the black hole.
+            mass (float): The mass of the black hole.
+        """
+        self.center_loc = helper.generate_random_coordinate_3d() if center_loc is None else center_loc
+        self.radius = radius
+        self.mass = mass
+        self.invalidate()
+
+    def invalidate(self) -> None:
         """
-        Constructs a new BlackHole3d instance with a random location, a predefined radius, and a predefined mass.
+        Recomputes the cached squared radius and event horizon radius. Has to be called whenever the radius or the
+        mass of the black hole changes.
         """
-        self.center_loc = helper.generate_random_coordinate_3d()
-        self.radius = VISUAL_BLACK_HOLE_RADIUS
-        self.mass = BLACK_HOLE_MASS
+        self.radius_squared = self.radius ** 2
+        self.horizon_radius = np.sqrt((GRAVITY_FORCE * WALKER_MASS * self.mass) / FORCE_THRESHOLD)
+        self.horizon_squared = horizon_squared(self.mass)
 
     def is_in_horizon_event_zone(self, location: tuple[float, float, float]) -> bool:
         """
         Checks if a given location is in the event horizon zone of the black hole. the
         event horizon zone is the zone where the gravitational force is greater than the threshold.
-        and being determined by the formula F = G * (m1 * m2) / r^2
+        and being determined by the formula F = G * (m1 * m2) / r^2. since the threshold is constant, this is a
+        comparison of the squared distance against the cached `horizon_squared`.
 
         Parameters:
             location (tuple[float, float, float]): The location to check.
@@ -42,19 +78,74 @@ class BlackHole3d:
             bool: True if the location is in the event horizon zone, False otherwise.
         """
 
-        dx, dy, dz = np.subtract(location, self.center_loc)
-        distance = np.sqrt(dx ** 2 + dy ** 2 + dz ** 2)
-        # Calculate the gravitational force using the formula F = G * (m1 * m2) / r^2
-        force = (GRAVITY_FORCE * WALKER_MASS * self.mass) / (distance ** 2+SMALL_CONSTANT)
-        return force > FORCE_THRESHOLD
+        x, y, z = location
+        center_x, center_y, center_z = self.center_loc
+        return (x - center_x) ** 2 + (y - center_y) ** 2 + (z - center_z) ** 2 < self.horizon_squared
 
     def calculate_horizon_event_radius(self) -> float:
         """
-        Calculates the radius of the event horizon zone of the black hole with
+        Returns the radius of the event horizon zone of the black hole, cached by `invalidate` with
         the formula r = sqrt((G * m1 * m2) / F).
 
         Returns:
             float: The radius of the event horizon zone.
         """
-        return np.sqrt((GRAVITY_FORCE * WALKER_MASS * self.mass) / FORCE_THRESHOLD)
+        return self.horizon_radius
+
+
+class BlackHoleKernel:
+    """
+    The BlackHoleKernel class checks the event horizons of all black holes for many walkers at once, and pulls every
+    captured walker towards its black hole in a single batched step (the batched form of
+    Walker3d.step_towards_location).
+
+    Attributes:
+        centers (np.ndarray): The centers of the black holes, of shape (black holes, 3).
+        horizons_squared (np.ndarray): The squared event horizon radii (see horizon_squared), of shape (black holes,).
+    """
+
+    def __init__(self, black_holes: list[BlackHole3d]) -> None:
+        """
+        Constructs a new BlackHoleKernel instance from the cached geometry of the black holes.
+
+        Parameters:
+            black_holes (list[BlackHole3d]): The black holes, in the order they are checked by the simulation.
+        """
+        self.centers = np.array([black_hole.center_loc for black_hole in black_holes], dtype=float).reshape(-1, 3)
+        self.horizons_squared = np.array([black_hole.horizon_squared for black_hole in black_holes], dtype=float)
+
+    def captures(self, locations: np.ndarray) -> np.ndarray:
+        """
+        Finds the first black hole whose event horizon contains every location.
+
+        Parameters:
+            locations (np.ndarray): The current locations of the walkers, of shape (walkers, 3).
+
+        Returns:
+            np.ndarray: The index of the capturing black hole of every walker, or -1 if it is outside every horizon.
+        """
+        distances_squared = ((locations[:, np.newaxis, :] - self.centers) ** 2).sum(axis=2)
+        inside = distances_squared < self.horizons_squared
+        if inside.shape[1] == 0:
+            return np.full(len(locations), -1)
+        return np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+
+    def pull(self, locations: np.ndarray, step_size: float = walker3d.UNIT) -> np.ndarray:
+        """
+        Moves every captured walker a single step towards the center of its black hole.
 
+        Parameters:
+            locations (np.ndarray): The current locations of the walkers, of shape (walkers, 3).
+            step_size (float): The length of the step (shorter if the center is closer).
+
+        Returns:
+            np.ndarray: The pulled locations, of shape (walkers, 3), NaN for walkers outside every horizon.
+        """
+        holes = self.captures(locations)
+        captured = holes >= 0
+        pulled = np.full(locations.shape, np.nan)
+        offsets = self.centers[holes[captured]] - locations[captured]
+        distances = np.sqrt((offsets ** 2).sum(axis=1)) + SMALL_CONSTANT
+        step_sizes = np.minimum(distances, step_size)
+        pulled[captured] = locations[captured] + offsets / distances[:, np.newaxis] * step_sizes[:, np.newaxis]
+        return pulled
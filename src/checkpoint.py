@@ -0,0 +1,196 @@
+"""
+Checkpoints of non-interactive sweeps. A sweep runs num_runs simulations for every N of num_steps_for_statistics, and
+creates a new simulation (with new walkers and elements) for every run, so between two runs its whole state is:
+    the sweep cursor     the index of the current N and the number of its finished runs
+    the results          the paths and event codes of the finished runs of the current N, the statistics of the
+                         finished N values and the occupancy grid
+    the RNG states       of random and np.random, which every engine draws from (the Lévy streams of the walkers are
+                         seeded from np.random)
+A SweepState saved between two runs is therefore enough to continue the sweep bit-identically: the resumed sweep draws
+the same elements and steps as the interrupted one would have. The state is saved as a compressed .npz file, written
+to a temporary file next to the checkpoint and moved over it with os.replace, so an interruption while saving leaves
+the previous checkpoint intact.
+"""
+import json
+import math
+import os
+import random
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+import helper
+from occupancy import OccupancyGrid
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_INTERVAL = 60.0  # the default minimal seconds between two checkpoints
+
+
+def rng_arrays() -> dict[str, np.ndarray]:
+    """returns the states of random and np.random as arrays"""
+    version, internal_state, gauss_next = random.getstate()
+    name, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+    return {
+        "rng_python_version": np.asarray(version),
+        "rng_python_state": np.asarray(internal_state, dtype=np.uint32),
+        "rng_python_gauss": np.asarray(math.nan if gauss_next is None else gauss_next),
+        "rng_numpy_keys": keys,
+        "rng_numpy_meta": np.asarray([position, has_gauss]),
+        "rng_numpy_gauss": np.asarray(cached_gaussian),
+    }
+
+
+def restore_rng(arrays: dict[str, np.ndarray]) -> None:
+    """sets the states of random and np.random to the states exported by rng_arrays"""
+    gauss_next = float(arrays["rng_python_gauss"])
+    random.setstate((int(arrays["rng_python_version"]), tuple(arrays["rng_python_state"].tolist()),
+                     None if math.isnan(gauss_next) else gauss_next))
+    position, has_gauss = arrays["rng_numpy_meta"].tolist()
+    np.random.set_state(("MT19937", arrays["rng_numpy_keys"], position, has_gauss, float(arrays["rng_numpy_gauss"])))
+
+
+class SweepState:
+    """
+    The SweepState class is the state of a non-interactive sweep between two runs.
+
+    Attributes:
+        config (dict[str, Any]): The configuration of the sweep.
+        stats (dict[str, dict[int, float]]): The statistics of the finished N values.
+        step_index (int): The index of the current N in num_steps_for_statistics.
+        run_index (int): The number of finished runs of the current N.
+        paths (list): The paths of the finished runs of the current N.
+        step_events (list[np.ndarray]): The event codes of the finished runs of the current N.
+        occupancy (Optional[OccupancyGrid]): The occupancy grid, if the sweep has one.
+        rng (dict[str, np.ndarray]): The RNG states (see rng_arrays), set when the state is saved or loaded.
+    """
+
+    def __init__(self, config: dict[str, Any], stats: dict[str, dict[int, float]], step_index: int, run_index: int,
+                 paths: list, step_events: list, occupancy: Optional[OccupancyGrid] = None) -> None:
+        """
+        Constructs a new SweepState instance.
+
+        Parameters:
+            config (dict[str, Any]): The configuration of the sweep.
+            stats (dict[str, dict[int, float]]): The statistics of the finished N values.
+            step_index (int): The index of the current N in num_steps_for_statistics.
+            run_index (int): The number of finished runs of the current N.
+            paths (list): The paths of the finished runs of the current N.
+            step_events (list[np.ndarray]): The event codes of the finished runs of the current N.
+            occupancy (OccupancyGrid, optional): The occupancy grid, if the sweep has one.
+        """
+        self.config = config
+        self.stats = stats
+        self.step_index = step_index
+        self.run_index = run_index
+        self.paths = paths
+        self.step_events = step_events
+        self.occupancy = occupancy
+        self.rng: dict[str, np.ndarray] = {}
+
+    def steps_done(self) -> tuple[int, int]:
+        """returns the number of walker steps and of runs of the sweep that are done"""
+        steps = self.config["num_steps_for_statistics"]
+        runs, walkers = self.config["num_runs"], self.config["num_concurrent_walkers"]
+        walker_steps = (sum(steps[:self.step_index]) * runs + steps[self.step_index] * self.run_index) * walkers \
+            if self.step_index < len(steps) else sum(steps) * runs * walkers
+        return walker_steps, self.step_index * runs + self.run_index
+
+    def save(self, path: str) -> None:
+        """
+        Saves the state and the current RNG states to a checkpoint file, replacing it atomically.
+
+        Parameters:
+            path (str): The path of the checkpoint file.
+        """
+        steps = self.config["num_steps_for_statistics"]
+        num_steps = steps[min(self.step_index, len(steps) - 1)]
+        self.rng = rng_arrays()
+        arrays = {
+            "version": np.asarray(CHECKPOINT_VERSION),
+            "config": np.asarray(json.dumps(self.config)),
+            "stats": np.asarray(json.dumps(self.stats)),
+            "cursor": np.asarray([self.step_index, self.run_index]),
+            "paths": helper.paths_to_array(self.paths).reshape(-1, num_steps + 1, 2),
+            "step_events": np.concatenate(self.step_events) if self.step_events else
+            np.zeros((0, num_steps), dtype=np.uint8),
+            **self.rng,
+        }
+        if self.occupancy is not None:
+            arrays.update({f"occupancy_{key}": value for key, value in self.occupancy.to_arrays().items()})
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as file:
+            np.savez_compressed(file, **arrays)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'SweepState':
+        """
+        Loads a state that was saved with `save`. The RNG states are loaded into `rng`, and are not restored.
+
+        Parameters:
+            path (str): The path of the checkpoint file.
+
+        Returns:
+            SweepState: The loaded state.
+        """
+        with np.load(path) as data:
+            if int(data["version"]) != CHECKPOINT_VERSION:
+                raise ValueError(f'{path} is a checkpoint of version {int(data["version"])}, '
+                                 f'expected {CHECKPOINT_VERSION}')
+            stats = {name: {int(num_steps): value for num_steps, value in stat.items()}
+                     for name, stat in json.loads(str(data["stats"])).items()}
+            occupancy = None
+            if "occupancy_counts" in data:
+                occupancy = OccupancyGrid.from_arrays({key[len("occupancy_"):]: data[key] for key in data.files
+                                                       if key.startswith("occupancy_")})
+            step_index, run_index = data["cursor"].tolist()
+            config = json.loads(str(data["config"]))
+            walkers, step_events = config["num_concurrent_walkers"], data["step_events"]
+            state = cls(config, stats, step_index, run_index, list(data["paths"]),
+                        [step_events[start:start + walkers] for start in range(0, len(step_events), walkers)],
+                        occupancy)
+            state.rng = {key: data[key] for key in data.files if key.startswith("rng_")}
+        return state
+
+
+class Checkpointer:
+    """
+    The Checkpointer class saves the state of a sweep after a run when the interval since the last save has passed.
+
+    Attributes:
+        path (str): The path of the checkpoint file.
+        interval (float): The minimal seconds between two checkpoints.
+        last_save (float): The time of the last checkpoint.
+    """
+
+    def __init__(self, path: str, interval: float = CHECKPOINT_INTERVAL) -> None:
+        """
+        Constructs a new Checkpointer instance.
+
+        Parameters:
+            path (str): The path of the checkpoint file.
+            interval (float): The minimal seconds between two checkpoints.
+        """
+        self.path = path
+        self.interval = interval
+        self.last_save = time.monotonic()
+
+    def run_finished(self, state: SweepState) -> bool:
+        """
+        Saves the state of the sweep after a run, if the interval has passed.
+
+        Parameters:
+            state (SweepState): The state after the run.
+
+        Returns:
+            bool: True if the state was saved.
+        """
+        if time.monotonic() - self.last_save < self.interval:
+            return False
+        state.save(self.path)
+        self.last_save = time.monotonic()
+        return True
+
@@ -0,0 +1,435 @@
+"""
+A local cluster mode for non-interactive sweeps, built on the standard library: a coordinator hands out the runs of a
+sweep as jobs over TCP, and workers on any number of machines run them (with run2d.simulate_run) and send back the
+partial statistics of their runs (see partial_stats.py), which the coordinator merges into one results table.
+
+The messages are JSON objects, each prefixed by its length as a 4-byte big-endian integer. A worker says "hello", gets
+the configuration, and then asks for jobs with "request" until it is told "done". While a job runs, the worker sends a
+"heartbeat" every HEARTBEAT_INTERVAL seconds, and it ends the job with a "result". The coordinator
+    - retries lost jobs: a job goes back to the queue when its worker disconnects or misses its heartbeats for
+      heartbeat_timeout seconds, and the sweep fails once a job was lost max_attempts times
+    - lets idle workers steal work: when the queue is empty, an idle worker gets a copy of the running job with the
+      fewest copies that started first, the first result wins and the other copies are ignored
+Every run has a seed drawn from the coordinator's RNG, and the partial statistics are merged in run order, so the
+results do not depend on which worker ran which job.
+
+Usage:
+    python cluster.py coordinator config.json --port 5757 --local-workers 4
+    python cluster.py worker --host <coordinator host> --port 5757
+"""
+import argparse
+import json
+import random
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Optional
+
+import numpy as np
+
+from levy import SEED_BOUND
+from partial_stats import PartialStats
+
+HEADER = struct.Struct('!I')
+DEFAULT_PORT = 5757
+HEARTBEAT_INTERVAL = 1.0  # the seconds between two heartbeats of a worker running a job
+HEARTBEAT_TIMEOUT = 10.0  # a worker that was silent for this many seconds is lost
+MAX_ATTEMPTS = 3  # the number of times a job may be lost before the sweep fails
+WAIT_SECONDS = 0.2  # how long a worker waits before asking again when there is no job for it
+
+
+def recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    """returns the next size bytes of a socket, None if it was closed before"""
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def send_message(sock: socket.socket, message: dict[str, Any], lock: Optional[threading.Lock] = None) -> None:
+    """
+    Sends a message, as its length followed by its JSON.
+
+    Parameters:
+        sock (socket.socket): The socket.
+        message (dict[str, Any]): The message.
+        lock (threading.Lock, optional): A lock of the socket, for sockets that several threads send on.
+    """
+    data = json.dumps(message).encode()
+    if lock is None:
+        sock.sendall(HEADER.pack(len(data)) + data)
+        return
+    with lock:
+        sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def recv_message(sock: socket.socket) -> Optional[dict[str, Any]]:
+    """returns the next message of a socket, None if it was closed"""
+    header = recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    data = recv_exactly(sock, HEADER.unpack(header)[0])
+    return None if data is None else json.loads(data)
+
+
+class Job:
+    """
+    The Job class is a run of the sweep.
+
+    Attributes:
+        job_id (int): The index of the job.
+        step_index (int): The index of its N in num_steps_for_statistics.
+        num_steps (int): Its N.
+        run_index (int): The index of the run among the runs of its N.
+        seed (int): The seed of random and np.random for the run.
+        attempts (int): The number of times the job was lost.
+        workers (set[str]): The workers running a copy of the job.
+        started (float): The time the first running copy was started.
+        done (bool): True once a result was received.
+    """
+
+    def __init__(self, job_id: int, step_index: int, num_steps: int, run_index: int, seed: int) -> None:
+        self.job_id = job_id
+        self.step_index = step_index
+        self.num_steps = num_steps
+        self.run_index = run_index
+        self.seed = seed
+        self.attempts = 0
+        self.workers: set[str] = set()
+        self.started = 0.0
+        self.done = False
+
+    def message(self) -> dict[str, Any]:
+        """returns the job message for a worker"""
+        return {"type": "job", "job_id": self.job_id, "num_steps": self.num_steps, "seed": self.seed}
+
+
+class CoordinatorHandler(socketserver.BaseRequestHandler):
+    """The connection of a worker to the coordinator, it serves the requests of the worker until it disconnects"""
+
+    def handle(self) -> None:
+        coordinator = self.server.coordinator
+        hello = recv_message(self.request)
+        if hello is None or hello.get("type") != "hello":
+            return
+        worker_id = coordinator.register(hello.get("name", "worker"), self.request)
+        try:
+            send_message(self.request, {"type": "config", "config": coordinator.config})
+            while True:
+                message = recv_message(self.request)
+                if message is None:
+                    break
+                coordinator.touch(worker_id)
+                if message["type"] == "request":
+                    reply = coordinator.assign(worker_id)
+                    send_message(self.request, reply)
+                    if reply["type"] == "done":
+                        break
+                elif message["type"] == "result":
+                    coordinator.record_result(worker_id, message["job_id"],
+                                              PartialStats.from_message(message["partial"]))
+        except OSError:
+            pass
+        finally:
+            coordinator.lose_worker(worker_id)
+
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    """The TCP server of the coordinator, with a thread for every worker connection"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class Coordinator:
+    """
+    The Coordinator class distributes the runs of a sweep to workers, and merges their partial statistics.
+
+    Attributes:
+        config (dict[str, Any]): The configuration of the sweep.
+        jobs (list[Job]): The jobs, a job for every run of every N.
+        pending (deque[int]): The ids of the jobs waiting for a worker.
+        results (dict[int, PartialStats]): The partial statistics of the finished jobs.
+        workers (dict[str, dict]): The connection, the time of the last message and the jobs of every worker.
+        heartbeat_timeout (float): The seconds of silence after which a worker is lost.
+        max_attempts (int): The number of times a job may be lost before the sweep fails.
+        error (Optional[str]): Why the sweep failed, None while it did not.
+    """
+
+    def __init__(self, config: dict[str, Any], host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 heartbeat_timeout: float = HEARTBEAT_TIMEOUT, max_attempts: int = MAX_ATTEMPTS) -> None:
+        """
+        Constructs a new Coordinator instance, and binds its server. The seeds of the runs are drawn from np.random.
+
+        Parameters:
+            config (dict[str, Any]): The configuration of the sweep (see run2d.validate_config).
+            host (str): The address to listen on.
+            port (int): The port to listen on, 0 for any free port.
+            heartbeat_timeout (float): The seconds of silence after which a worker is lost.
+            max_attempts (int): The number of times a job may be lost before the sweep fails.
+        """
+        self.config = config
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.jobs: list[Job] = []
+        for step_index, num_steps in enumerate(config["num_steps_for_statistics"]):
+            seeds = np.random.randint(SEED_BOUND, size=config["num_runs"], dtype=np.int64).tolist()
+            self.jobs += [Job(len(self.jobs) + run_index, step_index, num_steps, run_index, seed)
+                          for run_index, seed in enumerate(seeds)]
+        self.pending = deque(job.job_id for job in self.jobs)
+        self.results: dict[int, PartialStats] = {}
+        self.workers: dict[str, dict[str, Any]] = {}
+        self.error: Optional[str] = None
+        self.condition = threading.Condition()
+        self.stopped = threading.Event()
+        self.server = CoordinatorServer((host, port), CoordinatorHandler)
+        self.server.coordinator = self
+
+    @property
+    def address(self) -> tuple[str, int]:
+        """returns the address and the port the coordinator listens on"""
+        return self.server.server_address[:2]
+
+    def finished(self) -> bool:
+        """returns True if every job is done or the sweep failed"""
+        return self.error is not None or len(self.results) == len(self.jobs)
+
+    def register(self, name: str, connection: socket.socket) -> str:
+        """registers a new worker, and returns its id"""
+        with self.condition:
+            worker_id = f'{name}#{len(self.workers)}'
+            self.workers[worker_id] = {"connection": connection, "last_seen": time.monotonic(), "jobs": set()}
+            return worker_id
+
+    def touch(self, worker_id: str) -> None:
+        """records that a worker is alive"""
+        with self.condition:
+            if worker_id in self.workers:
+                self.workers[worker_id]["last_seen"] = time.monotonic()
+
+    def assign(self, worker_id: str) -> dict[str, Any]:
+        """
+        Picks the reply to a job request of a worker: a pending job, a copy of a running job (work stealing), a wait
+        or done.
+
+        Parameters:
+            worker_id (str): The id of the worker.
+
+        Returns:
+            dict[str, Any]: The reply message.
+        """
+        with self.condition:
+            if self.finished() or worker_id not in self.workers:
+                return {"type": "done"}
+            job = None
+            while self.pending and job is None:
+                candidate = self.jobs[self.pending.popleft()]
+                if not candidate.done:
+                    job = candidate
+            if job is None:
+                running = [candidate for candidate in self.jobs
+                           if not candidate.done and candidate.workers and worker_id not in candidate.workers]
+                if not running:
+                    return {"type": "wait", "seconds": WAIT_SECONDS}
+                job = min(running, key=lambda candidate: (len(candidate.workers), candidate.started))
+            if not job.workers:
+                job.started = time.monotonic()
+            job.workers.add(worker_id)
+            self.workers[worker_id]["jobs"].add(job.job_id)
+            return job.message()
+
+    def record_result(self, worker_id: str, job_id: int, partial: PartialStats) -> None:
+        """records the result of a job, the results of other copies of the job are ignored"""
+        with self.condition:
+            job = self.jobs[job_id]
+            if worker_id in self.workers:
+                self.workers[worker_id]["jobs"].discard(job_id)
+            job.workers.discard(worker_id)
+            if not job.done:
+                job.done = True
+                self.results[job_id] = partial
+            self.condition.notify_all()
+
+    def lose_worker(self, worker_id: str) -> None:
+        """removes a worker, and puts the jobs that only it was running back in the queue"""
+        with self.condition:
+            worker = self.workers.pop(worker_id, None)
+            if worker is None:
+                return
+            for job_id in worker["jobs"]:
+                job = self.jobs[job_id]
+                job.workers.discard(worker_id)
+                if job.done or job.workers:
+                    continue
+                job.attempts += 1
+                if job.attempts >= self.max_attempts:
+                    self.error = f'job {job_id} (N={job.num_steps}, run {job.run_index}) was lost {job.attempts} times'
+                else:
+                    self.pending.appendleft(job_id)
+            self.condition.notify_all()
+
+    def monitor(self) -> None:
+        """the loop of the monitor thread, which drops the workers that missed their heartbeats"""
+        while not self.stopped.wait(self.heartbeat_timeout / 4):
+            now = time.monotonic()
+            with self.condition:
+                silent = [(worker_id, worker["connection"]) for worker_id, worker in self.workers.items()
+                          if now - worker["last_seen"] > self.heartbeat_timeout]
+            for worker_id, connection in silent:
+                self.lose_worker(worker_id)
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def run(self) -> dict[str, dict[int, float]]:
+        """
+        Serves the workers until every job is done, and merges the partial statistics of every N in run order.
+
+        Returns:
+            dict[str, dict[int, float]]: The statistics of the sweep (see run2d.calculate_stats).
+
+        Raises:
+            RuntimeError: If a job was lost max_attempts times.
+        """
+        import run2d  # the coordinator only needs it for the statistics, workers import it to run their jobs
+
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        monitor = threading.Thread(target=self.monitor, daemon=True)
+        monitor.start()
+        with self.condition:
+            while not self.finished():
+                self.condition.wait()
+        self.stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+        if self.error is not None:
+            raise RuntimeError(self.error)
+        stats = run2d.new_stats()
+        for step_index, num_steps in enumerate(self.config["num_steps_for_statistics"]):
+            partials = [self.results[job.job_id] for job in self.jobs if job.step_index == step_index]
+            merged = partials[0]
+            for partial in partials[1:]:
+                merged = merged.merge(partial)
+            merged.finalize(stats, num_steps)
+        return stats
+
+
+def run_heartbeats(sock: socket.socket, lock: threading.Lock, job_id: int, stopped: threading.Event,
+                   interval: float) -> None:
+    """the loop of the heartbeat thread of a worker, which runs while the worker runs a job"""
+    while not stopped.wait(interval):
+        try:
+            send_message(sock, {"type": "heartbeat", "job_id": job_id}, lock)
+        except OSError:
+            return
+
+
+def run_worker(host: str, port: int = DEFAULT_PORT, heartbeat_interval: float = HEARTBEAT_INTERVAL) -> int:
+    """
+    Connects to a coordinator and runs its jobs until it is done.
+
+    Parameters:
+        host (str): The address of the coordinator.
+        port (int): The port of the coordinator.
+        heartbeat_interval (float): The seconds between two heartbeats while a job runs.
+
+    Returns:
+        int: The number of jobs the worker ran.
+    """
+    import run2d  # run2d creates and runs the simulations of the jobs
+
+    lock = threading.Lock()
+    jobs_done = 0
+    with socket.create_connection((host, port)) as sock:
+        send_message(sock, {"type": "hello", "name": socket.gethostname()}, lock)
+        reply = recv_message(sock)
+        if reply is None:
+            return jobs_done
+        config = reply["config"]
+        while True:
+            send_message(sock, {"type": "request"}, lock)
+            reply = recv_message(sock)
+            if reply is None or reply["type"] == "done":
+                return jobs_done
+            if reply["type"] == "wait":
+                time.sleep(reply["seconds"])
+                continue
+            stopped = threading.Event()
+            heartbeats = threading.Thread(target=run_heartbeats,
+                                          args=(sock, lock, reply["job_id"], stopped, heartbeat_interval), daemon=True)
+            heartbeats.start()
+            try:
+                random.seed(reply["seed"])
+                np.random.seed(reply["seed"])
+                paths, step_events = run2d.simulate_run(config, reply["num_steps"])
+                partial = PartialStats.from_run(paths, step_events, run2d.TEN_RADIUS)
+            finally:
+                stopped.set()
+                heartbeats.join()
+            send_message(sock, {"type": "result", "job_id": reply["job_id"], "partial": partial.to_message()}, lock)
+            jobs_done += 1
+
+
+def main(argv: list[str]) -> int:
+    """
+    The command line of the cluster mode.
+
+    Parameters:
+        argv (list[str]): The command line arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(description="Runs a non-interactive sweep on a cluster of workers.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    coordinator_parser = commands.add_parser("coordinator", help="hand out the runs of a sweep and merge the results")
+    coordinator_parser.add_argument("config", help="the configuration file of the sweep")
+    coordinator_parser.add_argument("--host", default="0.0.0.0")
+    coordinator_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    coordinator_parser.add_argument("--local-workers", type=int, default=0,
+                                    help="the number of workers to start on this machine")
+    coordinator_parser.add_argument("--heartbeat-timeout", type=float, default=HEARTBEAT_TIMEOUT)
+    worker_parser = commands.add_parser("worker", help="run the jobs of a coordinator")
+    worker_parser.add_argument("--host", default="127.0.0.1")
+    worker_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        print(f"ran {run_worker(args.host, args.port)} jobs")
+        return 0
+
+    import run2d  # the coordinator validates the configuration and exports the statistics like run2d
+
+    with open(args.config) as file:
+        config = json.load(file)
+    if not run2d.validate_config(config):
+        return 1
+    coordinator = Coordinator(config, args.host, args.port, args.heartbeat_timeout)
+    host, port = coordinator.address
+    print(f"coordinator listening on {host}:{port}, {len(coordinator.jobs)} jobs")
+    local_workers = [subprocess.Popen([sys.executable, __file__, "worker", "--host", "127.0.0.1", "--port", str(port)])
+                     for _ in range(args.local_workers)]
+    try:
+        stats = coordinator.run()
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        for worker in local_workers:
+            worker.wait()
+    run2d.stats_to_png(stats)
+    run2d.stats_to_csv(stats)
+    print("done!")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,106 @@
+import numpy as np
+
+NO_HIT = np.inf
+ENTRY_NUDGE = 1e-9  # how far past the boundary a clipped step ends, so the clipped location is inside the element
+
+
+def segment_box_hits(starts: np.ndarray, ends: np.ndarray, mins: np.ndarray, maxs: np.ndarray) -> np.ndarray:
+    """
+    Finds where segments enter axis aligned squares (cubes in 3D), using the slab method.
+
+    Parameters:
+        starts (np.ndarray): The start points of the segments, of shape (segments, dimension).
+        ends (np.ndarray): The end points of the segments, of shape (segments, dimension).
+        mins (np.ndarray): The minimum corners of the boxes, of shape (boxes, dimension).
+        maxs (np.ndarray): The maximum corners of the boxes, of shape (boxes, dimension).
+
+    Returns:
+        np.ndarray: An array of shape (segments, boxes) with the segment parameter t in [0, 1] at which the segment
+        enters the box, or NO_HIT. Segments that start inside a box do not enter it.
+    """
+
+    starts = starts[:, np.newaxis, :]
+    directions = (ends - starts[:, 0, :])[:, np.newaxis, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_low = (mins - starts) / directions
+        t_high = (maxs - starts) / directions
+    t_near = np.minimum(t_low, t_high)
+    t_far = np.maximum(t_low, t_high)
+    # a segment parallel to a slab is inside it for every t, or for none
+    parallel = directions == 0
+    inside_slab = (mins <= starts) & (starts <= maxs)
+    t_near = np.where(parallel, np.where(inside_slab, -np.inf, np.inf), t_near)
+    t_far = np.where(parallel, np.where(inside_slab, np.inf, -np.inf), t_far)
+    t_enter = t_near.max(axis=2)
+    t_exit = t_far.min(axis=2)
+    hit = (t_enter <= t_exit) & (t_enter > 0) & (t_enter <= 1)
+    return np.where(hit, t_enter, NO_HIT)
+
+
+def segment_sphere_hits(starts: np.ndarray, ends: np.ndarray, centers: np.ndarray, radii: np.ndarray) -> np.ndarray:
+    """
+    Finds where segments enter circles (spheres in 3D), by solving |start + t * direction - center| = radius.
+
+    Parameters:
+        starts (np.ndarray): The start points of the segments, of shape (segments, dimension).
+        ends (np.ndarray): The end points of the segments, of shape (segments, dimension).
+        centers (np.ndarray): The centers of the circles, of shape (circles, dimension).
+        radii (np.ndarray): The radii of the circles, of shape (circles,).
+
+    Returns:
+        np.ndarray: An array of shape (segments, circles) with the segment parameter t in [0, 1] at which the
+        segment enters the circle, or NO_HIT. Segments that start inside a circle do not enter it.
+    """
+
+    directions = ends - starts
+    offsets = starts[:, np.newaxis, :] - centers
+    a = (directions ** 2).sum(axis=1)[:, np.newaxis]
+    b = 2 * (offsets * directions[:, np.newaxis, :]).sum(axis=2)
+    c = (offsets ** 2).sum(axis=2) - radii ** 2
+    discriminant = b ** 2 - 4 * a * c
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_enter = (-b - np.sqrt(discriminant)) / (2 * a)
+    hit = (c > 0) & (a > 0) & (discriminant >= 0) & (t_enter >= 0) & (t_enter <= 1)
+    return np.where(hit, t_enter, NO_HIT)
+
+
+def first_hits(*hit_arrays: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the first element every segment enters.
+
+    Parameters:
+        *hit_arrays (np.ndarray): Arrays of shape (segments, elements) returned by the segment_*_hits functions.
+        The elements are numbered in the order of the arrays.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The t of the first hit (NO_HIT if none) and the index of the hit element
+        (-1 if none), both of shape (segments,).
+    """
+
+    hits = np.concatenate(hit_arrays, axis=1)
+    if hits.shape[1] == 0:
+        return np.full(hits.shape[0], NO_HIT), np.full(hits.shape[0], -1)
+    index = hits.argmin(axis=1)
+    t = hits[np.arange(hits.shape[0]), index]
+    return t, np.where(np.isfinite(t), index, -1)
+
+
+def clip_segments(starts: np.ndarray, ends: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """
+    Cuts every segment that hit an element right after its entry point, so that the end of the segment is inside
+    the element and the usual end point checks apply to it.
+
+    Parameters:
+        starts (np.ndarray): The start points of the segments, of shape (segments, dimension).
+        ends (np.ndarray): The end points of the segments, of shape (segments, dimension).
+        t (np.ndarray): The t of the first hit of every segment (NO_HIT if none), as returned by first_hits.
+
+    Returns:
+        np.ndarray: The new end points, of shape (segments, dimension).
+    """
+
+    directions = ends - starts
+    lengths = np.sqrt((directions ** 2).sum(axis=1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        clipped_t = np.minimum(t + ENTRY_NUDGE / lengths, 1)
+    return np.where(np.isfinite(t)[:, np.newaxis], starts + clipped_t[:, np.newaxis] * directions, ends)
@@ -0,0 +1,86 @@
+"""
+Every step of every walker gets a uint8 event code. The codes are bit flags, since a single step can trigger more
+than one event (e.g. a portal jump followed by a restart).
+"""
+import numpy as np
+
+EVENT_NONE = 0
+EVENT_PORTAL_JUMP = 1
+EVENT_OBSTACLE_BLOCK = 2
+EVENT_TRAP_CAPTURE = 4
+EVENT_TRAP_BLOCK = 8  # a trapped walker tried to leave its trap
+EVENT_SLOW_ZONE_ENTRY = 16
+EVENT_RESTART = 32
+EVENT_BLACK_HOLE_PULL = 64
+
+EVENT_NAMES = {
+    "portal_jumps": EVENT_PORTAL_JUMP,
+    "obstacle_blocks": EVENT_OBSTACLE_BLOCK,
+    "trap_captures": EVENT_TRAP_CAPTURE,
+    "trap_blocks": EVENT_TRAP_BLOCK,
+    "slow_zone_entries": EVENT_SLOW_ZONE_ENTRY,
+    "restarts": EVENT_RESTART,
+    "black_hole_pulls": EVENT_BLACK_HOLE_PULL,
+}
+
+
+def axis_crossings(trajectories: np.ndarray, axis: int) -> np.ndarray:
+    """
+    Counts how many times every path crosses an axis, i.e. how many times the given coordinate changes its sign
+    between two consecutive positions.
+
+    Parameters:
+        trajectories (np.ndarray): Positions of shape (walkers, steps, dimension).
+        axis (int): The coordinate whose sign is checked (0 for crossing the y-axis, 1 for crossing the x-axis).
+
+    Returns:
+        np.ndarray: The number of crossings of every walker.
+    """
+
+    coordinate = trajectories[:, :, axis]
+    return (coordinate[:, 1:] * coordinate[:, :-1] < 0).sum(axis=1)
+
+
+def count_events(events: np.ndarray, code: int) -> np.ndarray:
+    """
+    Counts how many steps of every walker have the given event.
+
+    Parameters:
+        events (np.ndarray): The uint8 event codes of shape (walkers, steps).
+        code (int): The event flag (one of the EVENT_* constants).
+
+    Returns:
+        np.ndarray: The number of events of every walker.
+    """
+
+    return np.count_nonzero(events & code, axis=1)
+
+
+def first_event_step(events: np.ndarray, code: int) -> np.ndarray:
+    """
+    Returns the first step of every walker that has the given event.
+
+    Parameters:
+        events (np.ndarray): The uint8 event codes of shape (walkers, steps).
+        code (int): The event flag (one of the EVENT_* constants).
+
+    Returns:
+        np.ndarray: The (1 based, matching the paths) step of the first event, or -1 if the walker never had it.
+    """
+
+    happened = (events & code) != 0
+    return np.where(happened.any(axis=1), happened.argmax(axis=1) + 1, -1)
+
+
+def event_averages(events: np.ndarray) -> dict[str, float]:
+    """
+    Calculates the average number of every event per walker.
+
+    Parameters:
+        events (np.ndarray): The uint8 event codes of shape (walkers, steps).
+
+    Returns:
+        dict[str, float]: The average count of every event, keyed by the names in EVENT_NAMES.
+    """
+
+    return {name: float(count_events(events, code).mean()) for name, code in EVENT_NAMES.items()}
@@ -0,0 +1,207 @@
+from typing import Callable, Optional, Union
+
+import numpy as np
+
+from obstacle import Obstacle
+from obstacle3d import Obstacle3d
+
+CENSORED = -1  # the first passage time of a walker that never reached its target during the run
+
+
+def exit_times(trajectories: np.ndarray, radii: Union[list[float], np.ndarray]) -> np.ndarray:
+    """
+    Calculates, for every walker and every radius, the index of the first position that is farther than the radius
+    from the origin. All radii are resolved from a single running maximum of the distance.
+
+    Parameters:
+        trajectories (np.ndarray): Positions of shape (walkers, steps, dimension).
+        radii (list[float] or np.ndarray): The radii of the circles (spheres in 3D).
+
+    Returns:
+        np.ndarray: An int array of shape (walkers, radii) with the exit step, or CENSORED if the walker never left.
+        Without radii it has shape (walkers, 0).
+    """
+
+    if len(radii) == 0:
+        return np.zeros((trajectories.shape[0], 0), dtype=np.int64)
+    running_max = np.maximum.accumulate(np.sqrt((trajectories ** 2).sum(axis=2)), axis=1)
+    num_points = trajectories.shape[1]
+    times = np.stack([(running_max <= radius).sum(axis=1) for radius in radii], axis=1)
+    times[times == num_points] = CENSORED
+    return times
+
+
+def element_contains(element, positions: np.ndarray) -> np.ndarray:
+    """
+    Checks which positions are inside an element. Squares and cubes (obstacles and portals) are tested against
+    their bounds, every other element (traps, slow zones, black holes) against its radius.
+
+    Parameters:
+        element: The element (Obstacle, Portal, Trap, SlowZone or their 3D versions).
+        positions (np.ndarray): Positions of shape (..., dimension).
+
+    Returns:
+        np.ndarray: A bool array of shape (...).
+    """
+
+    if isinstance(element, (Obstacle, Obstacle3d)):
+        return ((element.min_corner <= positions) & (positions <= element.max_corner)).all(axis=-1)
+    offsets = positions - np.asarray(element.center_loc, dtype=float)
+    return (offsets ** 2).sum(axis=-1) <= element.radius_squared
+
+
+def hit_times(trajectories: np.ndarray, targets: list) -> np.ndarray:
+    """
+    Calculates, for every walker and every target, the index of the first position inside the target.
+
+    Parameters:
+        trajectories (np.ndarray): Positions of shape (walkers, steps, dimension).
+        targets (list): Elements (see element_contains) or functions mapping positions of shape (..., dimension)
+            to a bool array of shape (...).
+
+    Returns:
+        np.ndarray: An int array of shape (walkers, targets) with the hit step, or CENSORED if the walker never hit.
+    """
+
+    times = np.full((trajectories.shape[0], len(targets)), CENSORED, dtype=np.int64)
+    for index, target in enumerate(targets):
+        inside = target(trajectories) if callable(target) else element_contains(target, trajectories)
+        hit = inside.any(axis=1)
+        times[hit, index] = inside[hit].argmax(axis=1)
+    return times
+
+
+def kaplan_meier(times: np.ndarray, observed: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculates the Kaplan-Meier estimate of the survival function, S(t) = P(first passage time > t).
+
+    Parameters:
+        times (np.ndarray): The first passage time of every walker, or the last observed step if it was censored.
+        observed (np.ndarray): A bool array, True for walkers that reached the target.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The distinct event times and the survival estimate right after each of them.
+    """
+
+    times = np.asarray(times)
+    observed = np.asarray(observed, dtype=bool)
+    event_times, events = np.unique(times[observed], return_counts=True)
+    at_risk = len(times) - np.searchsorted(np.sort(times), event_times, side='left')
+    return event_times, np.cumprod(1 - events / at_risk)
+
+
+def survival_curve(times: np.ndarray, observed: np.ndarray, num_points: int) -> np.ndarray:
+    """
+    Evaluates the Kaplan-Meier survival estimate on every step.
+
+    Parameters:
+        times (np.ndarray): The first passage time of every walker, or the last observed step if it was censored.
+        observed (np.ndarray): A bool array, True for walkers that reached the target.
+        num_points (int): The number of steps to evaluate.
+
+    Returns:
+        np.ndarray: An array of length num_points, where entry t is the estimated P(first passage time > t).
+    """
+
+    event_times, survival = kaplan_meier(times, observed)
+    positions = np.searchsorted(event_times, np.arange(num_points), side='right')
+    return np.concatenate(([1.0], survival))[positions]
+
+
+def restricted_mean(times: np.ndarray, observed: np.ndarray, horizon: int) -> float:
+    """
+    Calculates the mean first passage time restricted to the horizon, E[min(T, horizon)], from the Kaplan-Meier
+    estimate. Censored walkers count as surviving until they were censored instead of being dropped. Without
+    censoring this is the plain average of the times.
+
+    Parameters:
+        times (np.ndarray): The first passage time of every walker, or the last observed step if it was censored.
+        observed (np.ndarray): A bool array, True for walkers that reached the target.
+        horizon (int): The number of steps of the run.
+
+    Returns:
+        float: The restricted mean first passage time.
+    """
+
+    return float(survival_curve(times, observed, horizon).sum())
+
+
+def censor(times: np.ndarray, num_points: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Splits the output of exit_times / hit_times into the form used by the Kaplan-Meier functions.
+
+    Parameters:
+        times (np.ndarray): First passage times, with CENSORED for walkers that never reached the target.
+        num_points (int): The number of positions in every path.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The times (censored walkers at the last step) and the observed flags.
+    """
+
+    observed = times != CENSORED
+    return np.where(observed, times, num_points - 1), observed
+
+
+class FirstPassageTracker:
+    """
+    The FirstPassageTracker class records exit and hit times from batches of positions, so it can be used as a
+    consumer of Simulation.run_streaming without storing the paths.
+
+    Attributes:
+        radii (np.ndarray): The radii of the exit circles.
+        targets (list): The target elements or functions (see hit_times).
+        steps_seen (int): The number of positions (per walker) seen so far.
+        exit_steps (np.ndarray): The exit times of shape (walkers, radii), CENSORED if not exited yet.
+        hit_steps (np.ndarray): The hit times of shape (walkers, targets), CENSORED if not hit yet.
+    """
+
+    def __init__(self, radii: Union[list[float], np.ndarray], targets: Optional[list[Union[object, Callable]]] = None):
+        """
+        Constructs a new FirstPassageTracker instance.
+
+        Parameters:
+            radii (list[float] or np.ndarray): The radii of the exit circles.
+            targets (list, optional): The target elements or functions (see hit_times).
+        """
+        self.radii = np.asarray(radii, dtype=float)
+        self.targets = [] if targets is None else targets
+        self.steps_seen = 0
+        self.exit_steps: Optional[np.ndarray] = None
+        self.hit_steps: Optional[np.ndarray] = None
+
+    def add_batch(self, positions: np.ndarray) -> None:
+        """
+        Records a batch of positions.
+
+        Parameters:
+            positions (np.ndarray): Positions of shape (steps, walkers, dimension).
+        """
+        trajectories = np.swapaxes(positions, 0, 1)
+        if self.exit_steps is None:
+            self.exit_steps = np.full((trajectories.shape[0], len(self.radii)), CENSORED, dtype=np.int64)
+            self.hit_steps = np.full((trajectories.shape[0], len(self.targets)), CENSORED, dtype=np.int64)
+        for times, batch_times in ((self.exit_steps, exit_times(trajectories, self.radii)),
+                                   (self.hit_steps, hit_times(trajectories, self.targets))):
+            new = (times == CENSORED) & (batch_times != CENSORED)
+            times[new] = batch_times[new] + self.steps_seen
+        self.steps_seen += trajectories.shape[1]
+
+    def exit_survival(self) -> np.ndarray:
+        """
+        Returns the Kaplan-Meier survival curves of the exit times.
+
+        Returns:
+            np.ndarray: An array of shape (radii, steps_seen).
+        """
+        return np.array([survival_curve(*censor(self.exit_steps[:, index], self.steps_seen), self.steps_seen)
+                         for index in range(len(self.radii))]).reshape(len(self.radii), self.steps_seen)
+
+    def hit_survival(self) -> np.ndarray:
+        """
+        Returns the Kaplan-Meier survival curves of the hit times.
+
+        Returns:
+            np.ndarray: An array of shape (targets, steps_seen).
+        """
+        return np.array([survival_curve(*censor(self.hit_steps[:, index], self.steps_seen), self.steps_seen)
+                         for index in range(len(self.targets))]).reshape(len(self.targets), self.steps_seen)
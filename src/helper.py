@@ -1,5 +1,8 @@
 import random
 import math
+from typing import Union
+
+import numpy as np
 
 
 def distance_from_origin(point: tuple[float, float]) -> float:
@@ -30,6 +33,22 @@ def avg(lst: list[float]) -> float:
     return sum(lst) / len(lst)
 
 
+def paths_to_array(paths: Union[list, np.ndarray]) -> np.ndarray:
+    """
+    Converts a list of paths (as returned by Simulation.run) into a single trajectory array.
+
+    Parameters:
+        paths (list[list[tuple]] or np.ndarray): The paths, all of the same length.
+
+    Returns:
+        np.ndarray: An array of shape (walkers, steps + 1, dimension). Arrays are returned without a copy, float32
+        paths stay float32 and every other type is converted to float64.
+    """
+
+    trajectories = np.asarray(paths)
+    return trajectories if trajectories.dtype == np.float32 else trajectories.astype(float, copy=False)
+
+
 def generate_random_coordinate() -> tuple:
     """
     Generates a random 2D coordinate.
@@ -0,0 +1,185 @@
+"""
+Opt-in instrumentation of the hot path of Simulation and Simulation3d. Attaching an Instrumentation to a simulation
+wraps the methods of that simulation, of its elements and of its walkers (as instance attributes, the classes are
+left alone), so that every call is counted and timed. A simulation without an Instrumentation runs the original
+methods, so the instrumentation costs nothing when it is disabled.
+
+The counters are keyed by what is measured:
+    make_a_move[type N]          a whole move of a walker of type N, hits are moves with an event
+    new_loc_by_type[type N]      drawing the location a walker of type N tries to move to (and the other step
+                                 generators of the walkers, e.g. random_walk6_move, which it calls for type 6)
+    <Element>.<check>            a geometric check of an element type, hits are checks that returned True
+    <simulation method>          candidate lookups, trap registration, slow zone updates, black hole pulls, etc.
+Times are inclusive: the time of make_a_move contains the time of the checks it made.
+"""
+import json
+import time
+from typing import Any, Callable, Optional
+
+ELEMENT_CHECKS = ("is_inside_portal", "is_inside_portal_3d", "is_inside_obstacle", "is_inside_obstacle_3d",
+                  "is_inside_trap", "is_inside_trap_3d", "is_inside_slow_zone", "is_in_horizon_event_zone")
+STEP_GENERATORS = ("new_loc_by_type", "random_walk6_move", "new_loc_by_type_3d", "random_walk6_move_3d")
+SIMULATION_METHODS = ("blocking_candidates", "candidate_elements", "enter_trap", "update_slow_zones",
+                      "black_hole_pull", "pull_all", "clip_step", "set_time")
+CALLS, HITS, SECONDS = range(3)
+
+
+class Instrumentation:
+    """
+    The Instrumentation class counts and times the calls of the hot path methods of the simulations it is
+    attached to. One instance can be attached to many simulations (e.g. every run of non_interactive), and
+    accumulates their counters.
+
+    Attributes:
+        counters (dict[str, list]): The number of calls, the number of hits and the total seconds of every key.
+        runs (int): The number of finished runs.
+        run_seconds (float): The total time of the finished runs.
+        walker_steps (int): The total number of walker steps of the finished runs.
+    """
+
+    def __init__(self) -> None:
+        """
+        Constructs a new Instrumentation instance without any counts.
+        """
+        self.counters: dict[str, list] = {}
+        self.runs = 0
+        self.run_seconds = 0.0
+        self.walker_steps = 0
+        self.run_start: Optional[float] = None
+
+    def counter(self, key: str) -> list:
+        """returns the counter of a key, creating it if needed"""
+        return self.counters.setdefault(key, [0, 0, 0.0])
+
+    def wrap(self, owner: Any, name: str, key: str, hit: Optional[Callable] = bool) -> None:
+        """
+        Replaces a method of an object by a counting and timing wrapper, set as an instance attribute.
+
+        Parameters:
+            owner (Any): The object whose method is wrapped.
+            name (str): The name of the method.
+            key (str): The key of the counter of the calls.
+            hit (Callable, optional): Decides from the result whether a call was a hit. If None, no hits are counted.
+        """
+        method = getattr(owner, name)
+        if hasattr(method, '__wrapped__'):
+            return
+        counter = self.counter(key)
+        perf_counter = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            result = method(*args, **kwargs)
+            counter[SECONDS] += perf_counter() - start
+            counter[CALLS] += 1
+            if hit is not None and hit(result):
+                counter[HITS] += 1
+            return result
+
+        wrapper.__wrapped__ = method
+        setattr(owner, name, wrapper)
+
+    def wrap_move(self, simulation: Any) -> None:
+        """wraps make_a_move, with a counter for every walker type and the moves with an event as hits"""
+        method = simulation.make_a_move
+        if hasattr(method, '__wrapped__'):
+            return
+        perf_counter = time.perf_counter
+        counters: dict[int, list] = {}
+
+        def make_a_move(walker, *args, **kwargs):
+            start = perf_counter()
+            result = method(walker, *args, **kwargs)
+            elapsed = perf_counter() - start
+            counter = counters.get(walker.walker_type)
+            if counter is None:
+                counter = counters[walker.walker_type] = self.counter(f'make_a_move[type {walker.walker_type}]')
+            counter[SECONDS] += elapsed
+            counter[CALLS] += 1
+            if simulation.last_event:
+                counter[HITS] += 1
+            return result
+
+        make_a_move.__wrapped__ = method
+        simulation.make_a_move = make_a_move
+
+    def attach(self, simulation: Any) -> None:
+        """
+        Instruments a Simulation or Simulation3d, its elements and its walkers.
+
+        Parameters:
+            simulation (Simulation or Simulation3d): The simulation.
+        """
+        elements = getattr(simulation, 'elements', None)
+        if elements is None:
+            elements = simulation.elements3d
+        walkers = getattr(simulation, 'walkers', None)
+        if walkers is None:
+            walkers = simulation.walkers3d
+        self.wrap_move(simulation)
+        for name in SIMULATION_METHODS:
+            if hasattr(simulation, name):
+                self.wrap(simulation, name, name, hit=None)
+        for element in elements:
+            for name in ELEMENT_CHECKS:
+                if name in vars(type(element)):
+                    self.wrap(element, name, f'{type(element).__name__}.{name}')
+        for walker in walkers:
+            for name in STEP_GENERATORS:
+                if hasattr(walker, name):
+                    self.wrap(walker, name, f'{name}[type {walker.walker_type}]', hit=None)
+        simulation.instrumentation = self
+
+    def start_run(self) -> None:
+        """marks the start of a run of an instrumented simulation"""
+        self.run_start = time.perf_counter()
+
+    def finish_run(self, walker_steps: int) -> None:
+        """marks the end of a run of an instrumented simulation, in which walker_steps steps were made"""
+        if self.run_start is not None:
+            self.run_seconds += time.perf_counter() - self.run_start
+        self.run_start = None
+        self.runs += 1
+        self.walker_steps += walker_steps
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Returns the counters, with the average time of a call in microseconds and the share of the run time.
+
+        Returns:
+            dict[str, Any]: The totals of the runs and the "counters", keyed by their keys.
+        """
+        counters = {}
+        for key, (calls, hits, seconds) in sorted(self.counters.items()):
+            if calls == 0:
+                continue
+            counters[key] = {"calls": calls, "hits": hits, "seconds": seconds,
+                             "microseconds_per_call": seconds / calls * 1e6,
+                             "share_of_run": seconds / self.run_seconds if self.run_seconds else None}
+        return {"runs": self.runs, "run_seconds": self.run_seconds, "walker_steps": self.walker_steps,
+                "counters": counters}
+
+    def summary_table(self) -> str:
+        """returns the counters as a text table, the most expensive keys first"""
+        summary = self.to_dict()
+        rows = sorted(summary["counters"].items(), key=lambda item: -item[1]["seconds"])
+        width = max([len(key) for key, _ in rows] + [len("key")])
+        lines = [f'{summary["runs"]} runs, {summary["walker_steps"]} walker steps in {summary["run_seconds"]:.3f}s',
+                 f'{"key":<{width}} {"calls":>10} {"hits":>10} {"total s":>9} {"us/call":>8} {"share":>6}']
+        for key, counter in rows:
+            share = "" if counter["share_of_run"] is None else f'{counter["share_of_run"]:.1%}'
+            lines.append(f'{key:<{width}} {counter["calls"]:>10} {counter["hits"]:>10} {counter["seconds"]:>9.3f} '
+                         f'{counter["microseconds_per_call"]:>8.2f} {share:>6}')
+        return "\n".join(lines)
+
+    def report(self, path: Optional[str] = None) -> None:
+        """
+        Prints the summary table, and saves the counters as JSON.
+
+        Parameters:
+            path (str, optional): The path of the JSON file. If not provided, nothing is saved.
+        """
+        print(self.summary_table())
+        if path is not None:
+            with open(path, 'w') as file:
+                json.dump(self.to_dict(), file, indent=2)
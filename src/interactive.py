@@ -7,6 +7,7 @@ from portal import Portal
 from obstacle import Obstacle
 from slowZone import SlowZone
 from trap import Trap
+from occupancy import OccupancyGrid
 
 
 class Interactive:
@@ -94,10 +95,28 @@ class Interactive:
                 slow_zone_circle = self.draw_circle(element, element_color)
                 self.ax.add_patch(slow_zone_circle)
 
+    def draw_occupancy(self, occupancy: OccupancyGrid, color_map: str = 'hot', alpha: float = 0.5):
+        """
+        Draws an occupancy heatmap below the walkers and the elements of the board.
+
+        Parameters:
+            occupancy (OccupancyGrid): The occupancy grid to draw. 3D grids are summed over the z axis.
+            color_map (str): The name of the matplotlib color map to use.
+            alpha (float): The transparency of the heatmap.
 
-    def plot_walk(self) -> None:
+        Returns:
+            AxesImage: A matplotlib.image.AxesImage instance representing the drawn heatmap.
+        """
+
+        return self.ax.imshow(occupancy.projection().T, origin='lower', extent=occupancy.extent(),
+                              cmap=color_map, alpha=alpha, zorder=0, interpolation='nearest')
+
+    def plot_walk(self, occupancy: OccupancyGrid = None) -> None:
         """
         Plots the walk of the walkers in the simulation. It updates the plot at each step of the simulation, showing the current position of each walker. It also handles GUI events to keep the GUI responsive.
+
+        Parameters:
+            occupancy (OccupancyGrid, optional): An occupancy grid to draw as a heatmap overlay of the board.
         """
         plt.ion()
         paths = self.simulation.run()
@@ -114,6 +133,8 @@ class Interactive:
 
         step_label = plt.text(-45, 45, '', fontsize=12)
         self.draw_board()
+        if occupancy is not None:
+            self.draw_occupancy(occupancy)
         for step, step_moves in enumerate(graph):
             if not plt.fignum_exists(1):
                 break
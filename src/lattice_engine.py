@@ -0,0 +1,167 @@
+"""
+An integer lattice engine for type 3 walkers. A type 3 walker moves a single unit along an axis on every step, so
+without slow zones (which halve the step) and portals (whose exit points are off the lattice) it never leaves the
+integer lattice. The engine keeps the positions of all walkers in small integer arrays, draws the directions of a
+block of steps as uint8 codes at once and applies them with a lookup table of deltas. The elements are rasterised
+once into masks over the lattice cells they can contain, so every element test is an array lookup, and the results
+are exact: there is no cos/sin rounding drift, and a location is inside an element exactly when the element's own
+inside check says so for the integer location.
+"""
+from typing import Callable
+
+import numpy as np
+
+import events
+from walker import TEN_PERCENT
+
+RESTART_PROBABILITY = TEN_PERCENT
+STEP_DELTAS = np.array([[1, 0], [-1, 0], [0, 1], [0, -1]])  # the directions 'r', 'l', 'u' and 'd' of random_walk3
+DIRECTION_CODES = np.uint8(len(STEP_DELTAS))
+BLOCK_SIZE = 256  # the number of steps whose directions and restarts are drawn at once
+MAX_TRAPS = 64  # the traps containing a cell are kept as the bits of a uint64
+
+
+def position_dtype(num_steps: int) -> type:
+    """returns the smallest integer type that holds every location reachable within num_steps steps"""
+    return np.int16 if num_steps <= np.iinfo(np.int16).max else np.int32
+
+
+def trap_mask_dtype(num_traps: int) -> type:
+    """returns the smallest unsigned integer type with a bit for every trap"""
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if num_traps <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f'The lattice engine supports at most {MAX_TRAPS} traps, got {num_traps}')
+
+
+class LatticeMasks:
+    """
+    The LatticeMasks class rasterises obstacles and traps over the lattice cells around them. The grid is padded by
+    an empty cell on every side, and lookups clip their cells into the grid, so every location outside the elements
+    maps to an empty cell without a bounds check.
+
+    Attributes:
+        origin (np.ndarray): The location of the grid cell (0, 0).
+        shape (tuple[int, int]): The shape of the grid.
+        obstacles (np.ndarray): A flat bool grid, True where a cell is inside an obstacle.
+        traps (np.ndarray): A flat grid of trap bitmasks, bit i is set where a cell is inside trap i.
+    """
+
+    def __init__(self, obstacles: list, traps: list, reach: int) -> None:
+        """
+        Constructs a new LatticeMasks instance.
+
+        Parameters:
+            obstacles (list): The obstacles (see obstacle.Obstacle).
+            traps (list): The traps (see trap.Trap), at most MAX_TRAPS.
+            reach (int): The largest coordinate a walker can reach, cells farther away are not rasterised.
+        """
+        low, high = np.full(2, reach), np.full(2, -reach)
+        for obstacle in obstacles:
+            low = np.minimum(low, np.floor(obstacle.min_corner))
+            high = np.maximum(high, np.ceil(obstacle.max_corner))
+        for trap in traps:
+            low = np.minimum(low, np.floor(np.subtract(trap.center_loc, trap.radius)))
+            high = np.maximum(high, np.ceil(np.add(trap.center_loc, trap.radius)))
+        low = np.maximum(low, -reach).astype(np.int64) - 1
+        high = np.minimum(high, reach).astype(np.int64) + 1
+        self.origin = low
+        self.shape = tuple((high - low + 1).tolist())
+        x, y = np.meshgrid(np.arange(low[0], high[0] + 1, dtype=float), np.arange(low[1], high[1] + 1, dtype=float),
+                           indexing='ij')
+        self.obstacles = np.zeros(self.shape, dtype=bool)
+        for obstacle in obstacles:
+            (min_x, min_y), (max_x, max_y) = obstacle.min_corner, obstacle.max_corner
+            self.obstacles |= (min_x <= x) & (x <= max_x) & (min_y <= y) & (y <= max_y)
+        dtype = trap_mask_dtype(len(traps))
+        self.traps = np.zeros(self.shape, dtype=dtype)
+        for bit, trap in enumerate(traps):
+            center_x, center_y = trap.center_loc
+            inside = (x - center_x) ** 2 + (y - center_y) ** 2 <= trap.radius_squared
+            self.traps[inside] |= dtype(1) << dtype(bit)
+        self.obstacles[[0, -1], :] = self.obstacles[:, [0, -1]] = False
+        self.traps[[0, -1], :] = self.traps[:, [0, -1]] = 0
+        self.obstacles = self.obstacles.ravel()
+        self.traps = self.traps.ravel()
+
+    def cells(self, locations: np.ndarray) -> np.ndarray:
+        """
+        Returns the flat grid cells of locations, locations outside the grid get an empty cell of its border.
+
+        Parameters:
+            locations (np.ndarray): Integer locations, of shape (walkers, 2).
+
+        Returns:
+            np.ndarray: The flat cell indices, of shape (walkers,).
+        """
+        x = np.clip(locations[:, 0] - self.origin[0], 0, self.shape[0] - 1)
+        y = np.clip(locations[:, 1] - self.origin[1], 0, self.shape[1] - 1)
+        return x * self.shape[1] + y
+
+
+def lattice_paths(num_walkers: int, num_steps: int, restart_option: bool, obstacles: list = (),
+                  traps: list = (), progress: Callable[[int], None] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Simulates type 3 walkers that start at the origin among obstacles and traps, with the rules of
+    Simulation.make_a_move: a step into an obstacle is blocked, and otherwise the first trap (in list order) that
+    contains exactly one of the current and the new location decides the step. If it contains the current location
+    the walker tries to leave it and is blocked, otherwise the walker is captured by it. That trap is the lowest set
+    bit of the xor of the trap bitmasks of the two cells. Like make_a_move, a regular step records the location
+    before a restart, and a capture records the location after it.
+
+    Parameters:
+        num_walkers (int): The number of walkers.
+        num_steps (int): The number of steps.
+        restart_option (bool): A flag indicating whether the walkers have the restart option.
+        obstacles (list): The obstacles (see obstacle.Obstacle).
+        traps (list): The traps (see trap.Trap), at most MAX_TRAPS.
+        progress (Callable[[int], None], optional): Called with the number of walker steps done after every block.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The paths, of shape (walkers, steps + 1, 2), starting with the origin and of
+        the smallest integer type that holds them (see position_dtype), and the event codes of every step (see
+        events.py), of shape (walkers, steps).
+    """
+
+    dtype = position_dtype(num_steps)
+    deltas = STEP_DELTAS.astype(dtype)
+    masks = LatticeMasks(obstacles, traps, num_steps)
+    paths = np.zeros((num_walkers, num_steps + 1, 2), dtype=dtype)
+    step_events = np.zeros((num_walkers, num_steps), dtype=np.uint8)
+    locations = np.zeros((num_walkers, 2), dtype=dtype)
+    current_traps = masks.traps[masks.cells(locations)]
+    one = current_traps.dtype.type(1)
+    for block_start in range(0, num_steps, BLOCK_SIZE):
+        block_steps = min(BLOCK_SIZE, num_steps - block_start)
+        codes = np.random.randint(0, DIRECTION_CODES, (block_steps, num_walkers), dtype=np.uint8)
+        restart_draws = np.random.random((block_steps, num_walkers)) < RESTART_PROBABILITY
+        for offset in range(block_steps):
+            step = block_start + offset
+            new_locations = locations + deltas[codes[offset]]
+            cells = masks.cells(new_locations)
+            obstacle_blocks = masks.obstacles[cells]
+            new_traps = masks.traps[cells]
+            changed = current_traps ^ new_traps
+            first_changed = changed & (~changed + one)
+            trap_blocks = ~obstacle_blocks & ((current_traps & first_changed) != 0)
+            captures = ~obstacle_blocks & (changed != 0) & ~trap_blocks
+            moved = ~(obstacle_blocks | trap_blocks)
+            restarts = moved & restart_draws[offset] if restart_option else np.zeros(num_walkers, dtype=bool)
+            recorded = np.where(moved[:, np.newaxis], new_locations, locations)
+            recorded[captures & restarts] = 0
+            paths[:, step + 1] = recorded
+            locations = np.where(restarts[:, np.newaxis], 0, recorded).astype(dtype)
+            current_traps = np.where(moved, new_traps, current_traps)
+            current_traps[restarts] = masks.traps[masks.cells(locations[restarts])]
+            step_events[:, step] = (obstacle_blocks * events.EVENT_OBSTACLE_BLOCK
+                                    | trap_blocks * events.EVENT_TRAP_BLOCK
+                                    | captures * events.EVENT_TRAP_CAPTURE
+                                    | restarts * events.EVENT_RESTART)
+        if progress is not None:
+            progress(num_walkers * block_steps)
+    return paths, step_events
+
+
+def supports_scene(num_portals: int, num_slow_zones: int, num_traps: int) -> bool:
+    """returns True if the lattice engine can run a scene with the given element counts"""
+    return num_portals == 0 and num_slow_zones == 0 and num_traps <= MAX_TRAPS
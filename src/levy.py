@@ -0,0 +1,205 @@
+"""
+Lévy flight step sampling for type 5 walkers. By default ("sampler": "global") the steps are drawn one at a time from
+the global np.random, in the order of the original walkers (np.random.pareto, then np.random.uniform for the angles),
+so the paths of a seeded run are the same as before the samplers existed. With "sampler": "stream", every walker owns
+its own random streams (seeded from the global np.random), and draws its step lengths and angles in blocks that are
+served one step at a time, so a step costs a list lookup instead of a NumPy call. Lengths and angles come from
+separate streams and every length uses exactly one uniform number, so the sampled steps do not depend on the block
+size: a block size of 1 is the scalar path. The two samplers draw from the same distribution, but not the same steps.
+"""
+import math
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_ALPHA = 1.5
+DEFAULT_MIN_LENGTH = 1.0
+DEFAULT_MAX_LENGTH = math.inf
+DEFAULT_BLOCK_SIZE = 1024
+SEED_BOUND = 2 ** 32
+LEVY_SAMPLERS = ("global", "stream")
+
+
+def pareto_lengths(uniforms: np.ndarray, alpha: float = DEFAULT_ALPHA, min_length: float = DEFAULT_MIN_LENGTH,
+                   max_length: float = DEFAULT_MAX_LENGTH) -> np.ndarray:
+    """
+    Transforms uniform numbers into Pareto distributed lengths by inverting the CDF, P(length > x) =
+    (min_length / x) ** alpha, truncated to at most max_length. Without truncation and with the default minimum this
+    is the distribution of np.random.pareto(alpha) + 1.
+
+    Parameters:
+        uniforms (np.ndarray): Uniform numbers in [0, 1).
+        alpha (float): The tail exponent.
+        min_length (float): The shortest length.
+        max_length (float): The longest length (math.inf for no truncation).
+
+    Returns:
+        np.ndarray: The lengths.
+    """
+
+    tail_mass = 1 - (min_length / max_length) ** alpha
+    return min_length * (1 - uniforms * tail_mass) ** (-1 / alpha)
+
+
+def global_lengths(size: Optional[int] = None, alpha: float = DEFAULT_ALPHA, min_length: float = DEFAULT_MIN_LENGTH,
+                   max_length: float = DEFAULT_MAX_LENGTH):
+    """
+    Draws Pareto distributed lengths from the global np.random. Without truncation this is np.random.pareto(alpha) + 1
+    (scaled by min_length), the draw of the original walkers; truncated lengths take one np.random.random number each
+    (see pareto_lengths).
+
+    Parameters:
+        size (int, optional): The number of lengths, None for a single float.
+        alpha (float): The tail exponent.
+        min_length (float): The shortest length.
+        max_length (float): The longest length (math.inf for no truncation).
+
+    Returns:
+        float or np.ndarray: The lengths.
+    """
+
+    if math.isinf(max_length):
+        return min_length * (np.random.pareto(alpha, size) + 1)
+    return pareto_lengths(np.random.random(size), alpha, min_length, max_length)
+
+
+class GlobalLevySampler:
+    """
+    The GlobalLevySampler class draws the steps of a single walker from the global np.random, one step at a time and
+    in the order of the original walkers.
+
+    Attributes:
+        dimension (int): 2 for a single angle per step, 3 for two angles (theta and phi).
+        alpha (float): The tail exponent of the step lengths.
+        min_length (float): The shortest step length.
+        max_length (float): The longest step length (math.inf for no truncation).
+    """
+
+    def __init__(self, dimension: int = 2, alpha: float = DEFAULT_ALPHA, min_length: float = DEFAULT_MIN_LENGTH,
+                 max_length: float = DEFAULT_MAX_LENGTH) -> None:
+        """
+        Constructs a new GlobalLevySampler instance.
+
+        Parameters:
+            dimension (int): 2 or 3.
+            alpha (float): The tail exponent of the step lengths, must be positive.
+            min_length (float): The shortest step length, must be positive.
+            max_length (float): The longest step length (math.inf for no truncation).
+        """
+        if alpha <= 0 or min_length <= 0 or max_length <= min_length:
+            raise ValueError(f'Invalid Lévy parameters: alpha={alpha}, min_length={min_length}, '
+                             f'max_length={max_length}')
+        self.dimension = dimension
+        self.alpha = alpha
+        self.min_length = min_length
+        self.max_length = max_length
+
+    def next_step(self) -> tuple:
+        """
+        Draws the next step.
+
+        Returns:
+            tuple: The step length and angle in 2D, the step length, theta and phi in 3D.
+        """
+        length = global_lengths(None, self.alpha, self.min_length, self.max_length)
+        if self.dimension == 2:
+            return length, np.random.uniform(0, 2 * np.pi)
+        return length, np.random.uniform(0, 2 * np.pi), np.random.uniform(0, np.pi)
+
+
+class LevySampler:
+    """
+    The LevySampler class serves the step lengths and angles of a single walker from pre-drawn blocks.
+
+    Attributes:
+        dimension (int): 2 for a single angle per step, 3 for two angles (theta and phi).
+        alpha (float): The tail exponent of the step lengths.
+        min_length (float): The shortest step length.
+        max_length (float): The longest step length (math.inf for no truncation).
+        block_size (int): The number of steps drawn at once.
+        length_stream (np.random.Generator): The stream of the uniform numbers behind the step lengths.
+        angle_stream (np.random.Generator): The stream of the uniform numbers behind the angles.
+        cursor (int): The index of the next step in the current block.
+    """
+
+    def __init__(self, dimension: int = 2, alpha: float = DEFAULT_ALPHA, min_length: float = DEFAULT_MIN_LENGTH,
+                 max_length: float = DEFAULT_MAX_LENGTH, block_size: int = DEFAULT_BLOCK_SIZE,
+                 seed: Optional[int] = None) -> None:
+        """
+        Constructs a new LevySampler instance.
+
+        Parameters:
+            dimension (int): 2 or 3.
+            alpha (float): The tail exponent of the step lengths, must be positive.
+            min_length (float): The shortest step length, must be positive.
+            max_length (float): The longest step length (math.inf for no truncation).
+            block_size (int): The number of steps drawn at once.
+            seed (int, optional): The seed of the walker's streams. If not provided, it is drawn from np.random.
+        """
+        if alpha <= 0 or min_length <= 0 or max_length <= min_length or block_size < 1:
+            raise ValueError(f'Invalid Lévy parameters: alpha={alpha}, min_length={min_length}, '
+                             f'max_length={max_length}, block_size={block_size}')
+        if seed is None:
+            seed = int(np.random.randint(SEED_BOUND, dtype=np.int64))
+        length_seed, angle_seed = np.random.SeedSequence(seed).spawn(2)
+        self.dimension = dimension
+        self.alpha = alpha
+        self.min_length = min_length
+        self.max_length = max_length
+        self.block_size = block_size
+        self.length_stream = np.random.default_rng(length_seed)
+        self.angle_stream = np.random.default_rng(angle_seed)
+        self.lengths: list[float] = []
+        self.angles: list = []
+        self.cursor = 0
+
+    def refill(self) -> None:
+        """draws the next block of lengths and angles"""
+        self.lengths = pareto_lengths(self.length_stream.random(self.block_size), self.alpha, self.min_length,
+                                      self.max_length).tolist()
+        if self.dimension == 2:
+            self.angles = (2 * np.pi * self.angle_stream.random(self.block_size)).tolist()
+        else:
+            self.angles = (self.angle_stream.random((self.block_size, 2)) * (2 * np.pi, np.pi)).tolist()
+        self.cursor = 0
+
+    def next_step(self) -> tuple:
+        """
+        Serves the next step.
+
+        Returns:
+            tuple: The step length and angle in 2D, the step length, theta and phi in 3D.
+        """
+        if self.cursor == len(self.lengths):
+            self.refill()
+        length, angle = self.lengths[self.cursor], self.angles[self.cursor]
+        self.cursor += 1
+        if self.dimension == 2:
+            return length, angle
+        return length, angle[0], angle[1]
+
+
+def sampler_from_config(levy_config: Optional[dict], dimension: int):
+    """
+    Creates a sampler from the "levy" section of a configuration, with the keys "sampler" (one of LEVY_SAMPLERS,
+    "global" by default), "alpha", "min_length", "max_length" (null for no truncation) and "block_size" (stream
+    samplers only), all optional.
+
+    Parameters:
+        levy_config (dict, optional): The "levy" section of the configuration.
+        dimension (int): 2 or 3.
+
+    Returns:
+        GlobalLevySampler or LevySampler: The sampler.
+    """
+
+    options = dict(levy_config or {})
+    sampler = options.pop("sampler", "global")
+    if sampler not in LEVY_SAMPLERS:
+        raise ValueError(f'Invalid Lévy sampler: {sampler}, expected one of {list(LEVY_SAMPLERS)}')
+    if options.get("max_length") is None:
+        options["max_length"] = DEFAULT_MAX_LENGTH
+    if sampler == "global":
+        options.pop("block_size", None)
+        return GlobalLevySampler(dimension, **options)
+    return LevySampler(dimension, **options)
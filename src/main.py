@@ -1,10 +1,17 @@
+import queue
 import subprocess
 import tempfile
+import threading
 import tkinter as tk
+from tkinter import ttk
 import json
 import sys
 import run3d
+import profiling
+import progress
 
+POLL_INTERVAL_MS = 100  # how often the progress window polls the output of the run2d worker
+PROFILE_MODE = None  # set by the --profile option (see profiling.profile_mode)
 NUM_STEPS_FOR_STATISTICS = [100, 150, 200, 250, 300, 350, 400, 450, 500, 550, 600, 650, 700, 750, 800, 850, 900, 950,
                             1000]
 
@@ -267,6 +274,8 @@ def run_main_3d(window, walker_type, num_steps, num_concurrent_walkers, portal_l
         "ice_option": ice_option,
         "restart_option": restart_option,
     }
+    if PROFILE_MODE is not None:
+        config["profile"] = PROFILE_MODE
     run3d.main(config)
 
 
@@ -377,10 +386,69 @@ def run_main_2d(window, num_steps, walker_type, num_runs, num_concurrent_walkers
         "restart_option": restart_option,
         "check_interactive_or_non": simulation_mode
     }
+    if not simulation_mode:
+        config["progress"] = "pipe"
     with tempfile.NamedTemporaryFile(suffix=".json", delete=False, mode='w') as temp:
         json.dump(config, temp)
         temp_path = temp.name
-    subprocess.run(["python", "run2d.py", temp_path])
+    command = ["python", "run2d.py", temp_path] + ([f"--profile={PROFILE_MODE}"] if PROFILE_MODE else [])
+    if simulation_mode:
+        subprocess.run(command)
+    else:
+        show_progress(window, subprocess.Popen(command, stdout=subprocess.PIPE, text=True, bufsize=1))
+
+
+def read_lines(stream, lines: queue.Queue) -> None:
+    """
+    Puts the lines of a stream into a queue, followed by None at its end. It runs in a thread, so the Tk main loop never
+    blocks on the pipe.
+
+    Parameters:
+        stream (TextIO): The stream, e.g. the stdout pipe of a subprocess.
+        lines (queue.Queue): The queue.
+    """
+    for line in stream:
+        lines.put(line)
+    lines.put(None)
+
+
+def show_progress(window, process):
+    """
+    Shows a progress bar of a non-interactive run2d worker, which reports its progress through its stdout pipe (see
+    progress.PipeRenderer). The pipe is polled from the Tk main loop every POLL_INTERVAL_MS, so the GUI keeps
+    responding; other output of the worker is passed on to the console. The window closes when the worker exits.
+
+    Parameters:
+        window (Tk): The Tk window of the GUI.
+        process (subprocess.Popen): The worker, with its stdout as a text pipe.
+    """
+
+    progress_window = tk.Toplevel(window)
+    progress_window.title("Running simulation")
+    progress_bar = ttk.Progressbar(progress_window, length=400, maximum=1.0)
+    progress_bar.pack(padx=20, pady=(20, 5))
+    status_label = tk.Label(progress_window, text="starting...")
+    status_label.pack(padx=20, pady=(5, 20))
+    lines = queue.Queue()
+    threading.Thread(target=read_lines, args=(process.stdout, lines), daemon=True).start()
+
+    def poll():
+        while not lines.empty():
+            line = lines.get_nowait()
+            if line is None:
+                process.wait()
+                progress_window.destroy()
+                return
+            update = progress.parse_progress_line(line)
+            if update is None:
+                print(line, end="")
+                continue
+            progress_bar["value"] = update.fraction
+            status_label.config(text=f"{update.fraction:.1%}  run {update.runs_done}/{update.total_runs}  "
+                                     f"{update.rate:,.0f} steps/s  eta {progress.format_seconds(update.eta)}")
+        progress_window.after(POLL_INTERVAL_MS, poll)
+
+    poll()
 
 def print_help_message():
     help_message = """
@@ -393,17 +461,24 @@ def print_help_message():
 
     The UI is self-explanatory - choose your parameters, press 'Run', and enjoy!
 
-    Usage: main.py [--help]
+    Usage: main.py [--help] [--profile[=sampling]]
 
     Options:
     --help            Show this help message and exit
+    --profile         Profile the phases of the simulations, the results are saved to the statistics directory
     """
     print(help_message)
 
 def main():
+    global PROFILE_MODE
     if "--help" in sys.argv:
         print_help_message()
     else:
+        try:
+            PROFILE_MODE = profiling.profile_mode(sys.argv[1:])[0]
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
         create_greeting_page()
 
 if __name__ == "__main__":
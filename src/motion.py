@@ -0,0 +1,207 @@
+import math
+from typing import Any, Optional
+
+import numpy as np
+
+
+class Trajectory:
+    """
+    The Trajectory class describes how an element moves over time. The center of the element drifts with a constant
+    velocity and orbits (in the x-y plane) around its drifting initial center, and its size (the length of obstacles
+    and portals, the radius of every other element) pulses around its initial size. Time is measured in steps.
+
+    Attributes:
+        velocity (tuple): The drift of the center per step.
+        orbit_radius (float): The radius of the orbit.
+        orbit_period (float): The number of steps of a full orbit (0 for no orbit).
+        phase (float): The angle (in radians) of the element on its orbit at step 0.
+        pulse_amplitude (float): The relative change of the size, the size stays within (1 +- pulse_amplitude) times
+            the initial size.
+        pulse_period (float): The number of steps of a full pulse (0 for no pulse).
+    """
+
+    def __init__(self, velocity: Optional[tuple] = None, orbit_radius: float = 0.0, orbit_period: float = 0,
+                 phase: float = 0.0, pulse_amplitude: float = 0.0, pulse_period: float = 0) -> None:
+        """
+        Constructs a new Trajectory instance. Without arguments the element stays where it is.
+
+        Parameters:
+            velocity (tuple, optional): The drift of the center per step. If not provided, the center does not drift.
+            orbit_radius (float): The radius of the orbit.
+            orbit_period (float): The number of steps of a full orbit (0 for no orbit).
+            phase (float): The angle (in radians) of the element on its orbit at step 0.
+            pulse_amplitude (float): The relative change of the size, must be smaller than 1.
+            pulse_period (float): The number of steps of a full pulse (0 for no pulse).
+        """
+        if not 0 <= abs(pulse_amplitude) < 1:
+            raise ValueError(f'Invalid pulse amplitude: {pulse_amplitude}')
+        self.velocity = velocity
+        self.orbit_radius = orbit_radius
+        self.orbit_period = orbit_period
+        self.phase = phase
+        self.pulse_amplitude = pulse_amplitude
+        self.pulse_period = pulse_period
+
+
+def angular_speed(period: float) -> float:
+    """returns the angle (in radians) per step of a periodic motion, 0 for a period of 0"""
+    return 2 * math.pi / period if period else 0.0
+
+
+def size_attribute(element) -> str:
+    """returns the name of the attribute that holds the size of an element ('length' for squares and cubes)"""
+    return 'length' if hasattr(element, 'length') else 'radius'
+
+
+class MotionPlan:
+    """
+    The MotionPlan class evaluates the trajectories of all elements of a simulation at once. The trajectory
+    parameters are stacked into arrays, so the centers and sizes of every element at a given step are computed with a
+    few vectorised operations, and only the elements that actually move are written back.
+
+    Attributes:
+        elements (list): The elements, in the order of the simulation's element list.
+        dimension (int): The number of coordinates of every center (2 or 3).
+        base_centers (np.ndarray): The centers at step 0, of shape (elements, dimension).
+        base_sizes (np.ndarray): The sizes at step 0, of shape (elements,).
+        velocities (np.ndarray): The drift per step, of shape (elements, dimension).
+        orbit_radii (np.ndarray): The orbit radii, of shape (elements,).
+        orbit_speeds (np.ndarray): The orbit angular speeds (radians per step), of shape (elements,).
+        phases (np.ndarray): The orbit phases, of shape (elements,).
+        pulse_amplitudes (np.ndarray): The relative pulse amplitudes, of shape (elements,).
+        pulse_speeds (np.ndarray): The pulse angular speeds (radians per step), of shape (elements,).
+        moving (np.ndarray): The indices of the elements whose center or size changes over time.
+        current_step (int): The step the elements were last moved to, None before the first `apply`.
+        current_centers (np.ndarray): The centers at `current_step`.
+        current_sizes (np.ndarray): The sizes at `current_step`.
+    """
+
+    def __init__(self, elements: list, trajectories: dict, dimension: int) -> None:
+        """
+        Constructs a new MotionPlan instance.
+
+        Parameters:
+            elements (list): The elements of the simulation.
+            trajectories (dict): The Trajectory of every moving element, keyed by the element. Elements without a
+                trajectory stay where they are.
+            dimension (int): The number of coordinates of every center (2 or 3).
+        """
+        num_elements = len(elements)
+        self.elements = elements
+        self.dimension = dimension
+        self.base_centers = np.array([element.center_loc for element in elements], dtype=float).reshape(-1, dimension)
+        self.base_sizes = np.array([getattr(element, size_attribute(element)) for element in elements], dtype=float)
+        self.velocities = np.zeros((num_elements, dimension))
+        self.orbit_radii = np.zeros(num_elements)
+        self.orbit_speeds = np.zeros(num_elements)
+        self.phases = np.zeros(num_elements)
+        self.pulse_amplitudes = np.zeros(num_elements)
+        self.pulse_speeds = np.zeros(num_elements)
+        for index, element in enumerate(elements):
+            trajectory = trajectories.get(element)
+            if trajectory is None:
+                continue
+            if trajectory.velocity is not None:
+                self.velocities[index] = trajectory.velocity
+            self.orbit_radii[index] = trajectory.orbit_radius
+            self.orbit_speeds[index] = angular_speed(trajectory.orbit_period)
+            self.phases[index] = trajectory.phase
+            self.pulse_amplitudes[index] = trajectory.pulse_amplitude
+            self.pulse_speeds[index] = angular_speed(trajectory.pulse_period)
+        orbiting = (self.orbit_radii != 0) & (self.orbit_speeds != 0)
+        pulsing = (self.pulse_amplitudes != 0) & (self.pulse_speeds != 0)
+        self.moving = np.flatnonzero(self.velocities.any(axis=1) | orbiting | pulsing)
+        self.current_step: Optional[int] = None
+        self.current_centers = self.base_centers
+        self.current_sizes = self.base_sizes
+
+    def centers(self, step: int) -> np.ndarray:
+        """
+        Evaluates the centers of all elements at a step.
+
+        Parameters:
+            step (int): The step.
+
+        Returns:
+            np.ndarray: The centers, of shape (elements, dimension).
+        """
+        angles = self.orbit_speeds * step + self.phases
+        centers = self.base_centers + self.velocities * step
+        centers[:, 0] += self.orbit_radii * (np.cos(angles) - np.cos(self.phases))
+        centers[:, 1] += self.orbit_radii * (np.sin(angles) - np.sin(self.phases))
+        return centers
+
+    def sizes(self, step: int) -> np.ndarray:
+        """
+        Evaluates the sizes of all elements at a step.
+
+        Parameters:
+            step (int): The step.
+
+        Returns:
+            np.ndarray: The sizes, of shape (elements,).
+        """
+        return self.base_sizes * (1 + self.pulse_amplitudes * np.sin(self.pulse_speeds * step))
+
+    def max_displacements(self, num_steps: int) -> np.ndarray:
+        """
+        Bounds how far the center of every element can move within a number of steps.
+
+        Parameters:
+            num_steps (int): The number of steps.
+
+        Returns:
+            np.ndarray: The largest possible displacement of every element, of shape (elements,).
+        """
+        drift = np.sqrt((self.velocities ** 2).sum(axis=1)) * num_steps
+        orbit = np.abs(self.orbit_radii) * np.minimum(np.abs(self.orbit_speeds) * num_steps, 2)
+        return drift + orbit
+
+    def apply(self, step: int) -> None:
+        """
+        Moves and resizes the moving elements to their state at a step and refreshes their cached geometry (see the
+        elements' `invalidate`). Static elements are not touched. The centers and sizes of all elements are kept in
+        `current_centers` and `current_sizes`.
+
+        Parameters:
+            step (int): The step.
+        """
+        if step == self.current_step:
+            return
+        self.current_step = step
+        self.current_centers = self.centers(step)
+        self.current_sizes = self.sizes(step)
+        centers = self.current_centers[self.moving].tolist()
+        sizes = self.current_sizes[self.moving].tolist()
+        for index, center, size in zip(self.moving.tolist(), centers, sizes):
+            element = self.elements[index]
+            element.center_loc = tuple(center)
+            setattr(element, size_attribute(element), size)
+            element.invalidate()
+
+
+def trajectories_from_config(motion_config: Optional[dict[str, Any]], groups: dict[str, list]) -> dict:
+    """
+    Creates the trajectories described by the "trajectories" section of a configuration, which maps a group of
+    elements (e.g. "obstacles") to the keyword arguments of the Trajectory of every element in the group.
+    A "phase_spread" of True spreads the phases of the group's elements evenly over the orbit.
+
+    Parameters:
+        motion_config (dict[str, Any], optional): The "trajectories" section of the configuration.
+        groups (dict[str, list]): The elements of the simulation, keyed by the group names.
+
+    Returns:
+        dict: The Trajectory of every moving element, keyed by the element.
+    """
+
+    trajectories = {}
+    for group, arguments in (motion_config or {}).items():
+        if group not in groups:
+            raise ValueError(f'Unknown element group: {group}')
+        arguments = dict(arguments)
+        phase_spread = arguments.pop("phase_spread", False)
+        elements = groups[group]
+        for index, element in enumerate(elements):
+            phase = 2 * math.pi * index / len(elements) if phase_spread else arguments.get("phase", 0.0)
+            trajectories[element] = Trajectory(**{**arguments, "phase": phase})
+    return trajectories
@@ -0,0 +1,114 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+DIFFUSIVE_TOLERANCE = 0.1  # exponents within 1 +- tolerance are considered normal diffusion
+FIT_LAG_FRACTION = 0.25  # only lags up to this fraction of the path length are fitted, longer lags are too noisy
+
+
+def autocorrelation_fft(trajectories: np.ndarray) -> np.ndarray:
+    """
+    Calculates the time-averaged position autocorrelation of every walker, summed over the coordinates,
+    with the FFT in O(T log T).
+
+    Parameters:
+        trajectories (np.ndarray): Positions of shape (walkers, steps, dimension).
+
+    Returns:
+        np.ndarray: An array of shape (walkers, steps), where entry [w, m] is the average of x(t) * x(t + m)
+        over all the time origins t.
+    """
+
+    num_points = trajectories.shape[1]
+    spectrum = np.fft.rfft(trajectories, n=2 * num_points, axis=1)
+    correlation = np.fft.irfft(spectrum * spectrum.conjugate(), n=2 * num_points, axis=1)[:, :num_points]
+    return correlation.sum(axis=2) / (num_points - np.arange(num_points))
+
+
+def time_averaged_msd(trajectories: np.ndarray) -> np.ndarray:
+    """
+    Calculates the time-averaged mean squared displacement of every walker for every lag, averaging over all
+    the time origins. Uses MSD(m) = S1(m) - 2 * S2(m), where S2 is the autocorrelation (computed with the FFT)
+    and S1 is computed from cumulative sums of the squared positions.
+
+    Parameters:
+        trajectories (np.ndarray): Positions of shape (walkers, steps, dimension) or (steps, dimension).
+
+    Returns:
+        np.ndarray: An array of shape (walkers, steps) (or (steps,) for a single path) with the MSD of lag 0 to
+        steps - 1.
+    """
+
+    trajectories = np.asarray(trajectories, dtype=float)
+    single_path = trajectories.ndim == 2
+    if single_path:
+        trajectories = trajectories[np.newaxis]
+    num_points = trajectories.shape[1]
+    squared = (trajectories ** 2).sum(axis=2)
+    removed = np.zeros_like(squared)
+    removed[:, 1:] = np.cumsum(squared[:, :-1] + squared[:, :0:-1], axis=1)
+    s1 = (2 * squared.sum(axis=1, keepdims=True) - removed) / (num_points - np.arange(num_points))
+    msd = s1 - 2 * autocorrelation_fft(trajectories)
+    msd[:, 0] = 0
+    np.maximum(msd, 0, out=msd)  # rounding can leave tiny negative values where the true MSD is 0
+    return msd[0] if single_path else msd
+
+
+def ensemble_msd(trajectories: np.ndarray) -> np.ndarray:
+    """
+    Calculates the MSD curve averaged over all walkers and all time origins.
+
+    Parameters:
+        trajectories (np.ndarray): Positions of shape (walkers, steps, dimension).
+
+    Returns:
+        np.ndarray: The MSD for lag 0 to steps - 1.
+    """
+
+    return time_averaged_msd(trajectories).mean(axis=0)
+
+
+def fit_diffusion_exponent(msd: np.ndarray, min_lag: int = 1, max_lag: Optional[int] = None) -> tuple[float, float]:
+    """
+    Fits MSD(lag) = coefficient * lag ** exponent with a least squares line in log-log scale.
+
+    Parameters:
+        msd (np.ndarray): The MSD for lag 0 to len(msd) - 1.
+        min_lag (int): The smallest lag used for the fit.
+        max_lag (int, optional): The largest lag used for the fit. Defaults to FIT_LAG_FRACTION of the curve.
+
+    Returns:
+        tuple[float, float]: The exponent and the coefficient, or (nan, nan) if the curve can not be fitted.
+    """
+
+    if max_lag is None:
+        max_lag = max(int(len(msd) * FIT_LAG_FRACTION), min_lag + 1)
+    lags = np.arange(min_lag, min(max_lag, len(msd) - 1) + 1)
+    values = msd[lags]
+    valid = values > 0
+    if valid.sum() < 2:
+        return math.nan, math.nan
+    exponent, log_coefficient = np.polyfit(np.log(lags[valid]), np.log(values[valid]), 1)
+    return float(exponent), float(np.exp(log_coefficient))
+
+
+def classify_diffusion(exponent: float, tolerance: float = DIFFUSIVE_TOLERANCE) -> str:
+    """
+    Classifies the motion by its diffusion exponent.
+
+    Parameters:
+        exponent (float): The fitted diffusion exponent.
+        tolerance (float): How far from 1 the exponent may be and still count as normal diffusion.
+
+    Returns:
+        str: 'subdiffusive', 'diffusive', 'superdiffusive', or 'unknown' if the exponent is nan.
+    """
+
+    if math.isnan(exponent):
+        return 'unknown'
+    if exponent < 1 - tolerance:
+        return 'subdiffusive'
+    if exponent > 1 + tolerance:
+        return 'superdiffusive'
+    return 'diffusive'
@@ -10,6 +10,8 @@ class Obstacle:
     Attributes:
         length (float): The length of the obstacle.
         center_loc (tuple[float, float]): The center location of the obstacle.
+        min_corner (tuple[float, float]): The bottom left corner of the obstacle, computed by `invalidate`.
+        max_corner (tuple[float, float]): The top right corner of the obstacle, computed by `invalidate`.
     """
 
     def __init__(self, length=None, center_loc=None):
@@ -23,6 +25,16 @@ class Obstacle:
         self.title = "Obstacle"
         self.length = helper.generate_random_length() if length is None else length
         self.center_loc = helper.generate_random_coordinate() if center_loc is None else center_loc
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """
+        Recomputes the cached bounds of the obstacle. Has to be called whenever its center or length changes.
+        """
+        x, y = self.center_loc
+        half_length = self.length / 2
+        self.min_corner = (x - half_length, y - half_length)
+        self.max_corner = (x + half_length, y + half_length)
 
     def is_inside_obstacle(self, position_of_walker: tuple) -> bool:
         """
@@ -35,14 +47,9 @@ class Obstacle:
             bool: True if the walker is inside the obstacle, False otherwise.
         """
         x, y = position_of_walker
-        corner_list = self.obstacle_corners()
-        top_left_x, top_left_y = corner_list[0]
-        bottom_left_x, bottom_left_y = corner_list[1]
-        top_right_x, top_right_y = corner_list[2]
-        bottom_right_x, bottom_right_y = corner_list[3]
-        if top_left_x <= x <= top_right_x and bottom_left_y <= y <= top_left_y:
-            return True
-        return False
+        min_x, min_y = self.min_corner
+        max_x, max_y = self.max_corner
+        return min_x <= x <= max_x and min_y <= y <= max_y
 
     def obstacle_block(self, position_of_walker: tuple) -> Union[tuple, bool]:
         """
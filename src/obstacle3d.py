@@ -4,10 +4,13 @@ from typing import Union
 
 class Obstacle3d:
     """
-    Returns the corners of the obstacle.
+    The Obstacle3d class represents a cube shaped obstacle in a 3D simulation.
 
-    Returns:
-        list[tuple[float, float]]: A list of tuples representing the corners of the obstacle.
+    Attributes:
+        length (float): The length of the obstacle.
+        center_loc (tuple[float, float, float]): The center location of the obstacle.
+        min_corner (tuple[float, float, float]): The lowest corner of the obstacle, computed by `invalidate`.
+        max_corner (tuple[float, float, float]): The highest corner of the obstacle, computed by `invalidate`.
     """
 
     def __init__(self, length=None, center_loc=None):
@@ -20,6 +23,16 @@ class Obstacle3d:
         """
         self.length = helper.generate_random_length() if length is None else length
         self.center_loc = helper.generate_random_coordinate_3d() if center_loc is None else center_loc
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """
+        Recomputes the cached bounds of the obstacle. Has to be called whenever its center or length changes.
+        """
+        x, y, z = self.center_loc
+        half_length = self.length / 2
+        self.min_corner = (x - half_length, y - half_length, z - half_length)
+        self.max_corner = (x + half_length, y + half_length, z + half_length)
 
     def is_inside_obstacle_3d(self, position_of_walker3d: tuple[float, float, float]) -> bool:
         """
@@ -32,11 +45,9 @@ class Obstacle3d:
             bool: True if the walker is inside the obstacle, False otherwise.
         """
         x, y, z = position_of_walker3d
-        corners_list = self.obstacle_corners_3d()
-        if corners_list[0][0] <= x <= corners_list[4][0] and corners_list[0][1] <= y <= corners_list[2][1] and \
-                corners_list[0][2] <= z <= corners_list[1][2]:
-            return True
-        return False
+        min_x, min_y, min_z = self.min_corner
+        max_x, max_y, max_z = self.max_corner
+        return min_x <= x <= max_x and min_y <= y <= max_y and min_z <= z <= max_z
 
     def obstacle_block(self, position_of_walker3d: tuple[float, float, float]) -> Union[
         tuple[float, float, float], bool]:
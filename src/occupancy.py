@@ -0,0 +1,214 @@
+from typing import Optional, Union
+
+import numpy as np
+
+DEFAULT_BIN_SIZE = 1.0
+DEFAULT_HALF_EXTENT = 60  # matches the area where helper.generate_random_coordinate places elements
+GROWTH_FACTOR = 2
+BINCOUNT_DENSITY = 8  # use bincount once a batch is larger than 1/BINCOUNT_DENSITY of the grid
+MAX_GRID_CELLS = 2 ** 24  # an auto expanding grid never grows beyond this, far away positions are dropped
+
+
+class OccupancyGrid:
+    """
+    The OccupancyGrid class accumulates how many steps walkers spend in each cell of a 2D or 3D grid.
+    It is fed batches of positions, so it never needs the full paths of the walkers.
+
+    Attributes:
+        dimension (int): The number of coordinates of every position (2 or 3).
+        bin_size (float): The side length of a single cell.
+        auto_expand (bool): A flag indicating whether the grid grows to cover positions outside of it.
+        origin_cell (np.ndarray): The index (in units of bin_size) of the lowest cell of the grid.
+        counts (np.ndarray): The number of recorded positions in every cell.
+        dropped (int): The number of positions that fell outside the grid.
+    """
+
+    def __init__(self, dimension: int = 2, bin_size: float = DEFAULT_BIN_SIZE,
+                 bounds: Optional[tuple[tuple, tuple]] = None, auto_expand: bool = True) -> None:
+        """
+        Constructs a new OccupancyGrid instance.
+
+        Parameters:
+            dimension (int): The number of coordinates of every position (2 or 3).
+            bin_size (float): The side length of a single cell.
+            bounds (tuple[tuple, tuple], optional): The minimum and maximum corners of the grid. If not provided,
+                the grid covers the area where random elements are placed.
+            auto_expand (bool): If True, the grid grows to cover positions outside of its bounds, otherwise
+                these positions are counted in `dropped`.
+        """
+        if dimension not in (2, 3):
+            raise ValueError(f'Invalid dimension: {dimension}')
+        if bin_size <= 0:
+            raise ValueError(f'Invalid bin size: {bin_size}')
+        if bounds is None:
+            bounds = ((-DEFAULT_HALF_EXTENT,) * dimension, (DEFAULT_HALF_EXTENT,) * dimension)
+        self.dimension = dimension
+        self.bin_size = bin_size
+        self.auto_expand = auto_expand
+        low = np.floor(np.asarray(bounds[0], dtype=float) / bin_size).astype(np.int64)
+        high = np.floor(np.asarray(bounds[1], dtype=float) / bin_size).astype(np.int64)
+        self.origin_cell = low
+        self.counts = np.zeros(tuple(high - low + 1), dtype=np.int64)
+        self.dropped = 0
+
+    def add_batch(self, positions: Union[np.ndarray, list]) -> None:
+        """
+        Adds a batch of positions to the grid.
+
+        Parameters:
+            positions (np.ndarray or list): Positions of shape (..., dimension), e.g. (steps, walkers, dimension).
+        """
+        points = np.asarray(positions, dtype=float).reshape(-1, self.dimension)
+        points = points[np.isfinite(points).all(axis=1)]
+        if len(points) == 0:
+            return
+        cells = np.floor(points / self.bin_size).astype(np.int64)
+        if self.auto_expand:
+            self.expand_to(cells.min(axis=0), cells.max(axis=0))
+        indices = cells - self.origin_cell
+        shape = np.asarray(self.counts.shape)
+        inside = ((indices >= 0) & (indices < shape)).all(axis=1)
+        if not inside.all():
+            self.dropped += int(len(indices) - inside.sum())
+            indices = indices[inside]
+        flat = np.ravel_multi_index(tuple(indices.T), self.counts.shape)
+        if len(flat) * BINCOUNT_DENSITY >= self.counts.size:
+            self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+        else:
+            np.add.at(self.counts.reshape(-1), flat, 1)
+
+    def expand_to(self, low_cell: np.ndarray, high_cell: np.ndarray) -> bool:
+        """
+        Grows the grid so it covers the given cell range. The grid grows geometrically so that a walker
+        drifting away does not cause a reallocation on every batch, but never beyond MAX_GRID_CELLS.
+
+        Parameters:
+            low_cell (np.ndarray): The lowest cell index that has to be covered.
+            high_cell (np.ndarray): The highest cell index that has to be covered.
+
+        Returns:
+            bool: True if the grid covers the given range, False if it would have grown too large.
+        """
+        size = np.asarray(self.counts.shape)
+        current_high = self.origin_cell + size - 1
+        needed_low = np.maximum(self.origin_cell - low_cell, 0)
+        needed_high = np.maximum(high_cell - current_high, 0)
+        if not needed_low.any() and not needed_high.any():
+            return True
+        slack = size * (GROWTH_FACTOR - 1) // 2
+        pad_low = np.where(needed_low > 0, np.maximum(needed_low, slack), 0)
+        pad_high = np.where(needed_high > 0, np.maximum(needed_high, slack), 0)
+        if np.prod(size + pad_low + pad_high, dtype=float) > MAX_GRID_CELLS:
+            pad_low, pad_high = needed_low, needed_high
+            if np.prod(size + pad_low + pad_high, dtype=float) > MAX_GRID_CELLS:
+                return False
+        self.counts = np.pad(self.counts, list(zip(pad_low, pad_high)))
+        self.origin_cell = self.origin_cell - pad_low
+        return True
+
+    def merge(self, other: 'OccupancyGrid') -> 'OccupancyGrid':
+        """
+        Adds the counts of another grid (e.g. one filled by a different worker) into this grid.
+
+        Parameters:
+            other (OccupancyGrid): The grid to merge. It must have the same dimension and bin size.
+
+        Returns:
+            OccupancyGrid: This grid, after the merge.
+        """
+        if other.dimension != self.dimension or other.bin_size != self.bin_size:
+            raise ValueError('Cannot merge occupancy grids with different dimension or bin size')
+        other_high = other.origin_cell + np.asarray(other.counts.shape) - 1
+        if not self.expand_to(other.origin_cell, other_high):
+            raise ValueError('The merged occupancy grid would be larger than MAX_GRID_CELLS')
+        offset = other.origin_cell - self.origin_cell
+        region = tuple(slice(start, start + length) for start, length in zip(offset, other.counts.shape))
+        self.counts[region] += other.counts
+        self.dropped += other.dropped
+        return self
+
+    def total(self) -> int:
+        """returns the number of positions recorded in the grid"""
+        return int(self.counts.sum())
+
+    def fraction(self) -> np.ndarray:
+        """returns the fraction of the recorded positions that fell in every cell"""
+        total = self.total()
+        if total == 0:
+            return np.zeros(self.counts.shape)
+        return self.counts / total
+
+    def edges(self) -> list[np.ndarray]:
+        """
+        Returns the cell edges along every axis.
+
+        Returns:
+            list[np.ndarray]: For every axis, an array of length (cells + 1) with the cell edges.
+        """
+        return [(self.origin_cell[axis] + np.arange(self.counts.shape[axis] + 1)) * self.bin_size
+                for axis in range(self.dimension)]
+
+    def extent(self) -> tuple[float, float, float, float]:
+        """returns the (left, right, bottom, top) extent of the x-y plane of the grid, as used by imshow"""
+        x_edges, y_edges = self.edges()[:2]
+        return x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]
+
+    def projection(self) -> np.ndarray:
+        """returns the counts of the x-y plane, summing over z for 3D grids"""
+        if self.dimension == 3:
+            return self.counts.sum(axis=2)
+        return self.counts
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """
+        Exports the grid as plain arrays.
+
+        Returns:
+            dict[str, np.ndarray]: The counts, the lowest cell index and the bin size of the grid.
+        """
+        return {
+            "counts": self.counts.copy(),
+            "origin_cell": self.origin_cell.copy(),
+            "bin_size": np.asarray(self.bin_size),
+            "dropped": np.asarray(self.dropped),
+        }
+
+    def save(self, path: str) -> None:
+        """
+        Saves the grid to a .npz file.
+
+        Parameters:
+            path (str): The path of the file.
+        """
+        np.savez_compressed(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path: str) -> 'OccupancyGrid':
+        """
+        Loads a grid that was saved with `save`.
+
+        Parameters:
+            path (str): The path of the file.
+
+        Returns:
+            OccupancyGrid: The loaded grid.
+        """
+        return cls.from_arrays(np.load(path))
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, np.ndarray]) -> 'OccupancyGrid':
+        """
+        Creates a grid from the arrays exported by `to_arrays`.
+
+        Parameters:
+            arrays (dict[str, np.ndarray]): The arrays.
+
+        Returns:
+            OccupancyGrid: The grid.
+        """
+        counts = arrays["counts"]
+        grid = cls(dimension=counts.ndim, bin_size=float(arrays["bin_size"]))
+        grid.counts = counts.astype(np.int64)
+        grid.origin_cell = arrays["origin_cell"].astype(np.int64)
+        grid.dropped = int(arrays["dropped"])
+        return grid
@@ -0,0 +1,143 @@
+"""
+Mergeable partial statistics. run2d.calculate_stats needs all paths of an N at once, which is not possible when the
+runs of an N are spread over machines. A PartialStats keeps the sufficient statistics of the paths of some runs
+instead: sums over the walkers (end distances, axis crossings, event counts and the MSD curve) and the per-walker exit
+times for the Kaplan-Meier estimate. Partial statistics of disjoint runs are merged by adding the sums and
+concatenating the exit times, and the merged statistics give the same averages as calculate_stats on all paths (up to
+the rounding of the summation order).
+"""
+import base64
+from typing import Any, Optional
+
+import numpy as np
+
+import events
+import first_passage
+import msd
+
+SUM_NAMES = ("distance_from_origin", "distance_from_x_axis", "distance_from_y_axis", "crosses_y_axis",
+             "crosses_x_axis")
+
+
+def encode_array(array: np.ndarray) -> dict[str, Any]:
+    """returns an array as a JSON-able dict, with its bytes in base64"""
+    array = np.ascontiguousarray(array)
+    return {"dtype": array.dtype.str, "shape": list(array.shape), "data": base64.b64encode(array.tobytes()).decode()}
+
+
+def decode_array(encoded: dict[str, Any]) -> np.ndarray:
+    """returns the array of a dict created by encode_array"""
+    return np.frombuffer(base64.b64decode(encoded["data"]), dtype=encoded["dtype"]).reshape(encoded["shape"]).copy()
+
+
+class PartialStats:
+    """
+    The PartialStats class holds the sufficient statistics of the paths of some runs of an N.
+
+    Attributes:
+        num_walkers (int): The number of paths.
+        sums (dict[str, float]): The sums over the walkers of the values in SUM_NAMES.
+        event_sums (dict[str, int]): The total count of every event (see events.EVENT_NAMES).
+        msd_sum (np.ndarray): The sum over the walkers of the time averaged MSD curves.
+        exit_steps (np.ndarray): The exit step of every walker, or its last step if it never exited.
+        exited (np.ndarray): A bool array, True for the walkers that exited.
+    """
+
+    def __init__(self, num_walkers: int, sums: dict[str, float], event_sums: dict[str, int], msd_sum: np.ndarray,
+                 exit_steps: np.ndarray, exited: np.ndarray) -> None:
+        """
+        Constructs a new PartialStats instance.
+        """
+        self.num_walkers = num_walkers
+        self.sums = sums
+        self.event_sums = event_sums
+        self.msd_sum = msd_sum
+        self.exit_steps = exit_steps
+        self.exited = exited
+
+    @classmethod
+    def from_run(cls, paths, step_events: Optional[np.ndarray], radius: float) -> 'PartialStats':
+        """
+        Computes the partial statistics of the paths of a run.
+
+        Parameters:
+            paths (list or np.ndarray): The paths of the walkers.
+            step_events (np.ndarray, optional): The event codes of the paths, of shape (walkers, steps).
+            radius (float): The radius of the exit circle.
+
+        Returns:
+            PartialStats: The partial statistics.
+        """
+        trajectories = np.asarray(paths, dtype=float)
+        ends = trajectories[:, -1]
+        exit_steps, exited = first_passage.censor(first_passage.exit_times(trajectories, [radius])[:, 0],
+                                                  trajectories.shape[1])
+        sums = {
+            "distance_from_origin": float(np.sqrt(ends[:, 0] ** 2 + ends[:, 1] ** 2).sum()),
+            "distance_from_x_axis": float(np.abs(ends[:, 1]).sum()),
+            "distance_from_y_axis": float(np.abs(ends[:, 0]).sum()),
+            "crosses_y_axis": float(events.axis_crossings(trajectories, 0).sum()),
+            "crosses_x_axis": float(events.axis_crossings(trajectories, 1).sum()),
+        }
+        event_sums = {} if step_events is None else \
+            {name: int(events.count_events(step_events, code).sum()) for name, code in events.EVENT_NAMES.items()}
+        return cls(len(trajectories), sums, event_sums, msd.time_averaged_msd(trajectories).sum(axis=0),
+                   exit_steps.astype(np.int64), exited)
+
+    def merge(self, other: 'PartialStats') -> 'PartialStats':
+        """
+        Returns the partial statistics of the runs of both partial statistics.
+
+        Parameters:
+            other (PartialStats): The partial statistics of other runs of the same N.
+
+        Returns:
+            PartialStats: The merged statistics.
+        """
+        return PartialStats(self.num_walkers + other.num_walkers,
+                            {name: self.sums[name] + other.sums[name] for name in SUM_NAMES},
+                            {name: self.event_sums[name] + other.event_sums[name] for name in self.event_sums
+                             if name in other.event_sums},
+                            self.msd_sum + other.msd_sum,
+                            np.concatenate((self.exit_steps, other.exit_steps)),
+                            np.concatenate((self.exited, other.exited)))
+
+    def finalize(self, stats: dict[str, dict[int, float]], num_steps: int) -> dict[str, dict[int, float]]:
+        """
+        Adds the averages of the partial statistics to the statistics of run2d.calculate_stats.
+
+        Parameters:
+            stats (dict[str, dict[int, float]]): The current statistics (see run2d.new_stats).
+            num_steps (int): The number of steps.
+
+        Returns:
+            dict[str, dict[int, float]]: The updated statistics.
+        """
+        count = self.num_walkers
+        num_points = len(self.msd_sum)
+        stats["avg_distance_from_origin"][num_steps] = self.sums["distance_from_origin"] / count
+        stats["avg_distance_from_x_axis"][num_steps] = self.sums["distance_from_x_axis"] / count
+        stats["avg_distance_from_y_axis"][num_steps] = self.sums["distance_from_y_axis"] / count
+        if self.exited.any():
+            stats["avg_num_steps_to_exit_circle"][num_steps] = float(self.exit_steps[self.exited].mean())
+        stats["km_mean_steps_to_exit_circle"][num_steps] = first_passage.restricted_mean(self.exit_steps, self.exited,
+                                                                                         num_points)
+        stats["avg_total_walker_crosse_y_axis"][num_steps] = self.sums["crosses_y_axis"] / count
+        stats["avg_total_walker_crosses_x_axis"][num_steps] = self.sums["crosses_x_axis"] / count
+        for name, total in self.event_sums.items():
+            if f"avg_{name}" in stats:
+                stats[f"avg_{name}"][num_steps] = total / count
+        stats["diffusion_exponent"][num_steps] = msd.fit_diffusion_exponent(self.msd_sum / count)[0]
+        return stats
+
+    def to_message(self) -> dict[str, Any]:
+        """returns the partial statistics as a JSON-able dict"""
+        return {"num_walkers": self.num_walkers, "sums": self.sums, "event_sums": self.event_sums,
+                "msd_sum": encode_array(self.msd_sum), "exit_steps": encode_array(self.exit_steps),
+                "exited": encode_array(self.exited)}
+
+    @classmethod
+    def from_message(cls, message: dict[str, Any]) -> 'PartialStats':
+        """returns the partial statistics of a dict created by to_message"""
+        return cls(message["num_walkers"], message["sums"], message["event_sums"], decode_array(message["msd_sum"]),
+                   decode_array(message["exit_steps"]), decode_array(message["exited"]))
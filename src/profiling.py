@@ -0,0 +1,211 @@
+"""
+The profiling mode of the runners. A PhaseProfiler splits a run into named phases (scenario build, simulate, stats,
+plot, CSV) and profiles every phase separately, accumulating over the repeated visits of a phase:
+    cProfile      a profile per phase, saved as profile_<phase>.pstats (load it with pstats or snakeviz)
+    sampling      a background thread samples the stack of the profiled thread, the samples of all phases are saved
+                  as flamegraph-ready collapsed stacks (profile.collapsed, rooted at the phase, for flamegraph.pl or
+                  speedscope)
+    tracemalloc   a snapshot at every phase boundary, the allocations made within every phase are attributed to their
+                  source lines in profile_memory.txt
+The "cprofile" mode runs the sampler next to cProfile, the "sampling" mode only samples, which disturbs the timings
+much less. The wall time, the net allocated memory and the peak memory of every phase are saved to
+profile_phases.json. Tracing the allocations slows allocation-heavy phases (e.g. plotting) down for both modes, so
+the wall times are only comparable between profiled runs.
+"""
+import cProfile
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Optional
+
+PROFILE_MODES = ("cprofile", "sampling")
+SAMPLE_INTERVAL = 0.001  # the seconds between two samples of the stack
+TOP_ALLOCATIONS = 15  # the number of source lines listed per phase in the memory report
+
+
+def frame_label(frame) -> str:
+    """returns the name of a stack frame in the collapsed stacks, e.g. 'make_a_move (simulation.py:72)'"""
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class PhaseProfiler:
+    """
+    The PhaseProfiler class profiles the phases of a run of the calling thread.
+
+    Attributes:
+        mode (str): "cprofile" or "sampling".
+        output_dir (str): The directory the results are written to.
+        interval (float): The seconds between two samples of the stack.
+        profiles (dict[str, cProfile.Profile]): The profile of every phase (empty in the sampling mode).
+        samples (dict[str, int]): The number of samples of every collapsed stack.
+        phases (dict[str, dict]): The visits, wall seconds, net allocated bytes and peak bytes of every phase.
+        allocations (dict[str, dict]): The bytes and blocks allocated within every phase, keyed by source line.
+        started_tracing (bool): True if the profiler started tracemalloc, and stops it when it is closed.
+    """
+
+    def __init__(self, mode: str = "cprofile", output_dir: str = '../statistics',
+                 interval: float = SAMPLE_INTERVAL) -> None:
+        """
+        Constructs a new PhaseProfiler instance, and starts tracing the memory allocations.
+
+        Parameters:
+            mode (str): "cprofile" (cProfile and sampling) or "sampling" (sampling only).
+            output_dir (str): The directory the results are written to.
+            interval (float): The seconds between two samples of the stack.
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f'Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}')
+        self.mode = mode
+        self.output_dir = output_dir
+        self.interval = interval
+        self.profiles: dict[str, cProfile.Profile] = {}
+        self.samples: dict[str, int] = {}
+        self.phases: dict[str, dict[str, Any]] = {}
+        self.allocations: dict[str, dict[str, dict[str, int]]] = {}
+        self.current_phase: Optional[str] = None
+        self.thread_id = threading.get_ident()
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, daemon=True)
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        self.sampler.start()
+
+    def sample(self) -> None:
+        """the loop of the sampler thread, which counts the stack of the profiled thread while a phase is active"""
+        while not self.stopped.wait(self.interval):
+            phase = self.current_phase
+            frame = sys._current_frames().get(self.thread_id)
+            if phase is None or frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            stack = ';'.join([phase] + labels[::-1])
+            self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """
+        Profiles the code run within the context as a visit of a phase.
+
+        Parameters:
+            name (str): The name of the phase.
+        """
+        stats = self.phases.setdefault(name, {"visits": 0, "seconds": 0.0, "allocated_bytes": 0, "peak_bytes": 0})
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        profile = None
+        if self.mode == "cprofile":
+            profile = self.profiles.setdefault(name, cProfile.Profile())
+        self.current_phase = name
+        start = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            stats["seconds"] += time.perf_counter() - start
+            self.current_phase = None
+            stats["visits"] += 1
+            stats["peak_bytes"] = max(stats["peak_bytes"], tracemalloc.get_traced_memory()[1])
+            self.attribute_allocations(name, tracemalloc.take_snapshot().compare_to(before, 'lineno'))
+
+    def attribute_allocations(self, name: str, differences: list) -> None:
+        """
+        Adds the differences between the snapshots of the boundaries of a visit of a phase to its allocations, without
+        the allocations of tracemalloc and of the profiler itself.
+        """
+        stats = self.phases[name]
+        allocations = self.allocations.setdefault(name, {})
+        for difference in differences:
+            if difference.size_diff == 0 or difference.traceback[0].filename in (tracemalloc.__file__, __file__):
+                continue
+            line = str(difference.traceback[0])
+            allocation = allocations.setdefault(line, {"bytes": 0, "blocks": 0})
+            allocation["bytes"] += difference.size_diff
+            allocation["blocks"] += difference.count_diff
+            stats["allocated_bytes"] += difference.size_diff
+
+    def close(self) -> None:
+        """stops the sampler thread, and the tracing of the memory allocations if the profiler started it"""
+        self.stopped.set()
+        self.sampler.join()
+        if self.started_tracing:
+            tracemalloc.stop()
+
+    def write(self) -> list[str]:
+        """
+        Stops the profiler, and writes its results to the output directory.
+
+        Returns:
+            list[str]: The paths of the written files.
+        """
+        self.close()
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = []
+        for name, profile in self.profiles.items():
+            paths.append(os.path.join(self.output_dir, f'profile_{name}.pstats'))
+            profile.dump_stats(paths[-1])
+        paths.append(os.path.join(self.output_dir, 'profile.collapsed'))
+        with open(paths[-1], 'w') as file:
+            for stack, count in sorted(self.samples.items()):
+                file.write(f'{stack} {count}\n')
+        paths.append(os.path.join(self.output_dir, 'profile_memory.txt'))
+        with open(paths[-1], 'w') as file:
+            for name, allocations in self.allocations.items():
+                stats = self.phases[name]
+                file.write(f'{name}: {stats["allocated_bytes"] / 2 ** 20:+.2f} MiB net, '
+                           f'{stats["peak_bytes"] / 2 ** 20:.2f} MiB peak traced\n')
+                top = sorted(allocations.items(), key=lambda item: -abs(item[1]["bytes"]))[:TOP_ALLOCATIONS]
+                for line, allocation in top:
+                    file.write(f'    {allocation["bytes"] / 2 ** 10:+12.1f} KiB {allocation["blocks"]:+9d} blocks  '
+                               f'{line}\n')
+        paths.append(os.path.join(self.output_dir, 'profile_phases.json'))
+        with open(paths[-1], 'w') as file:
+            json.dump({"mode": self.mode, "interval": self.interval, "phases": self.phases}, file, indent=2)
+        return paths
+
+    def summary(self) -> str:
+        """returns the visits and wall time of every phase as text lines"""
+        return "\n".join(f'{name:<10} {stats["visits"]:>5} visits {stats["seconds"]:>9.3f}s '
+                         f'{stats["peak_bytes"] / 2 ** 20:>8.2f} MiB peak' for name, stats in self.phases.items())
+
+
+def phase(profiler: Optional[PhaseProfiler], name: str):
+    """returns the context of a phase of a profiler, and an empty context without a profiler"""
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.phase(name)
+
+
+def profile_mode(argv: list[str]) -> tuple[Optional[str], list[str]]:
+    """
+    Extracts the --profile option from command line arguments: "--profile" selects the cprofile mode and
+    "--profile=sampling" the sampling mode.
+
+    Returns:
+        tuple[Optional[str], list[str]]: The profile mode (None without the option), and the other arguments.
+
+    Raises:
+        ValueError: If the mode of "--profile=" is not one of PROFILE_MODES.
+    """
+    mode, rest = None, []
+    for arg in argv:
+        if arg == "--profile":
+            mode = "cprofile"
+        elif arg.startswith("--profile="):
+            mode = arg.split("=", 1)[1]
+            if mode not in PROFILE_MODES:
+                raise ValueError(f'Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}')
+        else:
+            rest.append(arg)
+    return mode, rest
@@ -0,0 +1,232 @@
+"""
+Progress reporting for long non-interactive sweeps. The engines report the walker steps they finished to a callback
+(Simulation.run after every walker, lattice_engine.lattice_paths after every block, the runner after every batch
+engine run). A ProgressTracker turns these counts into ProgressUpdates with the throughput and the estimated time
+left, and passes them on to its renderers at most once per interval, so the cost of a report is a counter update and
+a clock read. The renderers are:
+    TerminalRenderer   a single progress line that is rewritten in place
+    PipeRenderer       a line of JSON per update, prefixed by PIPE_PREFIX, for a parent process (see main.py, which
+                       polls the pipe of the run2d worker and shows a Tk progress bar)
+"""
+import json
+import sys
+import time
+from dataclasses import dataclass, asdict
+from typing import Callable, Optional, TextIO
+
+PIPE_PREFIX = "@progress "
+RENDER_INTERVAL = 0.2  # the minimal seconds between two rendered updates
+BAR_WIDTH = 30
+
+
+@dataclass
+class ProgressUpdate:
+    """
+    The ProgressUpdate class is the state of a sweep at a moment.
+
+    Attributes:
+        steps_done (int): The number of walker steps done.
+        total_steps (int): The number of walker steps of the whole sweep.
+        runs_done (int): The number of runs done.
+        total_runs (int): The number of runs of the whole sweep.
+        elapsed (float): The seconds since the start of the sweep.
+        rate (float): The average number of walker steps per second.
+        eta (Optional[float]): The estimated seconds left, None before the first step.
+        label (str): A description of the current part of the sweep.
+    """
+    steps_done: int
+    total_steps: int
+    runs_done: int
+    total_runs: int
+    elapsed: float
+    rate: float
+    eta: Optional[float]
+    label: str = ""
+
+    @property
+    def fraction(self) -> float:
+        """returns the done fraction of the sweep's walker steps"""
+        return self.steps_done / self.total_steps if self.total_steps else 1.0
+
+
+def format_seconds(seconds: Optional[float]) -> str:
+    """returns seconds as H:MM:SS, or '--:--' when they are unknown"""
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02d}:{seconds:02d}' if hours else f'{minutes:02d}:{seconds:02d}'
+
+
+def sweep_steps(config: dict) -> tuple[int, int]:
+    """
+    Returns the number of walker steps and of runs of the sweep of a non-interactive configuration.
+
+    Parameters:
+        config (dict): The configuration for the simulation.
+
+    Returns:
+        tuple[int, int]: The walker steps and the runs.
+    """
+    total_runs = len(config["num_steps_for_statistics"]) * config["num_runs"]
+    total_steps = sum(config["num_steps_for_statistics"]) * config["num_runs"] * config["num_concurrent_walkers"]
+    return total_steps, total_runs
+
+
+class ProgressTracker:
+    """
+    The ProgressTracker class counts the walker steps and runs of a sweep, and passes ProgressUpdates to its
+    renderers at most once per interval (and always at the end of the sweep).
+
+    Attributes:
+        total_steps (int): The number of walker steps of the whole sweep.
+        total_runs (int): The number of runs of the whole sweep.
+        renderers (list): The renderers, callables that receive the updates with a `message(text)` method.
+        interval (float): The minimal seconds between two updates.
+        steps_done (int): The number of walker steps done.
+        runs_done (int): The number of runs done.
+        skipped_steps (int): The number of walker steps that were done before the tracker started.
+        label (str): A description of the current part of the sweep.
+    """
+
+    def __init__(self, total_steps: int, total_runs: int, renderers: list[Callable[[ProgressUpdate], None]],
+                 interval: float = RENDER_INTERVAL) -> None:
+        """
+        Constructs a new ProgressTracker instance, and starts its clock.
+
+        Parameters:
+            total_steps (int): The number of walker steps of the whole sweep.
+            total_runs (int): The number of runs of the whole sweep.
+            renderers (list): The renderers, callables that receive the updates with a `message(text)` method.
+            interval (float): The minimal seconds between two updates.
+        """
+        self.total_steps = total_steps
+        self.total_runs = total_runs
+        self.renderers = renderers
+        self.interval = interval
+        self.steps_done = 0
+        self.runs_done = 0
+        self.skipped_steps = 0
+        self.label = ""
+        self.start = time.monotonic()
+        self.next_render = self.start
+
+    def update(self) -> ProgressUpdate:
+        """returns the current state of the sweep"""
+        elapsed = time.monotonic() - self.start
+        rate = (self.steps_done - self.skipped_steps) / elapsed if elapsed > 0 else 0.0
+        eta = (self.total_steps - self.steps_done) / rate if rate > 0 else None
+        return ProgressUpdate(self.steps_done, self.total_steps, self.runs_done, self.total_runs, elapsed, rate, eta,
+                              self.label)
+
+    def render(self) -> None:
+        """passes the current state to every renderer"""
+        update = self.update()
+        for renderer in self.renderers:
+            renderer(update)
+        self.next_render = time.monotonic() + self.interval
+
+    def advance(self, steps: int) -> None:
+        """the progress callback of the engines, counts walker steps and renders when the interval has passed"""
+        self.steps_done += steps
+        if time.monotonic() >= self.next_render:
+            self.render()
+
+    def skip(self, steps: int, runs: int) -> None:
+        """counts the walker steps and runs that were done before the tracker started, e.g. by a resumed sweep"""
+        self.steps_done += steps
+        self.runs_done += runs
+        self.skipped_steps += steps
+
+    def finish_run(self) -> None:
+        """counts a finished run"""
+        self.runs_done += 1
+
+    def message(self, text: str) -> None:
+        """prints a line of text through the renderers, so it does not break their output"""
+        for renderer in self.renderers:
+            renderer.message(text)
+
+    def set_label(self, label: str) -> None:
+        """describes the current part of the sweep"""
+        self.label = label
+
+    def close(self) -> None:
+        """renders the final state, and lets the renderers finish their output"""
+        self.render()
+        for renderer in self.renderers:
+            if hasattr(renderer, 'close'):
+                renderer.close()
+
+
+class TerminalRenderer:
+    """
+    The TerminalRenderer class rewrites a single progress line with a bar, the throughput and the estimated time left.
+
+    Attributes:
+        stream (TextIO): The stream the line is written to.
+    """
+
+    def __init__(self, stream: TextIO = None) -> None:
+        """
+        Constructs a new TerminalRenderer instance.
+
+        Parameters:
+            stream (TextIO): The stream the line is written to, sys.stderr if not provided.
+        """
+        self.stream = stream if stream is not None else sys.stderr
+        self.width = 0
+
+    def __call__(self, update: ProgressUpdate) -> None:
+        filled = int(update.fraction * BAR_WIDTH)
+        line = (f'[{"#" * filled}{"." * (BAR_WIDTH - filled)}] {update.fraction:6.1%} '
+                f'run {update.runs_done}/{update.total_runs} {update.rate:,.0f} steps/s '
+                f'elapsed {format_seconds(update.elapsed)} eta {format_seconds(update.eta)} {update.label}')
+        self.stream.write('\r' + line.ljust(self.width))
+        self.stream.flush()
+        self.width = len(line)
+
+    def message(self, text: str) -> None:
+        """prints a line of text above the progress line"""
+        self.stream.write('\r' + text.ljust(self.width) + '\n')
+        self.stream.flush()
+        self.width = 0
+
+    def close(self) -> None:
+        """ends the progress line"""
+        self.stream.write('\n')
+        self.stream.flush()
+
+
+class PipeRenderer:
+    """
+    The PipeRenderer class writes every update as a line of JSON, prefixed by PIPE_PREFIX, for a parent process.
+
+    Attributes:
+        stream (TextIO): The stream the lines are written to.
+    """
+
+    def __init__(self, stream: TextIO = None) -> None:
+        """
+        Constructs a new PipeRenderer instance.
+
+        Parameters:
+            stream (TextIO): The stream the lines are written to, sys.stdout if not provided.
+        """
+        self.stream = stream if stream is not None else sys.stdout
+
+    def __call__(self, update: ProgressUpdate) -> None:
+        self.stream.write(PIPE_PREFIX + json.dumps(asdict(update)) + '\n')
+        self.stream.flush()
+
+    def message(self, text: str) -> None:
+        """prints a line of text for the parent process"""
+        self.stream.write(text + '\n')
+        self.stream.flush()
+
+
+def parse_progress_line(line: str) -> Optional[ProgressUpdate]:
+    """returns the update of a line written by a PipeRenderer, None for any other line"""
+    if not line.startswith(PIPE_PREFIX):
+        return None
+    return ProgressUpdate(**json.loads(line[len(PIPE_PREFIX):]))
@@ -0,0 +1,158 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+from spatial_index import element_extents
+
+CODE_EMPTY = 0  # the cell does not touch any element
+CODE_OVERFLOW = 255  # the candidates of the cell are not in the palette, they are kept in `overflow`
+MAX_PALETTE_SIZE = CODE_OVERFLOW - 1
+MAX_RASTER_CELLS = 2 ** 24
+CELL_MARGIN = 1e-6  # the relative inflation of the cells, so rounding in the cell lookup never misses an element
+
+
+class ElementRaster:
+    """
+    The ElementRaster class is a dense uint8 grid over a bounded domain, with a code per cell that identifies the
+    elements touching it (portals, obstacles, traps, slow zones and black holes alike, by their index in the
+    simulation's element list). The distinct sets of elements form a palette, so finding the elements that can
+    contain a location is a single lookup into the grid and the palette. The rasterisation is conservative: the
+    elements of a cell are those whose exact shape (a box or a ball) touches it, and the simulation still checks the
+    exact geometry of every candidate, which resolves the cells on element boundaries. Locations outside the grid
+    fall back to the elements that reach outside of it. It has the interface of spatial_index.SpatialIndex.
+
+    Attributes:
+        cell_size (float): The side length of a single cell.
+        low (np.ndarray): The minimum corner of the grid.
+        shape (tuple): The number of cells along every axis.
+        strides (tuple): The step of the flat cell index along every axis.
+        grid (np.ndarray): The code of every cell, of type uint8.
+        codes (bytes): The codes of the grid in flat cell order, for fast single lookups.
+        palette (list[tuple]): The sorted element indices of every code (the empty tuple for CODE_EMPTY).
+        overflow (dict[int, tuple]): The element indices of the flat cells with CODE_OVERFLOW.
+        outside (tuple): The sorted indices of the elements that reach outside the grid, or are unbounded.
+    """
+
+    def __init__(self, elements: list, dimension: int, cell_size: float = 1.0, bounds: Optional[float] = None) -> None:
+        """
+        Constructs a new ElementRaster instance.
+
+        Parameters:
+            elements (list): The elements, in the order of the simulation's element list.
+            dimension (int): The number of coordinates of every location (2 or 3).
+            cell_size (float): The side length of a cell.
+            bounds (float, optional): The grid covers [-bounds, bounds] along every axis. If not provided, it covers
+                the bounding boxes of all bounded elements.
+        """
+        extents = element_extents(elements)
+        centers = np.array([element.center_loc for element in elements], dtype=float).reshape(-1, dimension)
+        mins, maxs = centers - extents[:, np.newaxis], centers + extents[:, np.newaxis]
+        finite = np.isfinite(extents)
+        if bounds is not None:
+            low, high = np.full(dimension, -float(bounds)), np.full(dimension, float(bounds))
+        elif finite.any():
+            low, high = mins[finite].min(axis=0), maxs[finite].max(axis=0)
+        else:
+            low, high = np.zeros(dimension), np.zeros(dimension)
+        shape = np.maximum(np.ceil((high - low) / cell_size), 1).astype(np.int64)
+        if np.prod(shape) > MAX_RASTER_CELLS:
+            raise ValueError(f'A raster of {tuple(shape.tolist())} cells is too large, use a larger cell size')
+        self.cell_size = cell_size
+        self.low = tuple(low.tolist())
+        self.shape = tuple(shape.tolist())
+        self.strides = tuple(int(np.prod(shape[axis + 1:])) for axis in range(dimension))
+        high = low + shape * cell_size
+        reaching_out = ~finite | (mins <= low).any(axis=1) | (maxs >= high).any(axis=1)
+        self.outside = tuple(np.flatnonzero(reaching_out).tolist())
+        self.grid = np.zeros(self.shape, dtype=np.uint8)
+        self.palette: list[tuple] = [()]
+        self.overflow: dict[int, tuple] = {}
+        is_box = np.array([hasattr(element, 'length') for element in elements], dtype=bool)
+        cells, indices = self.touched_cells(np.flatnonzero(finite), is_box, centers, extents, mins, maxs)
+        if len(cells):
+            self.build_palette(cells, indices)
+        self.codes = self.grid.tobytes()
+
+    def touched_cells(self, candidates: np.ndarray, is_box: np.ndarray, centers: np.ndarray, extents: np.ndarray,
+                      mins: np.ndarray, maxs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the cells that every box (an element with a length) or ball (every other element, with the radius of
+        its extent) touches. Elements whose windows of cells have the same shape are rasterised together.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The flat cell indices and the element indices of the touching pairs.
+        """
+        margin = self.cell_size * CELL_MARGIN
+        shape, strides = np.array(self.shape), np.array(self.strides)
+        first = np.clip(np.floor((mins - margin - self.low) / self.cell_size).astype(np.int64), 0, shape)
+        last = np.clip(np.floor((maxs + margin - self.low) / self.cell_size).astype(np.int64) + 1, 0, shape)
+        windows = last - first
+        candidates = candidates[(windows[candidates] > 0).all(axis=1)]
+        cells, indices = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        window_shapes, window_of_element = np.unique(windows[candidates], axis=0, return_inverse=True)
+        for window_index, window in enumerate(window_shapes.tolist()):
+            group = candidates[window_of_element.ravel() == window_index]
+            offsets = np.stack(np.meshgrid(*[np.arange(size) for size in window], indexing='ij'), axis=-1)
+            window_cells = first[group][:, np.newaxis, :] + offsets.reshape(1, -1, len(window))
+            cell_low = np.asarray(self.low) + window_cells * self.cell_size - margin
+            group_centers = centers[group][:, np.newaxis, :]
+            nearest = np.clip(group_centers, cell_low, cell_low + self.cell_size + 2 * margin)
+            distance_squared = ((nearest - group_centers) ** 2).sum(axis=2)
+            touched = is_box[group][:, np.newaxis] | \
+                (distance_squared <= (extents[group] ** 2 * (1 + CELL_MARGIN))[:, np.newaxis])
+            cells.append((window_cells @ strides)[touched])
+            indices.append(np.broadcast_to(group[:, np.newaxis], touched.shape)[touched])
+        return np.concatenate(cells), np.concatenate(indices)
+
+    def build_palette(self, cells: np.ndarray, indices: np.ndarray) -> None:
+        """
+        Groups the elements touching every cell into sorted sets, and gives the most common distinct sets the codes
+        of the palette. The cells of the remaining sets get CODE_OVERFLOW.
+        """
+        order = np.lexsort((indices, cells))
+        cells, indices = cells[order], indices[order].astype(np.int64)
+        touched, starts = np.unique(cells, return_index=True)
+        ends = np.append(starts[1:], len(cells))
+        raw = indices.tobytes()
+        set_ids: dict[bytes, int] = {}
+        set_of_cell = np.array([set_ids.setdefault(raw[start * 8:end * 8], len(set_ids))
+                                for start, end in zip(starts.tolist(), ends.tolist())])
+        element_sets = [tuple(np.frombuffer(key, dtype=np.int64).tolist()) for key in set_ids]
+        order = np.argsort(-np.bincount(set_of_cell), kind='stable')
+        codes = np.full(len(element_sets), CODE_OVERFLOW, dtype=np.uint8)
+        codes[order[:MAX_PALETTE_SIZE]] = np.arange(1, min(len(element_sets), MAX_PALETTE_SIZE) + 1)
+        self.palette += [element_sets[set_index] for set_index in order[:MAX_PALETTE_SIZE].tolist()]
+        cell_codes = codes[set_of_cell]
+        self.grid.reshape(-1)[touched] = cell_codes
+        overflowing = cell_codes == CODE_OVERFLOW
+        for cell, set_index in zip(touched[overflowing].tolist(), set_of_cell[overflowing].tolist()):
+            self.overflow[cell] = element_sets[set_index]
+
+    def elements_at(self, location: tuple) -> tuple:
+        """returns the sorted indices of the elements that may contain a location"""
+        flat = 0
+        for coordinate, low, size, stride in zip(location, self.low, self.shape, self.strides):
+            cell = math.floor((coordinate - low) / self.cell_size)
+            if not 0 <= cell < size:
+                return self.outside
+            flat += cell * stride
+        code = self.codes[flat]
+        if code == CODE_OVERFLOW:
+            return self.overflow[flat]
+        return self.palette[code]
+
+    def candidates(self, *locations: tuple) -> list[int]:
+        """
+        Returns the elements that may contain any of the given locations.
+
+        Parameters:
+            *locations (tuple): The locations.
+
+        Returns:
+            list[int]: The sorted indices of the candidate elements.
+        """
+        found = [self.elements_at(location) for location in locations]
+        if all(elements == found[0] for elements in found):
+            return list(found[0])
+        return sorted(set().union(*found))
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import csv
+import os
 from pathlib import Path
 import json
 from typing import List
@@ -14,11 +15,36 @@ from pprint import pprint
 import math
 import matplotlib.pyplot as plt
 import sys
-from typing import Any, Dict, Union
+from typing import Any, Callable, Dict, Optional, Union
 from trap import Trap
 from slowZone import SlowZone
+from occupancy import OccupancyGrid
+from walker_store import HISTORY_LENGTH, HISTORY_POLICIES
+import msd
+import first_passage
+import events
+import motion
+import batch_engine
+import lattice_engine
+import levy
+import scenario
+from instrumentation import Instrumentation
+from profiling import PhaseProfiler, phase, profile_mode
+import progress
+import checkpoint
+import shared_results
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
 TEN_RADIUS = 10
+# the elements, replaced by a scenario file
+SCENARIO_KEYS = ("portals_list", "obstacles_list", "traps_amount", "slow_zone_amount")
+EVENT_STATS = [name for name in events.EVENT_NAMES if name != "black_hole_pulls"]  # there are no black holes in 2D
+PRECISIONS = {"float64": np.float64, "float32": np.float32}  # the dtypes of the paths of a sweep
+# the statistics of an "endpoint_stats" sweep, which only need the last location of every path
+ENDPOINT_STATS = ("avg_distance_from_origin", "avg_distance_from_x_axis", "avg_distance_from_y_axis")
+# the options that need the full paths, and can not be combined with "endpoint_stats"
+FULL_PATH_OPTIONS = ("occupancy_map", "checkpoint_file", "num_workers")
 
 
 
@@ -92,21 +118,20 @@ def distance_from_y_axis_at_end_of_path(path: list[tuple[float, float]]) -> floa
     return abs(path[-1][0])
 
 
-def num_steps_until_exit_circle(path: list[tuple[float, float]]) -> Union[int,float] | None:
+def num_steps_until_exit_circle(path: list[tuple[float, float]], radius: float = TEN_RADIUS) -> Union[int,float] | None:
     """
-    Calculates the number of steps until a path exits a circle of radius 10.
+    Calculates the number of steps until a path exits a circle around the origin.
 
     Parameters:
         path (list[tuple[float, float]]): The path.
+        radius (float): The radius of the circle.
 
     Returns:
         int | None: The number of steps until the path exits the circle, or None if the path never exits the circle.
     """
 
-    for i, point in enumerate(path):
-        if distance_from_origin(point) > 10:
-            return i
-    return None
+    exit_step = first_passage.exit_times(helper.paths_to_array([path]), [radius])[0, 0]
+    return None if exit_step == first_passage.CENSORED else int(exit_step)
 
 
 def num_y_axis_crosses(path: list[tuple[float, float]]) -> Union[int,float]:
@@ -120,15 +145,11 @@ def num_y_axis_crosses(path: list[tuple[float, float]]) -> Union[int,float]:
         int: The number of times the path crosses the y-axis.
     """
 
-    total = 0
-    for i in range(1, len(path)):
-        if path[i][0] * path[i - 1][0] < 0:
-            total += 1
-    return total
+    return int(events.axis_crossings(helper.paths_to_array([path]), 0)[0])
 
 
-def calculate_stats(paths: list[list[tuple[float, float]]], stats: dict[str, dict[int, float]], num_steps: int) -> dict[
-    str, dict[int, float]]:
+def calculate_stats(paths: list[list[tuple[float, float]]], stats: dict[str, dict[int, float]], num_steps: int,
+                    step_events: np.ndarray = None) -> dict[str, dict[int, float]]:
     """
     Calculates various statistics for a list of paths.
 
@@ -136,24 +157,61 @@ def calculate_stats(paths: list[list[tuple[float, float]]], stats: dict[str, dic
         paths (list[list[tuple[float, float]]]): The list of paths.
         stats (dict[str, dict[int, float]]): The current statistics.
         num_steps (int): The number of steps.
+        step_events (np.ndarray, optional): The event codes of the paths, of shape (walkers, steps). If provided,
+            the average count of every event is added to the statistics.
 
     Returns:
         dict[str, dict[int, float]]: The updated statistics.
     """
-
-    distances_from_origin_at_end_of_path = [distance_from_origin_at_end_of_path(path) for path in paths]
-    num_steps_until_exit_circle_stats = [num_steps_until_exit_circle(path) for path in paths]
-    clean_num_steps_stats = [num for num in num_steps_until_exit_circle_stats if (num is not None)]
-    distances_from_x_axis_at_end_of_path = [distance_from_x_axis_at_end_of_path(path) for path in paths]
-    distances_from_y_axis_at_end_of_path = [distance_from_y_axis_at_end_of_path(path) for path in paths]
-    num_walker_crosses = [num_y_axis_crosses(path) for path in paths]
+    # float32 paths (see path_dtype) are kept as they are, the averages are summed as Python floats and the MSD is
+    # computed in float64 (see msd.time_averaged_msd)
+
+    trajectories = helper.paths_to_array(paths)
+    distances_from_origin_at_end_of_path = [float(distance_from_origin_at_end_of_path(path)) for path in paths]
+    exit_steps, exited = first_passage.censor(first_passage.exit_times(trajectories, [TEN_RADIUS])[:, 0],
+                                              trajectories.shape[1])
+    clean_num_steps_stats = exit_steps[exited].tolist()
+    distances_from_x_axis_at_end_of_path = [float(distance_from_x_axis_at_end_of_path(path)) for path in paths]
+    distances_from_y_axis_at_end_of_path = [float(distance_from_y_axis_at_end_of_path(path)) for path in paths]
+    num_walker_crosses = events.axis_crossings(trajectories, 0)
+    num_walker_crosses_x_axis = events.axis_crossings(trajectories, 1)
+    diffusion_exponent, _ = msd.fit_diffusion_exponent(msd.ensemble_msd(trajectories))
 
     stats["avg_distance_from_origin"][num_steps] = avg(distances_from_origin_at_end_of_path)
     stats["avg_distance_from_x_axis"][num_steps] = avg(distances_from_x_axis_at_end_of_path)
     stats["avg_distance_from_y_axis"][num_steps] = avg(distances_from_y_axis_at_end_of_path)
     if len(clean_num_steps_stats) > 0:
         stats["avg_num_steps_to_exit_circle"][num_steps] = avg(clean_num_steps_stats)
-    stats["avg_total_walker_crosse_y_axis"][num_steps] = avg(num_walker_crosses)
+    stats["km_mean_steps_to_exit_circle"][num_steps] = first_passage.restricted_mean(exit_steps, exited,
+                                                                                     trajectories.shape[1])
+    stats["avg_total_walker_crosse_y_axis"][num_steps] = float(num_walker_crosses.mean())
+    stats["avg_total_walker_crosses_x_axis"][num_steps] = float(num_walker_crosses_x_axis.mean())
+    if step_events is not None:
+        event_averages = events.event_averages(step_events)
+        for name in EVENT_STATS:
+            stats[f"avg_{name}"][num_steps] = event_averages[name]
+    stats["diffusion_exponent"][num_steps] = diffusion_exponent
+    return stats
+
+
+def calculate_endpoint_stats(endpoints: np.ndarray, stats: dict[str, dict[int, float]],
+                             num_steps: int) -> dict[str, dict[int, float]]:
+    """
+    Calculates the statistics of ENDPOINT_STATS from the last locations of the paths.
+
+    Parameters:
+        endpoints (np.ndarray): The last location of every path, of shape (walkers, 2).
+        stats (dict[str, dict[int, float]]): The current statistics (see new_stats).
+        num_steps (int): The number of steps.
+
+    Returns:
+        dict[str, dict[int, float]]: The updated statistics.
+    """
+
+    endpoints = np.asarray(endpoints, dtype=np.float64)
+    stats["avg_distance_from_origin"][num_steps] = float(np.hypot(endpoints[:, 0], endpoints[:, 1]).mean())
+    stats["avg_distance_from_x_axis"][num_steps] = float(np.abs(endpoints[:, 1]).mean())
+    stats["avg_distance_from_y_axis"][num_steps] = float(np.abs(endpoints[:, 0]).mean())
     return stats
 
 
@@ -183,47 +241,72 @@ def stats_to_csv(stats: dict[str, dict[int, float]]) -> None:
     """
 
     with open('../statistics/stats.csv', 'w', newline='') as csvfile:
-        fieldnames = ['num_steps', 'avg_distance_from_origin', 'avg_distance_from_x_axis', 'avg_distance_from_y_axis',
-                      'avg_num_steps_to_exit_circle', 'avg_total_walker_crosse_y_axis']
+        # the diffusion type is classified from the exponent, which endpoint statistics do not have
+        has_exponent = "diffusion_exponent" in stats
+        fieldnames = ['num_steps'] + list(stats.keys()) + (['diffusion_type'] if has_exponent else [])
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
         writer.writeheader()
         for num_steps in stats["avg_distance_from_origin"].keys():
-            writer.writerow({
-                'num_steps': num_steps,
-                'avg_distance_from_origin': stats["avg_distance_from_origin"].get(num_steps, ''),
-                'avg_distance_from_x_axis': stats["avg_distance_from_x_axis"].get(num_steps, ''),
-                'avg_distance_from_y_axis': stats["avg_distance_from_y_axis"].get(num_steps, ''),
-                'avg_num_steps_to_exit_circle': stats["avg_num_steps_to_exit_circle"].get(num_steps, ''),
-                'avg_total_walker_crosse_y_axis': stats["avg_total_walker_crosse_y_axis"].get(num_steps, '')
-            })
+            row: dict[str, Any] = {stat_name: stat.get(num_steps, '') for stat_name, stat in stats.items()}
+            row['num_steps'] = num_steps
+            if has_exponent:
+                row['diffusion_type'] = msd.classify_diffusion(stats["diffusion_exponent"].get(num_steps, math.nan))
+            writer.writerow(row)
 
 
-def create_simulation_with_config(config: dict[str, Any]) -> Simulation:
+def occupancy_to_files(occupancy: OccupancyGrid) -> None:
     """
-    Creates a new Simulation instance with the given configuration.
+    Saves the occupancy grid as a .npz file and as a heatmap PNG image.
+
+    Parameters:
+        occupancy (OccupancyGrid): The occupancy grid.
+    """
+
+    occupancy.save('../statistics/occupancy.npz')
+    plt.close("all")
+    plt.title("occupancy")
+    plt.imshow(occupancy.projection().T, origin='lower', extent=occupancy.extent(), cmap='hot',
+               interpolation='nearest')
+    plt.colorbar(label="steps in cell")
+    plt.savefig('occupancy.png')
+
+
+def create_simulation_with_config(config: dict[str, Any], instrumentation: Instrumentation = None) -> Simulation:
+    """
+    Creates a new Simulation instance with the given configuration. The "history" key ("none" by default, "last" or
+    "full") and "history_length" select how the location history of the walkers is kept (see
+    walker_store.WalkerStore).
 
     Parameters:
         config (dict[str, Any]): The configuration for the simulation.
+        instrumentation (Instrumentation, optional): If provided, the hot path of the simulation is instrumented by it.
 
     Returns:
         Simulation: A new Simulation instance.
     """
 
-    walkers = [Walker(config["walker_type"], config["restart_option"]) for _ in range(config["num_concurrent_walkers"])]
+    walkers = [Walker(config["walker_type"], config["restart_option"],
+                      levy.sampler_from_config(config.get("levy"), 2) if config["walker_type"] == 5 else None)
+               for _ in range(config["num_concurrent_walkers"])]
     ice_option = config["ice_option"]
     # num_steps = config["num_steps_for_statistics"][-1]
     num_steps = config["num_steps"]
 
-    if isinstance(config["portals_list"], list) and isinstance(config["portals_list"][0], dict):
-        portals_list = [Portal(p["exit_point"], p["length"], p["center_loc"]) for p in config["portals_list"]]
-        obstacles_list = [Obstacle(o["length"], o["center_loc"]) for o in config["obstacles_list"]]
+    if config.get("scenario_file"):
+        elements = scenario.load_elements(config["scenario_file"], 2)
+        portals_list, obstacles_list = elements["portals"], elements["obstacles"]
+        trap_list, slow_zone_list = elements["traps"], elements["slow_zones"]
     else:
-        portals_list = [Portal() for _ in range(config["portals_list"])]
-        obstacles_list = [Obstacle() for _ in range(config["obstacles_list"])]
+        if isinstance(config["portals_list"], list):
+            portals_list = [Portal(p["exit_point"], p["length"], p["center_loc"]) for p in config["portals_list"]]
+            obstacles_list = [Obstacle(o["length"], o["center_loc"]) for o in config["obstacles_list"]]
+        else:
+            portals_list = [Portal() for _ in range(config["portals_list"])]
+            obstacles_list = [Obstacle() for _ in range(config["obstacles_list"])]
 
-    trap_list = [Trap() for _ in range(config["traps_amount"])]
-    slow_zone_list = [SlowZone() for _ in range(config["slow_zone_amount"])]
+        trap_list = [Trap() for _ in range(config["traps_amount"])]
+        slow_zone_list = [SlowZone() for _ in range(config["slow_zone_amount"])]
 
     simulation = Simulation(
         walkers,
@@ -232,42 +315,320 @@ def create_simulation_with_config(config: dict[str, Any]) -> Simulation:
         trap_list=trap_list,
         slow_zone_list=slow_zone_list,
         num_steps=num_steps,
-        ice_option=ice_option
+        ice_option=ice_option,
+        continuous_collision=config.get("continuous_collision", False),
+        trajectories=motion.trajectories_from_config(config.get("trajectories"), {
+            "portals": portals_list,
+            "obstacles": obstacles_list,
+            "traps": trap_list,
+            "slow_zones": slow_zone_list,
+        }),
+        raster_cell_size=config.get("raster_cell_size"),
+        raster_bounds=config.get("raster_bounds"),
+        instrumentation=instrumentation,
+        history_policy=config.get("history", "none"),
+        history_length=config.get("history_length", HISTORY_LENGTH),
     )
     return simulation
 
 
-def non_interactive(config: dict[str, Any]):
+def levy_options(config: dict[str, Any]) -> dict[str, float]:
     """
-    Runs a non-interactive simulation with the given configuration.
+    Returns the step length parameters of the "levy" section of a configuration (see levy.pareto_lengths).
 
     Parameters:
         config (dict[str, Any]): The configuration for the simulation.
+
+    Returns:
+        dict[str, float]: The "alpha", "min_length" and "max_length" that are set in the configuration.
+    """
+
+    options = {key: value for key, value in (config.get("levy") or {}).items()
+               if key in ("alpha", "min_length", "max_length") and value is not None}
+    return options
+
+
+def path_dtype(config: dict[str, Any]) -> type:
     """
+    Returns the dtype of the paths of a sweep, selected by the "precision" key ("float64", the default, or
+    "float32"). float32 paths halve the memory of the paths of every N (and of the shared memory and the
+    checkpoints), the statistics are still accumulated in float64 (see calculate_stats).
 
-    stats:Dict[str, Dict[int, float]] = {
+    Parameters:
+        config (dict[str, Any]): The configuration for the simulation.
+
+    Returns:
+        type: np.float64 or np.float32.
+    """
+
+    return PRECISIONS[config.get("precision", "float64")]
+
+
+def uses_batch_engine(config: dict[str, Any]) -> bool:
+    """
+    Checks if a configuration can be run by the vectorised batch engine (see batch_engine.py): it has to be enabled
+    with the "batch_engine" key, and the scene must not have any elements (nor a scenario file).
+
+    Parameters:
+        config (dict[str, Any]): The configuration for the simulation.
+
+    Returns:
+        bool: True if the batch engine can be used, False otherwise.
+    """
+
+    if config.get("scenario_file"):  # the element keys may be missing, the scenario has the elements
+        return False
+    element_counts = [config.get("traps_amount", 0), config.get("slow_zone_amount", 0)]
+    for key in ("portals_list", "obstacles_list"):
+        value = config.get(key, 0)
+        element_counts.append(len(value) if isinstance(value, list) else value)
+    return bool(config.get("batch_engine")) and config["walker_type"] in batch_engine.SUPPORTED_WALKER_TYPES and \
+        not any(element_counts)
+
+
+def uses_lattice_engine(config: dict[str, Any], simulation: Simulation) -> bool:
+    """
+    Checks if a simulation can be run by the integer lattice engine (see lattice_engine.py): it has to be enabled
+    with the "lattice_engine" key, the walkers must be of type 3, and the scene must only have obstacles and traps,
+    all of them static.
+
+    Parameters:
+        config (dict[str, Any]): The configuration for the simulation.
+        simulation (Simulation): The simulation created from the configuration.
+
+    Returns:
+        bool: True if the lattice engine can be used, False otherwise.
+    """
+
+    num_portals = sum(isinstance(element, Portal) for element in simulation.boxes)
+    return bool(config.get("lattice_engine")) and config["walker_type"] == 3 and \
+        lattice_engine.supports_scene(num_portals, len(simulation.slow_zones), len(simulation.traps)) and \
+        simulation.motion is None and not simulation.continuous_collision
+
+
+def progress_tracker(config: dict[str, Any]) -> Optional[progress.ProgressTracker]:
+    """
+    Creates the progress tracker of a non-interactive sweep (see progress.py). The "progress" key selects the renderer:
+    "terminal" (or true) for a progress line, "pipe" for JSON lines to a parent process (main.py sets it), and false
+    for none. Without the key, the progress line is shown when stderr is a terminal.
+
+    Parameters:
+        config (dict[str, Any]): The configuration for the simulation.
+
+    Returns:
+        Optional[progress.ProgressTracker]: The tracker, or None if the progress is not reported.
+    """
+
+    mode = config.get("progress", "terminal" if sys.stderr.isatty() else False)
+    if not mode:
+        return None
+    renderer = progress.PipeRenderer() if mode == "pipe" else progress.TerminalRenderer()
+    return progress.ProgressTracker(*progress.sweep_steps(config), [renderer])
+
+
+def new_stats(endpoint_only: bool = False) -> dict[str, dict[int, float]]:
+    """
+    Creates the empty statistics that calculate_stats fills.
+
+    Parameters:
+        endpoint_only (bool): If True, only the statistics of ENDPOINT_STATS, which calculate_endpoint_stats fills.
+
+    Returns:
+        dict[str, dict[int, float]]: The statistics, keyed by their names, with an empty dict for every statistic.
+    """
+
+    if endpoint_only:
+        return {name: {} for name in ENDPOINT_STATS}
+    return {
         "avg_distance_from_origin": {},
         "avg_distance_from_x_axis": {},
         "avg_distance_from_y_axis": {},
         "avg_num_steps_to_exit_circle": {},
-        "avg_total_walker_crosse_y_axis": {}
+        "km_mean_steps_to_exit_circle": {},
+        "avg_total_walker_crosse_y_axis": {},
+        "avg_total_walker_crosses_x_axis": {},
+        "diffusion_exponent": {},
+        **{f"avg_{name}": {} for name in EVENT_STATS}
     }
-    for num_steps in config["num_steps_for_statistics"]:
-        print(f"running simulation on {num_steps} steps ({config['num_runs']} times)")
+
+
+def simulate_run(config: dict[str, Any], num_steps: int, instrumentation: Instrumentation = None,
+                 progress_callback: Callable[[int], None] = None,
+                 profiler: PhaseProfiler = None) -> tuple[list, np.ndarray]:
+    """
+    Runs a single run of a sweep, with the batch engine, the lattice engine or a Simulation, whichever the
+    configuration selects. The paths have the dtype of the "precision" key (see path_dtype).
+
+    Parameters:
+        config (dict[str, Any]): The configuration for the simulation.
+        num_steps (int): The number of steps of the run.
+        instrumentation (Instrumentation, optional): Instruments the Simulation of the run.
+        progress_callback (Callable[[int], None], optional): Called with the number of walker steps done.
+        profiler (PhaseProfiler, optional): Profiles the scenario build and the simulation of the run.
+
+    Returns:
+        tuple[list, np.ndarray]: The paths of the walkers and their event codes, of shape (walkers, steps).
+    """
+
+    if uses_batch_engine(config):
+        with phase(profiler, "simulate"):
+            run_paths, run_events = batch_engine.renewal_paths(config["walker_type"], config["num_concurrent_walkers"],
+                                                               num_steps, config["restart_option"],
+                                                               levy_options(config), path_dtype(config))
+        if progress_callback is not None:
+            progress_callback(config["num_concurrent_walkers"] * num_steps)
+        return list(run_paths), run_events
+    with phase(profiler, "scenario"):
+        simulation = create_simulation_with_config(config, instrumentation)
+        simulation.num_steps = num_steps
+    with phase(profiler, "simulate"):
+        if uses_lattice_engine(config, simulation):
+            run_paths, run_events = lattice_engine.lattice_paths(config["num_concurrent_walkers"], num_steps,
+                                                                 config["restart_option"], simulation.boxes,
+                                                                 simulation.traps, progress_callback)
+            return list(run_paths.astype(path_dtype(config))), run_events
+        # float32 paths are written into a float32 array while the simulation runs (see Simulation.run)
+        run_paths = simulation.run(progress_callback, None if path_dtype(config) is np.float64 else path_dtype(config))
+        return run_paths, simulation.events
+
+
+def simulate_endpoints(config: dict[str, Any], num_steps: int, instrumentation: Instrumentation = None,
+                       progress_callback: Callable[[int], None] = None, profiler: PhaseProfiler = None) -> np.ndarray:
+    """
+    Runs a single run of an "endpoint_stats" sweep. With the batch engine, only the final segment since the last
+    restart of every walker is simulated (see batch_engine.renewal_endpoints); otherwise the run is simulated as in
+    simulate_run and only the last locations are kept.
+
+    Parameters:
+        config (dict[str, Any]): The configuration for the simulation.
+        num_steps (int): The number of steps of the run.
+        instrumentation (Instrumentation, optional): Instruments the Simulation of the run.
+        progress_callback (Callable[[int], None], optional): Called with the number of walker steps done.
+        profiler (PhaseProfiler, optional): Profiles the scenario build and the simulation of the run.
+
+    Returns:
+        np.ndarray: The last location of every walker, of shape (walkers, 2).
+    """
+
+    if not uses_batch_engine(config):
+        run_paths, _ = simulate_run(config, num_steps, instrumentation, progress_callback, profiler)
+        return np.array([path[-1] for path in run_paths], dtype=np.float64).reshape(-1, 2)
+    with phase(profiler, "simulate"):
+        endpoints = batch_engine.renewal_endpoints(config["walker_type"], config["num_concurrent_walkers"],
+                                                   num_steps, config["restart_option"], levy_options(config))
+    if progress_callback is not None:
+        progress_callback(config["num_concurrent_walkers"] * num_steps)
+    return endpoints
+
+
+def non_interactive(config: dict[str, Any], resume: Optional[checkpoint.SweepState] = None):
+    """
+    Runs a non-interactive simulation with the given configuration. With the "instrumentation" option, the calls of
+    the hot path of every simulation are counted and timed, and a summary is printed and saved at the end (runs of
+    the batch and lattice engines are not instrumented). With the "profile" option ("cprofile" or "sampling", see
+    profiling.py), the phases of the run are profiled and the results are saved next to stats.csv. The progress of
+    the sweep is reported as configured by the "progress" key (see progress_tracker). With a "checkpoint_file", the
+    state of the sweep is saved there between runs, at most every "checkpoint_interval" seconds (see checkpoint.py).
+    With "num_workers" above 1, the runs of every N run in that many worker processes, which return their results
+    through shared memory (see shared_results.py); their runs are not instrumented or profiled, and the checkpoints
+    are taken between N values. With "precision" set to "float32", the paths are stored in float32 (see path_dtype).
+    With "endpoint_stats", only the statistics of ENDPOINT_STATS are computed, from the last locations of the runs
+    (see simulate_endpoints), so no paths are kept; the options of FULL_PATH_OPTIONS are rejected by validate_config.
+
+    Parameters:
+        config (dict[str, Any]): The configuration for the simulation.
+        resume (checkpoint.SweepState, optional): The state of an interrupted sweep of this configuration, which is
+            continued bit-identically.
+    """
+
+    endpoint_only = bool(config.get("endpoint_stats"))
+    stats = new_stats(endpoint_only)
+    instrumentation = Instrumentation() if config.get("instrumentation") else None
+    profiler = PhaseProfiler(config["profile"]) if config.get("profile") else None
+    tracker = progress_tracker(config)
+    advance = tracker.advance if tracker is not None else None
+    checkpointer = checkpoint.Checkpointer(config["checkpoint_file"], config.get(
+        "checkpoint_interval", checkpoint.CHECKPOINT_INTERVAL)) if config.get("checkpoint_file") else None
+    occupancy = OccupancyGrid(bin_size=config.get("occupancy_bin_size", 1.0)) if config.get("occupancy_map") else None
+    executor = ProcessPoolExecutor(config["num_workers"]) if config.get("num_workers", 1) > 1 else None
+    if resume is not None:
+        stats, occupancy = resume.stats, resume.occupancy
+        checkpoint.restore_rng(resume.rng)
+        if tracker is not None:
+            tracker.skip(*resume.steps_done())
+    for step_index, num_steps in enumerate(config["num_steps_for_statistics"]):
+        if resume is not None and step_index < resume.step_index:
+            continue
+        message = f"running simulation on {num_steps} steps ({config['num_runs']} times)"
+        if tracker is None:
+            print(message)
+        else:
+            tracker.message(message)
+            tracker.set_label(f"N={num_steps}")
+        if endpoint_only:
+            endpoints = []
+            for _ in range(config["num_runs"]):
+                endpoints.append(simulate_endpoints(config, num_steps, instrumentation, advance, profiler))
+                if tracker is not None:
+                    tracker.finish_run()
+            with phase(profiler, "stats"):
+                calculate_endpoint_stats(np.concatenate(endpoints), stats, num_steps)
+            continue
         paths = []
-        for _ in range(config["num_runs"]):
-            simulation = create_simulation_with_config(config)
-            simulation.num_steps = num_steps
-            paths += simulation.run()
-        calculate_stats(paths, stats, num_steps)
-    stats_to_png(stats)
-    stats_to_csv(stats)
+        step_events = []
+        first_run = 0
+        if resume is not None and step_index == resume.step_index:
+            paths, step_events, first_run = resume.paths, resume.step_events, resume.run_index
+        if executor is not None:
+            with shared_results.SharedRuns(config["num_runs"], config["num_concurrent_walkers"], num_steps,
+                                           path_dtype(config)) as runs:
+                with phase(profiler, "simulate"):
+                    runs.run(executor, config, tracker)
+                with phase(profiler, "stats"):
+                    if occupancy is not None:
+                        occupancy.add_batch(runs.paths)
+                    calculate_stats(runs.paths, stats, num_steps, runs.events)
+            if checkpointer is not None:
+                checkpointer.run_finished(checkpoint.SweepState(config, stats, step_index + 1, 0, [], [], occupancy))
+            continue
+        for run_index in range(first_run, config["num_runs"]):
+            run_paths, run_events = simulate_run(config, num_steps, instrumentation, advance, profiler)
+            paths += run_paths
+            step_events.append(run_events)
+            if tracker is not None:
+                tracker.finish_run()
+            if checkpointer is not None:
+                checkpointer.run_finished(checkpoint.SweepState(config, stats, step_index, run_index + 1, paths,
+                                                                step_events, occupancy))
+        with phase(profiler, "stats"):
+            if occupancy is not None:
+                occupancy.add_batch(paths)
+            calculate_stats(paths, stats, num_steps, np.concatenate(step_events))
+    if executor is not None:
+        executor.shutdown()
+    if tracker is not None:
+        tracker.close()
+    with phase(profiler, "plot"):
+        stats_to_png(stats)
+        if occupancy is not None:
+            occupancy_to_files(occupancy)
+    with phase(profiler, "csv"):
+        stats_to_csv(stats)
+    if checkpointer is not None and os.path.exists(checkpointer.path):
+        os.remove(checkpointer.path)
+    if instrumentation is not None:
+        instrumentation.report(config.get("instrumentation_file", '../statistics/instrumentation.json'))
+    if profiler is not None:
+        print(profiler.summary())
+        print("profile written to", ", ".join(profiler.write()))
     print("done!")
 
 
 def interactive(config: dict[str, Any]):
     """
-    Runs an interactive simulation with the given configuration.
+    Runs an interactive simulation with the given configuration. With the "occupancy_map" option (and optionally
+    "occupancy_bin_size"), the walkers first run through the board with run_streaming, which feeds their positions to
+    an occupancy grid without storing their paths; they are then reset and animated over the heatmap of that grid.
 
     Parameters:
         config (dict[str, Any]): The configuration for the simulation.
@@ -275,7 +636,12 @@ def interactive(config: dict[str, Any]):
 
     simulation = create_simulation_with_config(config)
     simulation.ice_option = config["ice_option"]
-    Interactive(simulation).plot_walk()
+    occupancy = None
+    if config.get("occupancy_map"):
+        occupancy = OccupancyGrid(bin_size=config.get("occupancy_bin_size", 1.0))
+        simulation.run_streaming([occupancy])
+        simulation.reset_walkers()
+    Interactive(simulation).plot_walk(occupancy)
 
 def validate_config(config):
     necessary_keys = {
@@ -294,6 +660,8 @@ def validate_config(config):
     }
 
     for key, value in necessary_keys.items():
+        if key in SCENARIO_KEYS and "scenario_file" in config:
+            continue
         expected_type = value["type"]
         if key not in config:
             print(f"Error: Missing key in configuration: {key}. Please try again.")
@@ -306,12 +674,44 @@ def validate_config(config):
             if not min_val <= config[key] <= max_val:
                 print(f"Error: Invalid value for key {key}. Expected a value between {min_val} and {max_val}, got {config[key]}. Please try again.")
                 return False
+    if config.get("precision", "float64") not in PRECISIONS:
+        print(f"Error: Invalid value for key precision. Expected one of {list(PRECISIONS)}, got {config['precision']}. Please try again.")
+        return False
+    if (config.get("levy") or {}).get("sampler", "global") not in levy.LEVY_SAMPLERS:
+        print(f"Error: Invalid value for key levy.sampler. Expected one of {list(levy.LEVY_SAMPLERS)}, got {config['levy']['sampler']}. Please try again.")
+        return False
+    if config.get("history", "none") not in HISTORY_POLICIES:
+        print(f"Error: Invalid value for key history. Expected one of {list(HISTORY_POLICIES)}, got {config['history']}. Please try again.")
+        return False
+    history_length = config.get("history_length", HISTORY_LENGTH)
+    if not isinstance(history_length, int) or isinstance(history_length, bool) or history_length < 1:
+        print(f"Error: Invalid value for key history_length. Expected a positive int, got {history_length}. Please try again.")
+        return False
+    if config.get("endpoint_stats"):
+        for key in FULL_PATH_OPTIONS:
+            if config.get(key) and (key != "num_workers" or config[key] > 1):
+                print(f"Error: The key {key} needs the full paths and can not be combined with endpoint_stats. Please try again.")
+                return False
 
     return True
 
 def main(argv):
     config = None
-    if len(argv) > 0:
+    resume = None
+    try:
+        mode, argv = profile_mode(argv)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    if "--resume" in argv:
+        index = argv.index("--resume")
+        try:
+            resume = checkpoint.SweepState.load(argv[index + 1])
+        except (IndexError, OSError, ValueError, KeyError) as e:
+            print(f"Error loading checkpoint: {e}")
+            return
+        config = resume.config
+    elif len(argv) > 0:
         try:
             with open(argv[0]) as file:
                 config = json.load(file)
@@ -328,11 +728,13 @@ def main(argv):
 
     if not validate_config(config):
         return
+    if mode is not None:
+        config["profile"] = mode
 
     if config["check_interactive_or_non"] is True:
         interactive(config)
     else:
-        non_interactive(config)
+        non_interactive(config, resume)
 
 if __name__ == "__main__":
     main(sys.argv[1:])
\ No newline at end of file
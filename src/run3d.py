@@ -9,26 +9,45 @@ from interactive3d import Interactive3d
 from portal3d import Portal3d
 from obstacle3d import Obstacle3d
 from blackhole3d import BlackHole3d
+import motion
+import levy
+import scenario
+from instrumentation import Instrumentation
+from walker_store import HISTORY_LENGTH, HISTORY_POLICIES
+from profiling import PhaseProfiler, phase
 from typing import Any
 
+# the element counts, replaced by a scenario file
+SCENARIO_KEYS = ("portals3d", "obstacles3d", "traps_amount", "slow_zone_amount", "black_hole_amount")
 
-def create_simulation_with_config(config3d: dict[str, Any]) -> Simulation3d:
+
+def create_simulation_with_config(config3d: dict[str, Any], instrumentation: Instrumentation = None) -> Simulation3d:
     """
-    Creates a new Simulation3d instance with the given configuration.
+    Creates a new Simulation3d instance with the given configuration. The "history" key ("none" by default, "last" or
+    "full") and "history_length" select how the location history of the walkers is kept (see
+    walker_store.WalkerStore).
 
     Parameters:
         config3d (dict[str, Any]): The configuration for the simulation.
+        instrumentation (Instrumentation, optional): If provided, the hot path of the simulation is instrumented by it.
 
     Returns:
         Simulation3d: A new Simulation3d instance.
     """
-    walkers = [Walker3d(config3d["walker_type"], config3d["restart_option"]) for _ in
+    walkers = [Walker3d(config3d["walker_type"], config3d["restart_option"],
+                        levy.sampler_from_config(config3d.get("levy"), 3) if config3d["walker_type"] == 5 else None)
+               for _ in
                range(config3d["num_concurrent_walkers"])]
-    portals_list = [Portal3d() for _ in range(config3d["portals3d"])]
-    obstacles_list = [Obstacle3d() for _ in range(config3d["obstacles3d"])]
-    trap_list = [Traps3d() for _ in range(config3d["traps_amount"])]
-    slow_zone_list = [SlowZone3d() for _ in range(config3d["slow_zone_amount"])]
-    black_hole_list = [BlackHole3d() for _ in range(config3d["black_hole_amount"])]
+    if config3d.get("scenario_file"):
+        elements = scenario.load_elements(config3d["scenario_file"], 3)
+        portals_list, obstacles_list = elements["portals"], elements["obstacles"]
+        trap_list, slow_zone_list, black_hole_list = elements["traps"], elements["slow_zones"], elements["black_holes"]
+    else:
+        portals_list = [Portal3d() for _ in range(config3d["portals3d"])]
+        obstacles_list = [Obstacle3d() for _ in range(config3d["obstacles3d"])]
+        trap_list = [Traps3d() for _ in range(config3d["traps_amount"])]
+        slow_zone_list = [SlowZone3d() for _ in range(config3d["slow_zone_amount"])]
+        black_hole_list = [BlackHole3d() for _ in range(config3d["black_hole_amount"])]
     num_steps = config3d["num_steps"]
     ice_option = config3d["ice_option"]
 
@@ -42,23 +61,39 @@ def create_simulation_with_config(config3d: dict[str, Any]) -> Simulation3d:
         black_hole_list=black_hole_list,
         num_steps=num_steps,
         ice_option=ice_option,
-
+        continuous_collision=config3d.get("continuous_collision", False),
+        trajectories=motion.trajectories_from_config(config3d.get("trajectories"), {
+            "portals": portals_list,
+            "obstacles": obstacles_list,
+            "traps": trap_list,
+            "slow_zones": slow_zone_list,
+            "black_holes": black_hole_list,
+        }),
+        raster_cell_size=config3d.get("raster_cell_size"),
+        raster_bounds=config3d.get("raster_bounds"),
+        instrumentation=instrumentation,
+        history_policy=config3d.get("history", "none"),
+        history_length=config3d.get("history_length", HISTORY_LENGTH),
     )
     return simulation3d
 
 
-def interactive(config3d):
+def interactive(config3d, profiler: PhaseProfiler = None, instrumentation: Instrumentation = None):
     """
     Creates a new interactive simulation with the given configuration.
 
     Parameters:
         config3d (dict[str, Any]): The configuration for the simulation.
+        profiler (PhaseProfiler, optional): If provided, the scenario build and the plot are profiled by it.
+        instrumentation (Instrumentation, optional): If provided, the hot path of the simulation is instrumented by it.
     """
-    simulation3d = create_simulation_with_config(config3d)
-    simulation3d.ice_option = config3d["ice_option"]
-    inter = Interactive3d(simulation3d)
-    inter.set_initial_viewing_angle(30, 60)  # Add this line
-    inter.plot_walk_3d()
+    with phase(profiler, "scenario"):
+        simulation3d = create_simulation_with_config(config3d, instrumentation)
+        simulation3d.ice_option = config3d["ice_option"]
+    with phase(profiler, "plot"):
+        inter = Interactive3d(simulation3d)
+        inter.set_initial_viewing_angle(30, 60)  # Add this line
+        inter.plot_walk_3d()
 
 
 def validate_config(config):
@@ -76,6 +111,8 @@ def validate_config(config):
     }
 
     for key, value in necessary_keys.items():
+        if key in SCENARIO_KEYS and "scenario_file" in config:
+            continue
         expected_type = value["type"]
         if key not in config:
             print(f"Error: Missing key in configuration: {key}. Please try again.")
@@ -90,6 +127,19 @@ def validate_config(config):
                 print(
                     f"Error: Invalid value for key {key}. Expected a value between {min_val} and {max_val}, got {config[key]}. Please try again.")
                 return False
+    if (config.get("levy") or {}).get("sampler", "global") not in levy.LEVY_SAMPLERS:
+        print(
+            f"Error: Invalid value for key levy.sampler. Expected one of {list(levy.LEVY_SAMPLERS)}, got {config['levy']['sampler']}. Please try again.")
+        return False
+    if config.get("history", "none") not in HISTORY_POLICIES:
+        print(
+            f"Error: Invalid value for key history. Expected one of {list(HISTORY_POLICIES)}, got {config['history']}. Please try again.")
+        return False
+    history_length = config.get("history_length", HISTORY_LENGTH)
+    if not isinstance(history_length, int) or isinstance(history_length, bool) or history_length < 1:
+        print(
+            f"Error: Invalid value for key history_length. Expected a positive int, got {history_length}. Please try again.")
+        return False
 
     return True
 
@@ -97,13 +147,24 @@ def validate_config(config):
 def main(config: dict[str, Any]):
     """
     The main function of the program. It creates and runs an interactive simulation with the given configuration.
+    With the "profile" option ("cprofile" or "sampling", see profiling.py), the scenario build and the plot are
+    profiled and the results are saved to the statistics directory. With the "instrumentation" option, the calls of
+    the hot path of the simulation are counted and timed, and a summary is printed and saved to
+    instrumentation.json (or "instrumentation_file") after the run.
 
     Parameters:
         config (dict[str, Any]): The configuration for the simulation.
     """
     if not validate_config(config):
         return
-    interactive(config)
+    profiler = PhaseProfiler(config["profile"]) if config.get("profile") else None
+    instrumentation = Instrumentation() if config.get("instrumentation") else None
+    interactive(config, profiler, instrumentation)
+    if instrumentation is not None:
+        instrumentation.report(config.get("instrumentation_file", '../statistics/instrumentation.json'))
+    if profiler is not None:
+        print(profiler.summary())
+        print("profile written to", ", ".join(profiler.write()))
 
 
 if __name__ == "__main__":
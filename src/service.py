@@ -0,0 +1,372 @@
+"""
+An asyncio simulation service, for dashboards and other clients that want to drive simulations without the Tk GUI.
+A client connects over TCP and sends a request frame with the JSON {"dimensions": 2 or 3, "config": {...},
+"batch_size": steps per batch (optional)}, where the configuration has the schema of run2d.validate_config or
+run3d.validate_config. The service validates it, builds the simulation and runs it with run_streaming in a thread of a
+worker pool that all sessions share, and streams the positions back as binary frames while the simulation runs.
+
+Every frame is FRAME_HEADER (the kind and the length of the payload, big-endian) followed by the payload:
+    FRAME_REQUEST   client -> service, the JSON request
+    FRAME_START     JSON {"walkers", "dimensions", "num_steps", "batch_size"}, sent when a worker picks the session
+    FRAME_BATCH     BATCH_HEADER (the index of the first position in the paths, the number of steps, of walkers and of
+                    dimensions) followed by the positions as little-endian float32, of shape (steps, walkers,
+                    dimensions), and the event codes of the steps that led to them as uint8, of shape (steps, walkers)
+    FRAME_END       JSON {"steps"}, the simulation finished
+    FRAME_ERROR     JSON {"error"}, the request was invalid or the simulation failed
+Backpressure: the frames of a session go through a bounded queue. When a client reads slower than its simulation runs,
+the writes of its connection wait for the socket to drain, the queue fills up, and the simulation thread waits until
+the client catches up, so a slow client holds at most max_queued_frames batches in memory. When a client disconnects,
+its simulation stops at the next batch.
+
+Usage:
+    python service.py --port 8765 --workers 4
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import struct
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Optional
+
+import numpy as np
+
+import run2d
+import run3d
+from simulation import STREAM_BATCH_SIZE
+
+FRAME_HEADER = struct.Struct('!BI')
+BATCH_HEADER = struct.Struct('!IIHB')
+FRAME_REQUEST, FRAME_START, FRAME_BATCH, FRAME_END, FRAME_ERROR = range(5)
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 4
+MAX_QUEUED_FRAMES = 8  # the batches a session may buffer before its simulation waits for the client
+MAX_REQUEST_SIZE = 1 << 20
+
+
+class SessionClosed(Exception):
+    """Raised in the simulation thread of a session whose client is gone, to stop the simulation"""
+
+
+def encode_frame(kind: int, payload: bytes) -> bytes:
+    """returns a frame of a kind with a payload"""
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+def encode_json_frame(kind: int, message: dict[str, Any]) -> bytes:
+    """returns a frame of a kind with a JSON payload"""
+    return encode_frame(kind, json.dumps(message).encode())
+
+
+def encode_batch(first_index: int, positions: np.ndarray, step_events: np.ndarray) -> bytes:
+    """
+    Returns the FRAME_BATCH frame of a batch of positions.
+
+    Parameters:
+        first_index (int): The index of the first position of the batch in the paths.
+        positions (np.ndarray): The positions, of shape (steps, walkers, dimensions).
+        step_events (np.ndarray): The event codes of the steps, of shape (steps, walkers).
+
+    Returns:
+        bytes: The frame.
+    """
+    steps, walkers, dimensions = positions.shape
+    return encode_frame(FRAME_BATCH, BATCH_HEADER.pack(first_index, steps, walkers, dimensions)
+                        + positions.astype('<f4').tobytes() + step_events.astype(np.uint8).tobytes())
+
+
+def decode_batch(payload: bytes) -> tuple[int, np.ndarray, np.ndarray]:
+    """
+    Decodes the payload of a FRAME_BATCH frame.
+
+    Parameters:
+        payload (bytes): The payload.
+
+    Returns:
+        tuple[int, np.ndarray, np.ndarray]: The index of the first position, the positions and the event codes.
+    """
+    first_index, steps, walkers, dimensions = BATCH_HEADER.unpack_from(payload)
+    count = steps * walkers * dimensions
+    positions = np.frombuffer(payload, dtype='<f4', count=count, offset=BATCH_HEADER.size)
+    step_events = np.frombuffer(payload, dtype=np.uint8, offset=BATCH_HEADER.size + 4 * count)
+    return first_index, positions.reshape(steps, walkers, dimensions), step_events.reshape(steps, walkers)
+
+
+async def read_frame(reader: asyncio.StreamReader, max_size: Optional[int] = None) -> tuple[int, bytes]:
+    """
+    Reads the next frame of a stream.
+
+    Parameters:
+        reader (asyncio.StreamReader): The stream.
+        max_size (int, optional): The largest payload to accept.
+
+    Returns:
+        tuple[int, bytes]: The kind and the payload of the frame.
+
+    Raises:
+        asyncio.IncompleteReadError: If the stream ended before the frame.
+        ValueError: If the payload is larger than max_size.
+    """
+    kind, size = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if max_size is not None and size > max_size:
+        raise ValueError(f'frame of {size} bytes, at most {max_size} are accepted')
+    return kind, await reader.readexactly(size)
+
+
+def validate_request(request: Any) -> Optional[str]:
+    """
+    Checks a request of a client.
+
+    Parameters:
+        request (Any): The decoded JSON of the request.
+
+    Returns:
+        Optional[str]: Why the request is invalid, None if it is valid.
+    """
+    if not isinstance(request, dict) or not isinstance(request.get("config"), dict):
+        return 'the request must be a JSON object with a "config" object'
+    if request.get("dimensions", 2) not in (2, 3):
+        return '"dimensions" must be 2 or 3'
+    batch_size = request.get("batch_size", STREAM_BATCH_SIZE)
+    if not isinstance(batch_size, int) or batch_size < 1:
+        return '"batch_size" must be a positive integer'
+    module = run3d if request.get("dimensions", 2) == 3 else run2d
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):  # the validators print their errors
+        valid = module.validate_config(request["config"])
+    return None if valid else output.getvalue().strip()
+
+
+class FrameStream:
+    """
+    The FrameStream class is the consumer of the run_streaming of a session: it encodes every batch of positions as
+    a frame and puts it in the queue of the session, waiting while the queue is full.
+
+    Attributes:
+        simulation: The Simulation or Simulation3d of the session, whose events are read for every batch.
+        loop (asyncio.AbstractEventLoop): The event loop of the service.
+        queue (asyncio.Queue): The frames of the session.
+        closed (threading.Event): Set when the client is gone.
+        next_index (int): The index of the first position of the next batch in the paths.
+    """
+
+    def __init__(self, simulation, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue,
+                 closed: threading.Event) -> None:
+        """
+        Constructs a new FrameStream instance.
+
+        Parameters:
+            simulation: The Simulation or Simulation3d of the session.
+            loop (asyncio.AbstractEventLoop): The event loop of the service.
+            queue (asyncio.Queue): The frames of the session.
+            closed (threading.Event): Set when the client is gone.
+        """
+        self.simulation = simulation
+        self.loop = loop
+        self.queue = queue
+        self.closed = closed
+        self.next_index = 0
+
+    def put(self, frame: bytes) -> None:
+        """puts a frame in the queue, waiting while it is full, and stops the simulation if the client is gone"""
+        if self.closed.is_set():
+            raise SessionClosed()
+        asyncio.run_coroutine_threadsafe(self.queue.put(frame), self.loop).result()
+
+    def add_batch(self, positions: np.ndarray) -> None:
+        """encodes a batch of positions of run_streaming as a frame, with the events of the steps that led to them"""
+        indices = np.arange(self.next_index, self.next_index + len(positions))
+        step_events = np.zeros(positions.shape[:2], dtype=np.uint8)
+        moved = indices > 0  # the first position of the paths is not the result of a step
+        step_events[moved] = self.simulation.events[:, indices[moved] - 1].T
+        self.put(encode_batch(self.next_index, positions, step_events))
+        self.next_index += len(positions)
+
+
+def run_session(request: dict[str, Any], loop: asyncio.AbstractEventLoop, queue: asyncio.Queue,
+                closed: threading.Event) -> None:
+    """
+    Runs the simulation of a session in a thread of the worker pool, and puts its frames in the queue of the session,
+    ending with FRAME_END or FRAME_ERROR.
+
+    Parameters:
+        request (dict[str, Any]): The validated request.
+        loop (asyncio.AbstractEventLoop): The event loop of the service.
+        queue (asyncio.Queue): The frames of the session.
+        closed (threading.Event): Set when the client is gone.
+    """
+    dimensions = request.get("dimensions", 2)
+    batch_size = request.get("batch_size", STREAM_BATCH_SIZE)
+    stream = FrameStream(None, loop, queue, closed)
+    try:
+        module = run3d if dimensions == 3 else run2d
+        simulation = module.create_simulation_with_config(request["config"])
+        stream.simulation = simulation
+        walkers = simulation.walkers3d if dimensions == 3 else simulation.walkers
+        stream.put(encode_json_frame(FRAME_START, {"walkers": len(walkers), "dimensions": dimensions,
+                                                   "num_steps": simulation.num_steps, "batch_size": batch_size}))
+        simulation.run_streaming([stream], batch_size)
+        stream.put(encode_json_frame(FRAME_END, {"steps": simulation.num_steps}))
+    except SessionClosed:
+        pass
+    except Exception as e:
+        with contextlib.suppress(SessionClosed):
+            stream.put(encode_json_frame(FRAME_ERROR, {"error": f'{type(e).__name__}: {e}'}))
+
+
+class SimulationService:
+    """
+    The SimulationService class serves simulation sessions over TCP, running their simulations in a shared pool of
+    worker threads.
+
+    Attributes:
+        executor (ThreadPoolExecutor): The worker pool of the simulations.
+        max_queued_frames (int): The batches a session may buffer before its simulation waits for the client.
+        sessions (int): The number of open sessions.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_queued_frames: int = MAX_QUEUED_FRAMES) -> None:
+        """
+        Constructs a new SimulationService instance.
+
+        Parameters:
+            workers (int): The number of simulations that run at the same time, the other sessions wait for a worker.
+            max_queued_frames (int): The batches a session may buffer before its simulation waits for the client.
+        """
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="simulation")
+        self.max_queued_frames = max_queued_frames
+        self.sessions = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """serves a session: reads the request, runs its simulation in the pool and writes its frames"""
+        self.sessions += 1
+        try:
+            try:
+                kind, payload = await read_frame(reader, MAX_REQUEST_SIZE)
+                request = json.loads(payload) if kind == FRAME_REQUEST else None
+                error = validate_request(request) if kind == FRAME_REQUEST else 'expected a request frame'
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            except ValueError as e:  # also json.JSONDecodeError
+                error = str(e)
+            if error is not None:
+                writer.write(encode_json_frame(FRAME_ERROR, {"error": error}))
+                await writer.drain()
+                return
+            await self.stream(request, writer)
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def stream(self, request: dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        """runs the simulation of a request and writes its frames until FRAME_END or FRAME_ERROR"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(self.max_queued_frames)
+        closed = threading.Event()
+        engine = loop.run_in_executor(self.executor, run_session, request, loop, queue, closed)
+        try:
+            while True:
+                frame = await queue.get()
+                writer.write(frame)
+                await writer.drain()
+                if frame[0] in (FRAME_END, FRAME_ERROR):
+                    break
+        finally:
+            closed.set()
+            while not engine.done():  # unblock the simulation thread, which stops at its next batch
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.wait({engine}, timeout=0.05)
+
+    async def serve(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                    started: Optional[asyncio.Future] = None) -> None:
+        """
+        Serves sessions until cancelled.
+
+        Parameters:
+            host (str): The address to listen on.
+            port (int): The port to listen on, 0 for any free port.
+            started (asyncio.Future, optional): Set to the address and port of the server once it listens.
+        """
+        server = await asyncio.start_server(self.handle, host, port)
+        if started is not None:
+            started.set_result(server.sockets[0].getsockname()[:2])
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        """shuts the worker pool down"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def stream_simulation(host: str, port: int, request: dict[str, Any]) \
+        -> AsyncIterator[tuple[int, np.ndarray, np.ndarray]]:
+    """
+    A client of the service: sends a request and yields its batches.
+
+    Parameters:
+        host (str): The address of the service.
+        port (int): The port of the service.
+        request (dict[str, Any]): The request (see the module docstring).
+
+    Yields:
+        tuple[int, np.ndarray, np.ndarray]: The index of the first position, the positions and the event codes of
+        every batch (see decode_batch).
+
+    Raises:
+        RuntimeError: If the service answered with FRAME_ERROR.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(encode_json_frame(FRAME_REQUEST, request))
+        await writer.drain()
+        while True:
+            kind, payload = await read_frame(reader)
+            if kind == FRAME_BATCH:
+                yield decode_batch(payload)
+            elif kind == FRAME_ERROR:
+                raise RuntimeError(json.loads(payload)["error"])
+            elif kind == FRAME_END:
+                return
+    finally:
+        writer.close()
+        with contextlib.suppress(ConnectionError):
+            await writer.wait_closed()
+
+
+def main(argv: list[str]) -> int:
+    """
+    Runs the service until it is interrupted.
+
+    Parameters:
+        argv (list[str]): The command line arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(description="Streams simulations to clients over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="the number of simulations that run at the same time")
+    args = parser.parse_args(argv)
+    service = SimulationService(args.workers)
+    print(f"serving on {args.host}:{args.port} with {args.workers} workers")
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
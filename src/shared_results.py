@@ -0,0 +1,150 @@
+"""
+A shared-memory transport for the results of runs in worker processes. Returning the paths of a run from a worker
+would pickle every location of every walker, so instead the parent allocates multiprocessing.shared_memory blocks for
+the paths and the event codes of all runs of an N, sized from num_runs * num_walkers * num_steps, and every worker
+writes its run into its own rows of the blocks. Only small descriptors (the name, shape and dtype of a block and the
+rows of a run) cross the process boundaries. The parent reads the blocks as numpy arrays without a copy, and hands
+them to the stats and export stages.
+"""
+import random
+from concurrent.futures import Executor, as_completed
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Optional
+
+import numpy as np
+
+from levy import SEED_BOUND
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """
+    The SharedArray class describes a numpy array in a shared memory block, it is all a process needs to attach to it.
+
+    Attributes:
+        name (str): The name of the shared memory block.
+        shape (tuple): The shape of the array.
+        dtype (str): The dtype of the array.
+    """
+    name: str
+    shape: tuple
+    dtype: str
+
+    def attach(self) -> tuple[shared_memory.SharedMemory, np.ndarray]:
+        """returns the shared memory block and the array on it"""
+        block = shared_memory.SharedMemory(name=self.name)
+        return block, np.ndarray(self.shape, dtype=self.dtype, buffer=block.buf)
+
+
+@dataclass(frozen=True)
+class RunJob:
+    """
+    The RunJob class is a run of a sweep for a worker process.
+
+    Attributes:
+        config (dict[str, Any]): The configuration of the sweep.
+        num_steps (int): The number of steps of the run.
+        seed (int): The seed of random and np.random in the worker.
+        first_row (int): The first row of the run in the arrays, the run has a row for every walker.
+        paths (SharedArray): The paths of all runs, of shape (runs * walkers, steps + 1, 2).
+        events (SharedArray): The event codes of all runs, of shape (runs * walkers, steps).
+    """
+    config: dict
+    num_steps: int
+    seed: int
+    first_row: int
+    paths: SharedArray
+    events: SharedArray
+
+
+def run_job(job: RunJob) -> int:
+    """
+    Runs a job in a worker process and writes its paths and event codes into the shared arrays.
+
+    Returns:
+        int: The first row of the job.
+    """
+    import run2d  # run2d imports this module, the worker only needs it when it runs a job
+
+    random.seed(job.seed)
+    np.random.seed(job.seed)
+    run_paths, run_events = run2d.simulate_run(job.config, job.num_steps)
+    rows = slice(job.first_row, job.first_row + job.config["num_concurrent_walkers"])
+    paths_block, paths = job.paths.attach()
+    events_block, events = job.events.attach()
+    paths[rows] = run_paths
+    events[rows] = run_events
+    del paths, events
+    paths_block.close()
+    events_block.close()
+    return job.first_row
+
+
+class SharedRuns:
+    """
+    The SharedRuns class owns the shared arrays of the runs of an N, and runs them in the workers of an executor. It
+    is a context manager: the blocks are released when it exits, so the arrays must not be used after it.
+
+    Attributes:
+        paths (np.ndarray): The paths of all runs, of shape (runs * walkers, steps + 1, 2).
+        events (np.ndarray): The event codes of all runs, of shape (runs * walkers, steps).
+    """
+
+    def __init__(self, num_runs: int, num_walkers: int, num_steps: int, dtype: type = np.float64) -> None:
+        """
+        Constructs a new SharedRuns instance, and allocates its shared memory blocks.
+
+        Parameters:
+            num_runs (int): The number of runs.
+            num_walkers (int): The number of walkers of every run.
+            num_steps (int): The number of steps of every run.
+            dtype (type): The dtype of the paths, np.float64 or np.float32 (see run2d.path_dtype).
+        """
+        self.num_runs = num_runs
+        self.num_walkers = num_walkers
+        self.num_steps = num_steps
+        self.blocks: list[shared_memory.SharedMemory] = []
+        self.paths, self.paths_descriptor = self.allocate((num_runs * num_walkers, num_steps + 1, 2), dtype)
+        self.events, self.events_descriptor = self.allocate((num_runs * num_walkers, num_steps), np.uint8)
+
+    def allocate(self, shape: tuple, dtype: type) -> tuple[np.ndarray, SharedArray]:
+        """allocates a shared memory block for an array, and returns the array and its descriptor"""
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        self.blocks.append(block)
+        return np.ndarray(shape, dtype=dtype, buffer=block.buf), SharedArray(block.name, shape, np.dtype(dtype).str)
+
+    def run(self, executor: Executor, config: dict[str, Any], progress: Optional[Any] = None) -> None:
+        """
+        Runs all runs in the workers of an executor, with a seed drawn from np.random for every run, and waits for
+        them.
+
+        Parameters:
+            executor (Executor): The executor, e.g. a ProcessPoolExecutor.
+            config (dict[str, Any]): The configuration of the sweep.
+            progress (progress.ProgressTracker, optional): Counts the steps and runs as the runs finish.
+        """
+        seeds = np.random.randint(SEED_BOUND, size=self.num_runs, dtype=np.int64).tolist()
+        futures = [executor.submit(run_job, RunJob(config, self.num_steps, seed, run_index * self.num_walkers,
+                                                   self.paths_descriptor, self.events_descriptor))
+                   for run_index, seed in enumerate(seeds)]
+        for future in as_completed(futures):
+            future.result()
+            if progress is not None:
+                progress.advance(self.num_walkers * self.num_steps)
+                progress.finish_run()
+
+    def close(self) -> None:
+        """releases the shared memory blocks"""
+        self.paths = self.events = None
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self) -> 'SharedRuns':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -9,9 +9,17 @@ from trap import Trap
 import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
 import numpy as np
+from typing import Callable
 from slowZone import SlowZone
 import pprint
+import events
+import collision
+from walker_store import WalkerStore, HISTORY_LENGTH
+from motion import MotionPlan, size_attribute
+from spatial_index import ElementIndex, INDEX_MIN_ELEMENTS
+from raster import ElementRaster
 
+STREAM_BATCH_SIZE = 256
 
 class Simulation:
     """
@@ -19,7 +27,9 @@ class Simulation:
         """
 
     def __init__(self, walkers_list, portals_list, obstacles_list, trap_list,
-                 slow_zone_list, num_steps, ice_option):
+                 slow_zone_list, num_steps, ice_option, continuous_collision=False, trajectories=None,
+                 raster_cell_size=None, raster_bounds=None, instrumentation=None, history_policy="none",
+                 history_length=HISTORY_LENGTH):
         """
         Initializes the simulation with the given walkers, portals, obstacles, traps, slow zones, number of steps and ice option.
 
@@ -31,84 +41,370 @@ class Simulation:
         slow_zone_list (list): A list of SlowZone objects in the simulation.
         num_steps (int): The number of steps each walker will take in the simulation.
         ice_option (bool): An optional parameter that, if True, introduces a chance for the simulation to "freeze" for a short period.
+        continuous_collision (bool): If True, every step is checked along its whole segment, so long steps can not jump over portals, obstacles and traps.
+        trajectories (dict, optional): The motion.Trajectory of every moving element, keyed by the element. Elements without a trajectory are static.
+        raster_cell_size (float, optional): If provided and no element moves, the elements near a location are found in a raster.ElementRaster with cells of this size instead of the spatial index.
+        raster_bounds (float, optional): The raster covers [-raster_bounds, raster_bounds] along every axis. If not provided, it covers all elements.
+        instrumentation (instrumentation.Instrumentation, optional): If provided, the calls of the hot path are counted and timed by it. Without it the simulation is not instrumented at all.
+        history_policy (str): How the location history of the walkers is kept in the store: "none", "last" (the last history_length locations) or "full" (see walker_store.WalkerStore).
+        history_length (int): The number of locations of every walker kept by the "last" policy.
         """
         self.walkers = walkers_list
         self.elements = portals_list + obstacles_list + trap_list + slow_zone_list
+        self.blocking_elements = portals_list + obstacles_list + trap_list
+        self.slow_zones = slow_zone_list
         self.num_steps = num_steps
         self.ice_option = ice_option
+        self.last_event = events.EVENT_NONE
+        self.events = np.zeros((len(walkers_list), 0), dtype=np.uint8)
+        self.continuous_collision = continuous_collision
+        self.boxes = portals_list + obstacles_list
+        self.traps = trap_list
+        self.invalidate_geometry()
+        self.store = WalkerStore(len(walkers_list), len(trap_list), len(slow_zone_list), 2, history_policy,
+                                 history_length)
+        if history_policy != "none":
+            for row, walker in enumerate(walkers_list):
+                walker.attach_history(self.store, row)
+        self.walker_rows = {walker: row for row, walker in enumerate(walkers_list)}
+        self.trap_columns = {trap: column for column, trap in enumerate(trap_list)}
+        self.motion = MotionPlan(self.elements, trajectories, 2) if trajectories else None
+        if self.motion is not None and len(self.motion.moving) == 0:
+            self.motion = None
+        self.element_index = None
+        if self.motion is not None or (raster_cell_size is None and len(self.elements) >= INDEX_MIN_ELEMENTS):
+            self.element_index = ElementIndex(self.elements, 2, self.motion)
+        self.spatial_index = None if self.element_index is None else self.element_index.at(0)
+        if self.motion is None and raster_cell_size is not None:
+            self.spatial_index = ElementRaster(self.elements, 2, raster_cell_size, raster_bounds)
+        self.instrumentation = None
+        if instrumentation is not None:
+            instrumentation.attach(self)
 
-    def make_a_move(self, specific_walker: Walker) -> tuple[float, float]:
+    def make_a_move(self, specific_walker: Walker, new_location: tuple[float, float] = None) -> tuple[float, float]:
         """
-        Makes a move for a specific walker and returns the new location after the move.
+        Makes a move for a specific walker and returns the new location after the move. The events of the move
+        (see events.py) are stored in `last_event`.
 
         Parameters:
         specific_walker (Walker): The walker that is to make a move.
+        new_location (tuple[float, float], optional): The location the walker tries to move to. If not provided, it is
+        drawn according to the walker's type.
 
         Returns:
         tuple[float, float]: The new location of the walker after the move.
         """
-        new_location = specific_walker.new_loc_by_type()
+        if new_location is None:
+            new_location = specific_walker.new_loc_by_type()
+        if self.continuous_collision:
+            new_location = self.clip_step(specific_walker.get_current_location(), new_location)
         inside_element = False
-        for element in self.elements:
+        event = events.EVENT_NONE
+        blocking_elements = self.blocking_elements
+        if self.spatial_index is not None:
+            blocking_elements = self.blocking_candidates(specific_walker, new_location)
+        for element in blocking_elements:
             if isinstance(element, Portal) and element.is_inside_portal(new_location):
                 """if the walker is inside a portal, move the walker to the exit point of the portal and break the 
                 loop"""
                 new_location = element.exit_point
                 specific_walker.step(new_location)
                 inside_element = True
+                event |= events.EVENT_PORTAL_JUMP
                 break
 
             elif isinstance(element, Obstacle) and element.is_inside_obstacle(new_location):
                 """if the walker is inside an obstacle, break the loop and do not move the walker to the new location but 
                 to the current location"""
-                inside_element = True
-                break
+                self.last_event = event | events.EVENT_OBSTACLE_BLOCK
+                return specific_walker.get_current_location()
 
 
             elif isinstance(element, Trap):
                 """if the walker in inside a trap, and new location is not inside the trap, move the walker to the 
                 new"""
-                if element.is_inside_trap(specific_walker, specific_walker.get_current_location()):
-                    if not element.is_inside_trap(specific_walker, new_location):
-                        inside_element = True
-                        break
-                elif not element.is_inside_trap(specific_walker,
-                                                specific_walker.get_current_location()) and element.is_inside_trap(
-                    specific_walker, new_location):
-                    element.enter_trap(specific_walker)
+                trapped = self.store.trapped[self.walker_rows[specific_walker], self.trap_columns[element]]
+                if trapped or element.is_inside_trap(specific_walker.get_current_location()):
+                    if not trapped and not element.is_inside_trap(new_location):
+                        self.last_event = event | events.EVENT_TRAP_BLOCK
+                        return specific_walker.get_current_location()
+                elif element.is_inside_trap(new_location):
+                    self.enter_trap(specific_walker, element)
                     specific_walker.step(new_location)
                     inside_element = True
+                    event |= events.EVENT_TRAP_CAPTURE
                     break
-
-            elif isinstance(element, SlowZone):
-                if element.is_inside_slow_zone(specific_walker.get_current_location()):
-                    if specific_walker in element.slowed_walkers:
-                        break
-                    specific_walker.slow_down()
-                    element.enter_slow_zone(specific_walker)
-                if not element.is_inside_slow_zone(specific_walker.get_current_location()):
-                    if specific_walker in element.slowed_walkers:
-                        element.slowed_walkers.remove(specific_walker)
-                        specific_walker.regular_speed()
+        else:
+            event |= self.update_slow_zones(specific_walker)
 
         if not inside_element:
             specific_walker.step(new_location)
+        if specific_walker.restarted:
+            event |= events.EVENT_RESTART
+        self.last_event = event
+        if not inside_element:
             return new_location
         return specific_walker.get_current_location()
 
-    def run(self) -> list[list[tuple[float, float]]]:
+    def invalidate_geometry(self) -> None:
+        """
+        Recomputes the cached geometry of every element (see the elements' `invalidate`) and the bounds arrays used by
+        the vectorised collision checks. Has to be called whenever an element moves or changes its size.
+        """
+        for element in self.elements:
+            element.invalidate()
+        centers = np.array([element.center_loc for element in self.elements], dtype=float).reshape(-1, 2)
+        sizes = np.array([getattr(element, size_attribute(element)) for element in self.elements], dtype=float)
+        self.update_collision_arrays(centers, sizes)
+
+    def update_collision_arrays(self, centers: np.ndarray, sizes: np.ndarray) -> None:
+        """
+        Updates the bounds arrays used by the vectorised collision checks.
+
+        Parameters:
+        centers (np.ndarray): The centers of all elements (in the order of `elements`), of shape (elements, 2).
+        sizes (np.ndarray): The lengths of the portals and obstacles and the radii of the other elements.
+        """
+        num_boxes = len(self.boxes)
+        traps = slice(num_boxes, num_boxes + len(self.traps))
+        half_lengths = sizes[:num_boxes, np.newaxis] / 2
+        self.box_mins = centers[:num_boxes] - half_lengths
+        self.box_maxs = centers[:num_boxes] + half_lengths
+        self.trap_centers = centers[traps]
+        self.trap_radii = sizes[traps]
+
+    def set_time(self, step: int) -> None:
+        """
+        Moves the moving elements to their state at a step (see motion.MotionPlan) and selects the spatial index that
+        is valid at it. Does nothing for static elements.
+
+        Parameters:
+        step (int): The step.
+        """
+        if self.motion is not None:
+            self.motion.apply(step)
+            self.update_collision_arrays(self.motion.current_centers, self.motion.current_sizes)
+            self.spatial_index = self.element_index.at(step)
+
+    def blocking_candidates(self, specific_walker: Walker, new_location: tuple[float, float]) -> list:
+        """
+        Returns the portals, obstacles and traps that can affect a move, in the order they are checked: those that
+        the spatial index finds near the current or the new location, and the traps the walker is registered in.
+
+        Parameters:
+        specific_walker (Walker): The walker that moves.
+        new_location (tuple[float, float]): The location the walker tries to move to.
+
+        Returns:
+        list: The candidate elements.
+        """
+        candidates = self.spatial_index.candidates(specific_walker.get_current_location(), new_location)
+        trapped = self.store.trapped[self.walker_rows[specific_walker]]
+        if trapped.any():
+            first_trap = len(self.boxes)
+            candidates = sorted(set(candidates).union((first_trap + np.flatnonzero(trapped)).tolist()))
+        num_blocking = len(self.blocking_elements)
+        return [self.blocking_elements[index] for index in candidates if index < num_blocking]
+
+    def clip_step(self, location: tuple[float, float], new_location: tuple[float, float]) -> tuple[float, float]:
+        """
+        Clips a step right after the boundary of the first portal, obstacle or trap that the step enters, so that the
+        regular end point checks of make_a_move see the element instead of the walker jumping over it.
+
+        Parameters:
+        location (tuple[float, float]): The current location of the walker.
+        new_location (tuple[float, float]): The location the walker tries to move to.
+
+        Returns:
+        tuple[float, float]: The (possibly clipped) location the walker tries to move to.
+        """
+        starts = np.array([location], dtype=float)
+        ends = np.array([new_location], dtype=float)
+        t, _ = collision.first_hits(collision.segment_box_hits(starts, ends, self.box_mins, self.box_maxs),
+                                    collision.segment_sphere_hits(starts, ends, self.trap_centers, self.trap_radii))
+        if not np.isfinite(t[0]):
+            return new_location
+        x, y = collision.clip_segments(starts, ends, t)[0]
+        return float(x), float(y)
+
+    def enter_trap(self, specific_walker: Walker, trap: Trap) -> None:
+        """
+        Registers the walker in the trap if the walker is inside the trap.
+
+        Parameters:
+        specific_walker (Walker): The walker to register.
+        trap (Trap): The trap.
+        """
+        if trap.is_inside_trap(specific_walker.get_current_location()):
+            self.store.trapped[self.walker_rows[specific_walker], self.trap_columns[trap]] = True
+
+    def update_slow_zones(self, specific_walker: Walker) -> int:
+        """
+        Slows the walker down if its current location is inside a slow zone, and resets its speed when it left the
+        slow zone that slowed it.
+
+        Parameters:
+        specific_walker (Walker): The walker to update.
+
+        Returns:
+        int: EVENT_SLOW_ZONE_ENTRY if the walker entered a slow zone, EVENT_NONE otherwise.
         """
-                Runs the simulation for the specified number of steps and returns the paths of all walkers.
+        event = events.EVENT_NONE
+        if not self.slow_zones:
+            return event
+        location = specific_walker.get_current_location()
+        slowed = self.store.slowed[self.walker_rows[specific_walker]]
+        slow_zones = enumerate(self.slow_zones)
+        if self.spatial_index is not None:
+            first_slow_zone = len(self.blocking_elements)
+            columns = {index - first_slow_zone for index in self.spatial_index.candidates(location)
+                       if index >= first_slow_zone}
+            columns.update(np.flatnonzero(slowed).tolist())
+            slow_zones = [(column, self.slow_zones[column]) for column in sorted(columns)]
+        for column, element in slow_zones:
+            if element.is_inside_slow_zone(location):
+                if slowed[column]:
+                    break
+                specific_walker.slow_down()
+                slowed[column] = True
+                event |= events.EVENT_SLOW_ZONE_ENTRY
+            elif slowed[column]:
+                slowed[column] = False
+                specific_walker.regular_speed()
+        return event
+
+    def run(self, progress: Callable[[int], None] = None, dtype: type = None) -> list:
+        """
+                Runs the simulation for the specified number of steps and returns the paths of all walkers. The event
+                codes of every step are stored in `events`, an array of shape (walkers, steps). Moving elements are
+                moved to their state at every step before the walker moves (see set_time), so every walker sees the
+                same element positions at the same step. An instrumented simulation records the time of the run in its
+                instrumentation.
+
+                Parameters:
+                progress (Callable[[int], None], optional): Called with the number of walker steps done after every walker (see progress.py).
+                dtype (type, optional): If provided (e.g. np.float32), every location is written into a preallocated array of shape (walkers, steps + 1, 2) of this dtype as soon as it is known, instead of into lists of tuples, so the paths never exist in float64.
+
+                Returns:
+                list: A list of paths of all walkers. Each path is a list of tuples representing the locations of a walker at each step, or a row of the array of the dtype.
+                """
+        if self.instrumentation is not None:
+            self.instrumentation.start_run()
+        paths = [] if dtype is None else np.empty((len(self.walkers), self.num_steps + 1, 2), dtype=dtype)
+        self.events = np.zeros((len(self.walkers), self.num_steps), dtype=np.uint8)
+        for walker_index, walker in enumerate(self.walkers):
+            walker_events = self.events[walker_index]
+            if walker.walker_type == 6 and not walker.restart_option and self.motion is None:
+                path = self.run_resting_walker(walker, walker_events)
+                if dtype is None:
+                    paths.append(path)
+                else:
+                    paths[walker_index] = path
+            elif dtype is None:
+                path = [walker.current_location]
+                for step in range(self.num_steps):
+                    self.set_time(step)
+                    path.append(self.make_a_move(walker))
+                    walker_events[step] = self.last_event
+                paths.append(path)
+            else:
+                path = paths[walker_index]
+                path[0] = walker.current_location
+                for step in range(self.num_steps):
+                    self.set_time(step)
+                    path[step + 1] = self.make_a_move(walker)
+                    walker_events[step] = self.last_event
+            if progress is not None:
+                progress(self.num_steps)
+        if self.instrumentation is not None:
+            self.instrumentation.finish_run(len(self.walkers) * self.num_steps)
+        return paths if dtype is None else list(paths)
+
+    def run_resting_walker(self, walker: Walker, walker_events: np.ndarray) -> list[tuple[float, float]]:
+        """
+                Runs a type 6 walker (without the restart option) for the specified number of steps. Instead of
+                drawing a rest decision on every step, the number of consecutive rests is sampled at once. Once a
+                rest leaves the walker in place, the remaining rests can not change anything, so they are
+                materialised by repeating the location without checking the elements. A walker that reached its
+                location by a regular move is known to be outside every portal and obstacle, so even its first rest
+                only has to update the slow zones.
+
+                Parameters:
+                walker (Walker): The walker to run.
+                walker_events (np.ndarray): The event codes of the walker's steps, filled by this method.
+
+                Returns:
+                list[tuple[float, float]]: The path of the walker.
+                """
+        path = [walker.current_location]
+        step = 0
+        outside_elements = False
+        while step < self.num_steps:
+            rests = min(walker.sample_rests(), self.num_steps - step)
+            settled = False
+            if rests > 0 and outside_elements:
+                location = walker.get_current_location()
+                self.last_event = self.update_slow_zones(walker)
+                walker.step(location)
+                path.append(location)
+                walker_events[step] = self.last_event
+                step += 1
+                rests -= 1
+                settled = True
+            while rests > 0 and not settled:
+                location = walker.get_current_location()
+                path.append(self.make_a_move(walker, location))
+                walker_events[step] = self.last_event
+                step += 1
+                rests -= 1
+                settled = walker.get_current_location() == location
+                if settled:
+                    outside_elements = not self.last_event & events.EVENT_OBSTACLE_BLOCK
+            if rests > 0:
+                path.extend([location] * rests)
+                if not self.last_event & (events.EVENT_OBSTACLE_BLOCK | events.EVENT_TRAP_BLOCK):
+                    walker.record_history(location, rests)
+                walker_events[step:step + rests] = self.last_event & ~events.EVENT_SLOW_ZONE_ENTRY
+                step += rests
+            if step < self.num_steps:
+                path.append(self.make_a_move(walker, walker.random_walk6_move()))
+                walker_events[step] = self.last_event
+                step += 1
+                if self.last_event & events.EVENT_PORTAL_JUMP:
+                    outside_elements = False
+                elif not self.last_event & (events.EVENT_OBSTACLE_BLOCK | events.EVENT_TRAP_BLOCK):
+                    outside_elements = True
+        return path
+
+    def run_streaming(self, consumers: list, batch_size: int = STREAM_BATCH_SIZE) -> np.ndarray:
+        """
+                Runs the simulation with all walkers moving in lockstep, without storing their paths. The positions
+                are collected into batches of shape (steps, walkers, 2) and handed to every consumer.
+
+                Parameters:
+                consumers (list): Objects with an `add_batch(positions)` method (e.g. OccupancyGrid).
+                batch_size (int): The number of steps in every batch.
+
                 Returns:
-                list[list[tuple[float, float]]]: A list of paths of all walkers. Each path is a list of tuples representing the locations of a walker at each step.
+                np.ndarray: The final positions of all walkers, of shape (walkers, 2).
                 """
-        paths = []
-        for walker in self.walkers:
-            path = [walker.current_location]
-            for _ in range(self.num_steps):
-                path.append(self.make_a_move(walker))
-            paths.append(path)
-        return paths
+        buffer = np.empty((batch_size, len(self.walkers), 2))
+        buffer[0] = [walker.current_location for walker in self.walkers]
+        self.events = np.zeros((len(self.walkers), self.num_steps), dtype=np.uint8)
+        filled = 1
+        for step in range(self.num_steps):
+            if filled == batch_size:
+                for consumer in consumers:
+                    consumer.add_batch(buffer)
+                filled = 0
+            self.set_time(step)
+            for walker_index, walker in enumerate(self.walkers):
+                buffer[filled, walker_index] = self.make_a_move(walker)
+                self.events[walker_index, step] = self.last_event
+            filled += 1
+        for consumer in consumers:
+            consumer.add_batch(buffer[:filled])
+        return buffer[filled - 1].copy()
 
     def ice_probability_in_simulation(self) -> float:
         """
@@ -127,13 +423,16 @@ class Simulation:
 
     def reset_walkers(self) -> None:
         """
-               Resets all walkers to their initial state.
+               Resets all walkers to their initial state: at the origin, at their regular speed, and outside every trap
+               and slow zone.
 
                Returns:
                None
                """
         for walk in self.walkers:
             walk.reset_walker()
+            walk.regular_speed()
+        self.store.release(slice(None))
 
     def get_walkers(self) -> list[Walker]:
         """
@@ -1,98 +1,316 @@
 import pprint
 import random
+from typing import Callable
+
+import numpy as np
 
 import helper
+import events
+import collision
+from walker_store import WalkerStore, HISTORY_LENGTH
+from motion import MotionPlan, size_attribute
+from spatial_index import ElementIndex, INDEX_MIN_ELEMENTS
+from raster import ElementRaster
 from portal3d import Portal3d
 from obstacle3d import Obstacle3d
 from walker3d import Walker3d
 from traps3d import Traps3d
 from slowzone3d import SlowZone3d
-from blackhole3d import BlackHole3d
+from blackhole3d import BlackHole3d, BlackHoleKernel
+
+STREAM_BATCH_SIZE = 256
 
 
 class Simulation3d:
     def __init__(self, walkers3d_list, portals3d_list, obstacles3d_list, walls3d_list, trap3d_list,
-                 slow_zone3d_list, black_hole_list, num_steps, ice_option) -> None:
+                 slow_zone3d_list, black_hole_list, num_steps, ice_option, continuous_collision=False,
+                 trajectories=None, raster_cell_size=None, raster_bounds=None, instrumentation=None,
+                 history_policy="none", history_length=HISTORY_LENGTH) -> None:
         """initialize the simulation with the given walkers, elements, number of steps and ice option (probability of the
-        frame to pause so that the user can see the movement of the walkers easier)"""
+        frame to pause so that the user can see the movement of the walkers easier). with continuous_collision, every
+        step is checked along its whole segment, so long steps can not jump over portals, obstacles and traps.
+        trajectories maps every moving element to its motion.Trajectory, elements without a trajectory are static.
+        with a raster_cell_size and static elements, the elements near a location are found in a raster.ElementRaster
+        with cells of that size (covering [-raster_bounds, raster_bounds], or all elements without raster_bounds).
+        with an instrumentation.Instrumentation, the calls of the hot path are counted and timed by it. the location
+        history of the walkers is kept in the store by history_policy: "none", "last" (the last history_length
+        locations) or "full" (see walker_store.WalkerStore)"""
         self.walkers3d = walkers3d_list
         self.elements3d = portals3d_list + obstacles3d_list + walls3d_list + trap3d_list + slow_zone3d_list + black_hole_list
+        self.elements_without_black_holes = portals3d_list + obstacles3d_list + walls3d_list + trap3d_list + slow_zone3d_list
+        self.black_holes = black_hole_list
         self.num_steps = num_steps
         self.ice_option = ice_option
+        self.last_event = events.EVENT_NONE
+        self.events = np.zeros((len(walkers3d_list), 0), dtype=np.uint8)
+        self.continuous_collision = continuous_collision
+        self.boxes = portals3d_list + obstacles3d_list
+        self.traps = trap3d_list
+        self.trap_offset = len(portals3d_list + obstacles3d_list + walls3d_list)
+        self.slow_zone_offset = self.trap_offset + len(trap3d_list)
+        self.invalidate_geometry()
+        self.store = WalkerStore(len(walkers3d_list), len(trap3d_list), len(slow_zone3d_list), 3, history_policy,
+                                 history_length)
+        if history_policy != "none":
+            for row, walker3d in enumerate(walkers3d_list):
+                walker3d.attach_history(self.store, row)
+        self.walker_rows = {walker: row for row, walker in enumerate(walkers3d_list)}
+        self.trap_columns = {trap: column for column, trap in enumerate(trap3d_list)}
+        self.slow_zone_columns = {slow_zone: column for column, slow_zone in enumerate(slow_zone3d_list)}
+        self.motion = MotionPlan(self.elements3d, trajectories, 3) if trajectories else None
+        if self.motion is not None and len(self.motion.moving) == 0:
+            self.motion = None
+        self.element_index = None
+        if self.motion is not None or (raster_cell_size is None and len(self.elements3d) >= INDEX_MIN_ELEMENTS):
+            self.element_index = ElementIndex(self.elements3d, 3, self.motion)
+        self.spatial_index = None if self.element_index is None else self.element_index.at(0)
+        if self.motion is None and raster_cell_size is not None:
+            self.spatial_index = ElementRaster(self.elements3d, 3, raster_cell_size, raster_bounds)
+        self.instrumentation = None
+        if instrumentation is not None:
+            instrumentation.attach(self)
 
-    def make_a_move(self, specific_walker3d: Walker3d) -> tuple[float, float, float]:
-        """make a move for the walker, check if the walker is inside any element, if so, take the necessary action"""
-        new_location = specific_walker3d.new_loc_by_type_3d()
+    def make_a_move(self, specific_walker3d: Walker3d, new_location: tuple[float, float, float] = None,
+                    pull: np.ndarray = None) -> tuple[float, float, float]:
+        """make a move for the walker, check if the walker is inside any element, if so, take the necessary action.
+        the location the walker tries to move to is drawn according to its type, unless it is given.
+        the location the black holes pull the walker to can be given as precomputed by BlackHoleKernel.pull (NaN if
+        the walker is outside every event horizon), otherwise the black holes are checked here.
+        the events of the move (see events.py) are stored in `last_event`"""
+        if new_location is None:
+            new_location = specific_walker3d.new_loc_by_type_3d()
+        if self.continuous_collision:
+            new_location = self.clip_step(specific_walker3d.get_current_location_3d(), new_location)
         inside_element = False
-        for element in self.elements3d:
+        event = events.EVENT_NONE
+        elements, black_holes = self.elements_without_black_holes, self.black_holes
+        if self.spatial_index is not None:
+            elements, black_holes = self.candidate_elements(specific_walker3d, new_location)
+        for element in elements:
             if isinstance(element, Portal3d) and element.is_inside_portal_3d(new_location):
                 """if the walker is inside a portal, move the walker to the exit point of the portal"""
                 new_location = element.exit_point
                 specific_walker3d.step(new_location)
                 inside_element = True
+                event |= events.EVENT_PORTAL_JUMP
                 break
 
             elif isinstance(element, Obstacle3d) and element.is_inside_obstacle_3d(new_location):
                 """if the walker is inside an obstacle, move the walker to the previous location 
                 (no change- it will do a step to same location)"""
-                inside_element = True
-                break
+                self.last_event = event | events.EVENT_OBSTACLE_BLOCK
+                return specific_walker3d.get_current_location_3d()
 
             elif isinstance(element, Traps3d):
                 """if the walker is inside a trap and the new location is not inside the trap, move the walker to the new location
                 else, no change in the location of the walker (no change- it will do a step to same location)"""
-                if element.is_inside_trap_3d(specific_walker3d, specific_walker3d.get_current_location_3d()):
-                    if not element.is_inside_trap_3d(specific_walker3d, new_location):
+                trapped = self.store.trapped[self.walker_rows[specific_walker3d], self.trap_columns[element]]
+                if trapped or element.is_inside_trap_3d(specific_walker3d.get_current_location_3d()):
+                    if not trapped and not element.is_inside_trap_3d(new_location):
                         """if the walker is inside a trap and new location is not inside the trap, step to same location"""
-                        inside_element = True
-                        break
-                elif not element.is_inside_trap_3d(specific_walker3d,
-                                                   specific_walker3d.get_current_location_3d()) and element.is_inside_trap_3d(
-                    specific_walker3d, new_location):
+                        self.last_event = event | events.EVENT_TRAP_BLOCK
+                        return specific_walker3d.get_current_location_3d()
+                elif element.is_inside_trap_3d(new_location):
                     """if the walker is not yet inside the trap and the new location is inside the trap, let him move
-                    into the trap and add the walker to the trap's list of walkers inside the trap"""
-                    element.enter_trap_3d(specific_walker3d)
+                    into the trap and register the walker in the trap"""
+                    if element.is_inside_trap_3d(specific_walker3d.get_current_location_3d()):
+                        self.store.trapped[self.walker_rows[specific_walker3d], self.trap_columns[element]] = True
                     specific_walker3d.step(new_location)
                     inside_element = True
+                    event |= events.EVENT_TRAP_CAPTURE
                     break
 
             elif isinstance(element, SlowZone3d):
-                """if the walker is inside a slow zone, slow down the walker and add the walker
-                 to the list of walkers inside the slow zone"""
+                """if the walker is inside a slow zone, slow down the walker and register the walker
+                 as slowed by the slow zone"""
+                slowed = self.store.slowed[self.walker_rows[specific_walker3d]]
+                column = self.slow_zone_columns[element]
                 if element.is_inside_slow_zone(specific_walker3d.get_current_location_3d()):
-                    if specific_walker3d in element.slowed_walkers3d:
+                    if slowed[column]:
                         break
                     specific_walker3d.slow_down()
-                    element.enter_slow_zone(specific_walker3d)
-                if not element.is_inside_slow_zone(specific_walker3d.get_current_location_3d()):
-                    if specific_walker3d in element.slowed_walkers3d:
-                        element.slowed_walkers3d.remove(specific_walker3d)
-                        specific_walker3d.regular_speed()
-
-            elif isinstance(element, BlackHole3d):
-                """if the walker is inside a the event horizon of black hole, move the walker to the center of the black hole"""
-                if element.is_in_horizon_event_zone(specific_walker3d.get_current_location_3d()):
-                    new_location = specific_walker3d.step_towards_location(element.center_loc)
-                    specific_walker3d.step(new_location)
-                    inside_element = True
-                    break
+                    slowed[column] = True
+                    event |= events.EVENT_SLOW_ZONE_ENTRY
+                elif slowed[column]:
+                    slowed[column] = False
+                    specific_walker3d.regular_speed()
+
+        else:
+            """if the walker is inside the event horizon of a black hole, move the walker towards the center of the 
+            black hole"""
+            if pull is None:
+                pull = self.black_hole_pull(specific_walker3d, black_holes)
+            if pull is not None and not np.isnan(pull[0]):
+                new_location = tuple(pull)
+                specific_walker3d.step(new_location)
+                inside_element = True
+                event |= events.EVENT_BLACK_HOLE_PULL
 
         # If walker is not inside any portal or obstacle, take a step
         if not inside_element:
             specific_walker3d.step(new_location)
+        if specific_walker3d.restarted:
+            event |= events.EVENT_RESTART
+        self.last_event = event
+        if not inside_element:
             return new_location
         return specific_walker3d.get_current_location_3d()
 
-    def run(self) -> list[list[tuple[float, float, float]]]:
-        """run the simulation for the given number of steps and return the paths of the walkers"""
+    def invalidate_geometry(self) -> None:
+        """recompute the cached geometry of every element (see the elements' `invalidate`) and the bounds arrays used by
+        the vectorised collision checks. has to be called whenever an element moves or changes its size"""
+        for element in self.elements3d:
+            element.invalidate()
+        self.black_hole_kernel = BlackHoleKernel(self.black_holes)
+        centers = np.array([element.center_loc for element in self.elements3d], dtype=float).reshape(-1, 3)
+        sizes = np.array([getattr(element, size_attribute(element)) for element in self.elements3d], dtype=float)
+        self.update_collision_arrays(centers, sizes)
+
+    def update_collision_arrays(self, centers: np.ndarray, sizes: np.ndarray) -> None:
+        """update the bounds arrays used by the vectorised collision checks and the black hole centers of the black
+        hole kernel from the centers and sizes (lengths of portals and obstacles, radii of the other elements) of all
+        elements, in the order of `elements3d`"""
+        num_boxes = len(self.boxes)
+        traps = slice(self.trap_offset, self.slow_zone_offset)
+        half_lengths = sizes[:num_boxes, np.newaxis] / 2
+        self.box_mins = centers[:num_boxes] - half_lengths
+        self.box_maxs = centers[:num_boxes] + half_lengths
+        self.trap_centers = centers[traps]
+        self.trap_radii = sizes[traps]
+        self.black_hole_kernel.centers = centers[len(centers) - len(self.black_holes):]
+
+    def set_time(self, step: int) -> None:
+        """move the moving elements to their state at the step (see motion.MotionPlan) and select the spatial index
+        that is valid at it. does nothing for static elements"""
+        if self.motion is not None:
+            self.motion.apply(step)
+            self.update_collision_arrays(self.motion.current_centers, self.motion.current_sizes)
+            self.spatial_index = self.element_index.at(step)
+
+    def candidate_elements(self, specific_walker3d: Walker3d, new_location: tuple[float, float, float]) -> tuple:
+        """return the elements (without the black holes) and the black holes that can affect a move, in the order
+        they are checked: those that the spatial index finds near the current or the new location, and the traps and
+        slow zones the walker is registered in"""
+        candidates = self.spatial_index.candidates(specific_walker3d.get_current_location_3d(), new_location)
+        row = self.walker_rows[specific_walker3d]
+        trapped, slowed = self.store.trapped[row], self.store.slowed[row]
+        if trapped.any() or slowed.any():
+            candidates = sorted(set(candidates).union((self.trap_offset + np.flatnonzero(trapped)).tolist(),
+                                                      (self.slow_zone_offset + np.flatnonzero(slowed)).tolist()))
+        num_elements = len(self.elements_without_black_holes)
+        return ([self.elements3d[index] for index in candidates if index < num_elements],
+                [self.elements3d[index] for index in candidates if index >= num_elements])
+
+    def black_hole_pull(self, specific_walker3d: Walker3d, black_holes: list = None):
+        """return the location the first black hole (out of the given ones, all if not given) whose event horizon
+        contains the walker pulls it to, or None if the walker is outside every event horizon"""
+        location = specific_walker3d.get_current_location_3d()
+        for black_hole in self.black_holes if black_holes is None else black_holes:
+            if black_hole.is_in_horizon_event_zone(location):
+                return specific_walker3d.step_towards_location(black_hole.center_loc)
+        return None
+
+    def clip_step(self, location: tuple[float, float, float],
+                  new_location: tuple[float, float, float]) -> tuple[float, float, float]:
+        """clip a step right after the boundary of the first portal, obstacle or trap that it enters, so the regular
+        end point checks of make_a_move see the element instead of the walker jumping over it"""
+        starts = np.array([location], dtype=float)
+        ends = np.array([new_location], dtype=float)
+        t, _ = collision.first_hits(collision.segment_box_hits(starts, ends, self.box_mins, self.box_maxs),
+                                    collision.segment_sphere_hits(starts, ends, self.trap_centers, self.trap_radii))
+        if not np.isfinite(t[0]):
+            return new_location
+        x, y, z = collision.clip_segments(starts, ends, t)[0]
+        return float(x), float(y), float(z)
+
+    def run(self, progress: Callable[[int], None] = None) -> list[list[tuple[float, float, float]]]:
+        """run the simulation for the given number of steps and return the paths of the walkers. the event codes of
+        every step are stored in `events`, an array of shape (walkers, steps). moving elements are moved to their state
+        at every step before the walker moves (see set_time). an instrumented simulation records the time of the run
+        in its instrumentation. progress is called with the number of walker steps done after every walker.
+        the black holes are checked per walker (black_hole_pull) and not with the batched pull of run_streaming: run
+        moves one walker through all its steps before the next, so at any step only one walker's location is known,
+        and the batched pull needs the locations of all walkers at the same step. running the walkers in lockstep
+        instead would change the order of the draws from random and np.random, and with it the paths of a seeded run"""
+        if self.instrumentation is not None:
+            self.instrumentation.start_run()
         paths = []
-        for walker3d in self.walkers3d:
-            path = [walker3d.current_location_3d]
-            for _ in range(self.num_steps):
-                path.append(self.make_a_move(walker3d))
-            paths.append(path)
+        self.events = np.zeros((len(self.walkers3d), self.num_steps), dtype=np.uint8)
+        for walker_index, walker3d in enumerate(self.walkers3d):
+            walker_events = self.events[walker_index]
+            if walker3d.walker_type == 6 and not walker3d.restart_option and self.motion is None:
+                paths.append(self.run_resting_walker(walker3d, walker_events))
+            else:
+                path = [walker3d.current_location_3d]
+                for step in range(self.num_steps):
+                    self.set_time(step)
+                    path.append(self.make_a_move(walker3d))
+                    walker_events[step] = self.last_event
+                paths.append(path)
+            if progress is not None:
+                progress(self.num_steps)
+        if self.instrumentation is not None:
+            self.instrumentation.finish_run(len(self.walkers3d) * self.num_steps)
         return paths
 
+    def run_resting_walker(self, walker3d: Walker3d, walker_events: np.ndarray) -> list[tuple[float, float, float]]:
+        """run a type 6 walker (without the restart option) and return its path. the number of consecutive rests is
+        sampled at once, and once a rest leaves the walker in place the remaining rests are materialised by repeating
+        the location instead of checking the elements again. walker_events is filled with the event codes"""
+        path = [walker3d.current_location_3d]
+        step = 0
+        while step < self.num_steps:
+            rests = min(walker3d.sample_rests(), self.num_steps - step)
+            while rests > 0:
+                location = walker3d.get_current_location_3d()
+                path.append(self.make_a_move(walker3d, location))
+                walker_events[step] = self.last_event
+                step += 1
+                rests -= 1
+                if walker3d.get_current_location_3d() == location:
+                    break
+            if rests > 0:
+                path.extend([location] * rests)
+                if not self.last_event & (events.EVENT_OBSTACLE_BLOCK | events.EVENT_TRAP_BLOCK):
+                    walker3d.record_history(location, rests)
+                walker_events[step:step + rests] = self.last_event & ~events.EVENT_SLOW_ZONE_ENTRY
+                step += rests
+            if step < self.num_steps:
+                path.append(self.make_a_move(walker3d, walker3d.random_walk6_move_3d()))
+                walker_events[step] = self.last_event
+                step += 1
+        return path
+
+    def run_streaming(self, consumers: list, batch_size: int = STREAM_BATCH_SIZE) -> np.ndarray:
+        """run all walkers in lockstep without storing their paths, handing batches of positions of shape
+        (steps, walkers, 3) to every consumer (objects with an `add_batch(positions)` method). returns the final
+        positions of the walkers"""
+        buffer = np.empty((batch_size, len(self.walkers3d), 3))
+        buffer[0] = [walker3d.current_location_3d for walker3d in self.walkers3d]
+        self.events = np.zeros((len(self.walkers3d), self.num_steps), dtype=np.uint8)
+        filled = 1
+        for step in range(self.num_steps):
+            if filled == batch_size:
+                for consumer in consumers:
+                    consumer.add_batch(buffer)
+                filled = 0
+            self.set_time(step)
+            pulls = self.pull_all() if self.black_holes else [None] * len(self.walkers3d)
+            for walker_index, walker3d in enumerate(self.walkers3d):
+                buffer[filled, walker_index] = self.make_a_move(walker3d, pull=pulls[walker_index])
+                self.events[walker_index, step] = self.last_event
+            filled += 1
+        for consumer in consumers:
+            consumer.add_batch(buffer[:filled])
+        return buffer[filled - 1].copy()
+
+    def pull_all(self) -> np.ndarray:
+        """return the locations the black holes pull all walkers to, checked with a single vectorised comparison
+        (NaN for walkers outside every event horizon). used by run_streaming, which moves all walkers in lockstep
+        (run checks the black holes per walker, see run)"""
+        locations = np.array([walker3d.get_current_location_3d() for walker3d in self.walkers3d], dtype=float)
+        return self.black_hole_kernel.pull(locations.reshape(-1, 3))
+
     def ice_probability_in_simulation(self) -> float:
         """return the probability of the frame to pause so that the user can see the movement of the walkers easier"""
         if self.ice_option is False:
@@ -104,9 +322,12 @@ class Simulation3d:
             return pause_time
 
     def reset_walkers3d(self) -> None:
-        """reset the walkers to their initial location"""
+        """reset the walkers to their initial state: at the origin, at their regular speed, and outside every trap and
+        slow zone"""
         for walk in self.walkers3d:
-            walk.reset_walker3d()
+            walk.reset_walker()
+            walk.regular_speed()
+        self.store.release(slice(None))
 
     def get_walkers3d(self) -> list[Walker3d]:
         """return the list of walkers"""
@@ -1,6 +1,4 @@
 import helper
-import walker
-from walker import Walker
 
 
 class SlowZone:
@@ -10,16 +8,28 @@ class SlowZone:
     Attributes:
         center_loc (tuple[float, float]): The location of the center of the slow zone.
         radius (float): The radius of the slow zone.
-        slowed_walkers (list[walker.Walker]): The list of walkers that are inside the slow zone.
+        radius_squared (float): The squared radius of the slow zone, computed by `invalidate`.
+
+    The walkers slowed by the slow zone are kept by the simulation (see walker_store.WalkerStore).
     """
 
-    def __init__(self)-> None:
+    def __init__(self, radius=None, center_loc=None) -> None:
+        """
+        Constructs a new SlowZone instance.
+
+        Parameters:
+            radius (float, optional): The radius of the slow zone. If not provided, a random radius is generated.
+            center_loc (tuple[float, float], optional): The center location of the slow zone. If not provided, a random location is generated.
+        """
+        self.center_loc = helper.generate_random_coordinate() if center_loc is None else center_loc
+        self.radius = helper.generate_random_length() if radius is None else radius
+        self.invalidate()
+
+    def invalidate(self) -> None:
         """
-        Constructs a new SlowZone instance with a random radius and center location.
+        Recomputes the cached squared radius of the slow zone. Has to be called whenever its radius changes.
         """
-        self.center_loc = helper.generate_random_coordinate()
-        self.radius = helper.generate_random_length()
-        self.slowed_walkers: list[Walker] = []
+        self.radius_squared = self.radius ** 2
 
     def is_inside_slow_zone(self, new_location: tuple) -> bool:
         """
@@ -33,15 +43,4 @@ class SlowZone:
         """
         x, y = new_location
         center_x, center_y = self.center_loc
-        distance = ((x - center_x) ** 2 + (y - center_y) ** 2) ** 0.5
-        return distance <= self.radius
-
-    def enter_slow_zone(self, walker: Walker) -> None:
-        """
-        Adds a walker to the list of slowed walkers if the walker is inside the slow zone.
-
-        Parameters:
-            walker (Walker): The walker to add.
-        """
-        if self.is_inside_slow_zone(walker.get_current_location()):
-            self.slowed_walkers.append(walker)
+        return (x - center_x) ** 2 + (y - center_y) ** 2 <= self.radius_squared
@@ -1,5 +1,4 @@
 import helper
-from walker3d import Walker3d
 
 
 class SlowZone3d:
@@ -9,17 +8,29 @@ class SlowZone3d:
     Attributes:
         center_loc (tuple[float, float, float]): The location of the center of the slow zone.
         radius (float): The radius of the slow zone.
-        slowed_walkers3d (list[walker3d.Walker3d]): The list of walkers that are inside the slow zone.
+        radius_squared (float): The squared radius of the slow zone, computed by `invalidate`.
+
+    The walkers slowed by the slow zone are kept by the simulation (see walker_store.WalkerStore).
     """
 
-    def __init__(self):
+    def __init__(self, radius=None, center_loc=None):
         """
-        Constructs a new SlowZone3d instance with a random radius and center location.
+        Constructs a new SlowZone3d instance.
+
+        Parameters:
+            radius (float, optional): The radius of the slow zone. If not provided, a random radius is generated.
+            center_loc (tuple[float, float, float], optional): The center location of the slow zone. If not provided, a random location is generated.
         """
 
-        self.center_loc = helper.generate_random_coordinate_3d()
-        self.radius = helper.generate_random_length()
-        self.slowed_walkers3d = []
+        self.center_loc = helper.generate_random_coordinate_3d() if center_loc is None else center_loc
+        self.radius = helper.generate_random_length() if radius is None else radius
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """
+        Recomputes the cached squared radius of the slow zone. Has to be called whenever its radius changes.
+        """
+        self.radius_squared = self.radius ** 2
 
     def is_inside_slow_zone(self,new_location3d: tuple[float, float, float]) -> bool:
         """
@@ -33,16 +44,4 @@ class SlowZone3d:
         """
         x, y, z = new_location3d
         center_x, center_y, center_z = self.center_loc
-        distance = ((x - center_x) ** 2 + (y - center_y) ** 2 + (z - center_z) ** 2) ** 0.5
-        return distance <= self.radius
-
-    def enter_slow_zone(self, walker: Walker3d) -> None:
-        """
-        Adds a walker to the list of slowed walkers if the walker is inside the slow zone.
-
-        Parameters:
-            walker (Walker3d): The walker to add.
-        """
-        if self.is_inside_slow_zone(walker.get_current_location_3d()):
-            self.slowed_walkers3d.append(walker)
-
+        return (x - center_x) ** 2 + (y - center_y) ** 2 + (z - center_z) ** 2 <= self.radius_squared
@@ -0,0 +1,171 @@
+import itertools
+import math
+from typing import Optional
+
+import numpy as np
+
+from motion import MotionPlan
+
+MAX_CELLS_PER_ELEMENT = 64  # larger elements are not put in cells, they are candidates of every query
+REBUILD_INTERVAL = 32  # the number of steps a spatial index of moving elements stays valid
+MAX_CACHED_INDICES = 256  # the number of rebuilt indices kept, so walkers run one after the other reuse them
+INDEX_MIN_ELEMENTS = 32  # static scenes with fewer elements are checked without an index
+
+
+def element_extents(elements: list) -> np.ndarray:
+    """
+    Returns the distance from the center of every element to the farthest point that can affect a walker: half the
+    length of squares and cubes, the event horizon radius of black holes and the radius of every other element.
+    Unknown elements get an infinite extent.
+
+    Parameters:
+        elements (list): The elements.
+
+    Returns:
+        np.ndarray: The extents, of shape (elements,).
+    """
+
+    extents = []
+    for element in elements:
+        if hasattr(element, 'length'):
+            extents.append(element.length / 2)
+        elif hasattr(element, 'horizon_radius'):
+            extents.append(max(element.horizon_radius, element.radius))
+        elif hasattr(element, 'radius'):
+            extents.append(element.radius)
+        else:
+            extents.append(np.inf)
+    return np.array(extents, dtype=float)
+
+
+class SpatialIndex:
+    """
+    The SpatialIndex class is a uniform grid over the bounding boxes of elements. Every cell lists the elements whose
+    (possibly inflated) bounding box overlaps it, so the elements that can contain a location are found with a single
+    dictionary lookup instead of checking every element.
+
+    Attributes:
+        cell_size (float): The side length of a single cell.
+        cells (dict[tuple, list[int]]): The indices of the elements overlapping every non empty cell.
+        always (list[int]): The indices of the elements that are too large (or unbounded) to be put in cells.
+    """
+
+    def __init__(self, mins: np.ndarray, maxs: np.ndarray, cell_size: Optional[float] = None) -> None:
+        """
+        Constructs a new SpatialIndex instance. Building costs at most MAX_CELLS_PER_ELEMENT insertions per element.
+
+        Parameters:
+            mins (np.ndarray): The minimum corners of the bounding boxes, of shape (elements, dimension).
+            maxs (np.ndarray): The maximum corners of the bounding boxes, of shape (elements, dimension).
+            cell_size (float, optional): The side length of a cell. If not provided, it is the median size of the
+                bounding boxes, so that a typical element overlaps a few cells.
+        """
+        if cell_size is None:
+            cell_size = suggest_cell_size(mins, maxs)
+        self.cell_size = cell_size
+        self.cells: dict[tuple, list[int]] = {}
+        self.always: list[int] = []
+        finite = np.isfinite(mins).all(axis=1) & np.isfinite(maxs).all(axis=1)
+        low = np.floor(np.where(finite[:, np.newaxis], mins, 0) / cell_size).astype(np.int64)
+        high = np.floor(np.where(finite[:, np.newaxis], maxs, 0) / cell_size).astype(np.int64)
+        num_cells = np.prod(high - low + 1, axis=1)
+        for index in range(len(mins)):
+            if not finite[index] or num_cells[index] > MAX_CELLS_PER_ELEMENT:
+                self.always.append(index)
+                continue
+            ranges = [range(low_cell, high_cell + 1) for low_cell, high_cell in zip(low[index].tolist(),
+                                                                                     high[index].tolist())]
+            for cell in itertools.product(*ranges):
+                self.cells.setdefault(cell, []).append(index)
+
+    def candidates(self, *locations: tuple) -> list[int]:
+        """
+        Returns the elements that may contain any of the given locations.
+
+        Parameters:
+            *locations (tuple): The locations.
+
+        Returns:
+            list[int]: The sorted indices of the candidate elements.
+        """
+        found = set(self.always)
+        for location in locations:
+            cell = tuple(math.floor(coordinate / self.cell_size) for coordinate in location)
+            found.update(self.cells.get(cell, ()))
+        return sorted(found)
+
+
+def suggest_cell_size(mins: np.ndarray, maxs: np.ndarray) -> float:
+    """returns the median side length of the finite bounding boxes, or 1 if there are none"""
+    sizes = (maxs - mins).max(axis=1) if len(mins) else np.zeros(0)
+    sizes = sizes[np.isfinite(sizes) & (sizes > 0)]
+    return float(np.median(sizes)) if len(sizes) else 1.0
+
+
+class ElementIndex:
+    """
+    The ElementIndex class provides the spatial index of the elements of a simulation at any step. Static elements
+    are indexed once. Moving elements are indexed periodically: the index built at the start of every interval of
+    REBUILD_INTERVAL steps inflates every bounding box by the largest distance the element can move within the
+    interval (and by its largest pulsed size), so it stays valid for the whole interval. The rebuild cost is bounded
+    by MAX_CELLS_PER_ELEMENT per element per interval, and rebuilt indices are cached for walkers that replay the
+    same steps.
+
+    Attributes:
+        elements (list): The indexed elements.
+        dimension (int): The number of coordinates of every location (2 or 3).
+        motion (MotionPlan): The trajectories of the elements, None if they are static.
+        rebuild_interval (int): The number of steps an index stays valid.
+        indices (dict[int, SpatialIndex]): The cached indices, keyed by the interval number.
+        extents (np.ndarray): The (inflated) extent of every element, see element_extents.
+        cell_size (float): The cell size of the indices, chosen by the first index and kept for the others.
+    """
+
+    def __init__(self, elements: list, dimension: int, motion: Optional[MotionPlan] = None,
+                 rebuild_interval: int = REBUILD_INTERVAL) -> None:
+        """
+        Constructs a new ElementIndex instance.
+
+        Parameters:
+            elements (list): The elements, in the order of the simulation's element list.
+            dimension (int): The number of coordinates of every location (2 or 3).
+            motion (MotionPlan, optional): The trajectories of the elements. If not provided, they are static.
+            rebuild_interval (int): The number of steps an index of moving elements stays valid.
+        """
+        self.elements = elements
+        self.dimension = dimension
+        self.motion = motion if motion is not None and len(motion.moving) else None
+        self.rebuild_interval = rebuild_interval
+        self.indices: dict[int, SpatialIndex] = {}
+        extents = element_extents(elements)
+        if self.motion is not None:
+            extents = extents * (1 + np.abs(self.motion.pulse_amplitudes)) + self.motion.max_displacements(
+                rebuild_interval)
+        self.extents = extents
+        self.cell_size: Optional[float] = None
+
+    def at(self, step: int) -> SpatialIndex:
+        """
+        Returns the spatial index that is valid at a step.
+
+        Parameters:
+            step (int): The step.
+
+        Returns:
+            SpatialIndex: The index.
+        """
+        interval = 0 if self.motion is None else step // self.rebuild_interval
+        index = self.indices.get(interval)
+        if index is None:
+            if len(self.indices) >= MAX_CACHED_INDICES:
+                self.indices.clear()
+            if self.motion is None:
+                centers = np.array([element.center_loc for element in self.elements],
+                                   dtype=float).reshape(-1, self.dimension)
+            else:
+                centers = self.motion.centers(interval * self.rebuild_interval)
+            extents = self.extents[:, np.newaxis]
+            index = SpatialIndex(centers - extents, centers + extents, self.cell_size)
+            self.cell_size = index.cell_size
+            self.indices[interval] = index
+        return index
@@ -1,6 +1,4 @@
 import helper
-import walker
-from walker import Walker
 
 
 class Trap:
@@ -9,42 +7,40 @@ class Trap:
 
     Attributes:
         radius (float): The radius of the trap.
+        radius_squared (float): The squared radius of the trap, computed by `invalidate`.
         center_loc (tuple[float, float]): The location of the center of the trap.
-        trapped_walkers (list[walker.Walker]): The list of walkers trapped in the trap.
+
+    The walkers registered in the trap are kept by the simulation (see walker_store.WalkerStore).
     """
 
-    def __init__(self) -> None:
+    def __init__(self, radius=None, center_loc=None) -> None:
+        """
+        Constructs a new Trap instance.
+
+        Parameters:
+            radius (float, optional): The radius of the trap. If not provided, a random radius is generated.
+            center_loc (tuple[float, float], optional): The center location of the trap. If not provided, a random location is generated.
+        """
+        self.radius = helper.generate_random_length() if radius is None else radius
+        self.center_loc = helper.generate_random_coordinate() if center_loc is None else center_loc
+        self.invalidate()
+
+    def invalidate(self) -> None:
         """
-        Constructs a new Trap instance with a random radius and center location.
+        Recomputes the cached squared radius of the trap. Has to be called whenever its radius changes.
         """
-        self.radius = helper.generate_random_length()
-        self.center_loc = helper.generate_random_coordinate()
-        self.trapped_walkers: list[Walker] = []
+        self.radius_squared = self.radius ** 2
 
-    def is_inside_trap(self, walker: Walker, new_location: tuple) -> bool:
+    def is_inside_trap(self, new_location: tuple) -> bool:
         """
-        Checks if a walker is inside the trap.
+        Checks if a location is inside the trap.
 
         Parameters:
-            walker (Walker): The walker to check.
             new_location (tuple): The new location of the walker.
 
         Returns:
-            bool: True if the walker is inside the trap, False otherwise.
+            bool: True if the location is inside the trap, False otherwise.
         """
-        if walker in self.trapped_walkers:
-            return True
         x, y = new_location
         center_x, center_y = self.center_loc
-        distance = ((x - center_x) ** 2 + (y - center_y) ** 2) ** 0.5
-        return distance <= self.radius
-
-    def enter_trap(self, walker: Walker) -> None:
-        """
-        Adds a walker to the list of trapped walkers if the walker is inside the trap.
-
-        Parameters:
-            walker (Walker): The walker to add.
-        """
-        if self.is_inside_trap(walker, walker.get_current_location()):
-            self.trapped_walkers.append(walker)
+        return (x - center_x) ** 2 + (y - center_y) ** 2 <= self.radius_squared
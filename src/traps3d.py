@@ -1,6 +1,4 @@
 import helper
-import walker3d
-from walker3d import Walker3d
 
 
 class Traps3d:
@@ -9,45 +7,42 @@ class Traps3d:
 
     Attributes:
         radius (float): The radius of the trap.
+        radius_squared (float): The squared radius of the trap, computed by `invalidate`.
         center_loc (tuple[float, float, float]): The location of the center of the trap.
-        trapped_walkers (list[walker3d.Walker3d]): The list of walkers trapped in the trap.
+
+    The walkers registered in the trap are kept by the simulation (see walker_store.WalkerStore).
     """
 
-    def __init__(self) -> None:
+    def __init__(self, radius=None, center_loc=None) -> None:
         """
-        Constructs a new Traps3d instance with a random radius and center location.
+        Constructs a new Traps3d instance.
+
+        Parameters:
+            radius (float, optional): The radius of the trap. If not provided, a random radius is generated.
+            center_loc (tuple[float, float, float], optional): The center location of the trap. If not provided, a random location is generated.
         """
 
-        self.radius = helper.generate_random_length()
-        self.center_loc = helper.generate_random_coordinate_3d()
-        self.trapped_walkers: list[Walker3d]= []
+        self.radius = helper.generate_random_length() if radius is None else radius
+        self.center_loc = helper.generate_random_coordinate_3d() if center_loc is None else center_loc
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """
+        Recomputes the cached squared radius of the trap. Has to be called whenever its radius changes.
+        """
+        self.radius_squared = self.radius ** 2
 
-    def is_inside_trap_3d(self, walker: Walker3d, new_location3d: tuple[float, float, float]) -> bool:
+    def is_inside_trap_3d(self, new_location3d: tuple[float, float, float]) -> bool:
         """
-        Checks if a walker is inside the trap.
+        Checks if a location is inside the trap.
 
         Parameters:
-            walker (Walker3d): The walker to check.
             new_location3d (tuple[float, float, float]): The new location of the walker.
 
         Returns:
-            bool: True if the walker is inside the trap, False otherwise.
+            bool: True if the location is inside the trap, False otherwise.
         """
 
-        if walker in self.trapped_walkers:
-            return True
         x, y, z = new_location3d
         center_x, center_y, center_z = self.center_loc
-        distance = ((x - center_x) ** 2 + (y - center_y) ** 2 + (z - center_z) ** 2) ** 0.5
-        return distance <= self.radius
-
-    def enter_trap_3d(self, walker: Walker3d) -> None:
-        """
-        Adds a walker to the list of trapped walkers if the walker is inside the trap.
-
-        Parameters:
-            walker (Walker3d): The walker to add.
-        """
-        if self.is_inside_trap_3d(walker, walker.get_current_location_3d()):
-            self.trapped_walkers.append(walker)
-
+        return (x - center_x) ** 2 + (y - center_y) ** 2 + (z - center_z) ** 2 <= self.radius_squared
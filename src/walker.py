@@ -4,6 +4,7 @@ from typing import Union
 
 import numpy as np
 import helper
+import levy
 
 UNIT = 1
 SLOW = 2
@@ -20,23 +21,36 @@ class Walker:
     Attributes:
         current_location (tuple[float, float]): The current location of the walker.
         walker_type (int): The type of the walker.
-        loc_history (list[tuple[float, float]]): The history of the walker's locations.
+        loc_history (list[tuple[float, float]]): The history of the walker's locations, kept by the simulation with
+            its history policy (see walker_store.WalkerStore), empty if the walker is not attached to a history.
+        history_store (WalkerStore): The store that keeps the history of the walker, None if it is not kept.
+        history_row (int): The row of the walker in the history store.
         walker_color (tuple[float, float, float]): The color of the walker.
         is_slower (bool): A flag indicating whether the walker is slower.
         restart_option (bool): A flag indicating whether the walker has the restart option.
+        restarted (bool): A flag indicating whether the walker restarted on its last step.
+        levy_sampler (levy.GlobalLevySampler or levy.LevySampler): The source of the steps of a type 5 walker,
+            None for other types.
     """
 
-    def __init__(self, walker_type: int, restart_option: bool) -> None:
+    def __init__(self, walker_type: int, restart_option: bool,
+                 levy_sampler: Union[levy.GlobalLevySampler, levy.LevySampler] = None) -> None:
         """
-        Constructs a new Walker instance with a specific type and restart option.
+        Constructs a new Walker instance with a specific type and restart option. A type 5 walker without a
+        levy_sampler gets a GlobalLevySampler with the default parameters.
         """
 
         self.current_location = (0, 0)
         self.walker_type = walker_type
-        self.loc_history: list[tuple[float,float]] = []
+        self.history_store = None
+        self.history_row = 0
         self.walker_color = helper.generate_random_color()
         self.is_slower = False
         self.restart_option = restart_option
+        self.restarted = False
+        if levy_sampler is None and walker_type == 5:
+            levy_sampler = levy.GlobalLevySampler(2)
+        self.levy_sampler = levy_sampler
 
     def get_slope_from_direction(self, direction: str) -> float:
         """
@@ -93,7 +107,8 @@ class Walker:
             new_location (tuple): The new location.
         """
 
-        self.loc_history.append(self.current_location)
+        if self.history_store is not None:
+            self.history_store.record_history(self.history_row, self.current_location)
         self.set_current_location(new_location)
         self.check_restart()
 
@@ -168,9 +183,7 @@ class Walker:
             tuple: The new location.
         """
 
-        alpha = 1.5
-        step_length = np.random.pareto(alpha) + 1
-        slope_radians = np.random.uniform(0, 2 * np.pi)
+        step_length, slope_radians = self.levy_sampler.next_step()
         if self.is_slower is True:
             return self.calc_new_location(slope_radians, step_length / SLOW)
         return self.calc_new_location(slope_radians, step_length)
@@ -187,10 +200,31 @@ class Walker:
         if num < FIFTY_PERCENT:
             return self.get_current_location()
         else:
-            slope_radians = random.uniform(0, 2 * np.pi)
-            if self.is_slower is True:
-                return self.calc_new_location(slope_radians, UNIT / SLOW)
-            return self.calc_new_location(slope_radians, UNIT)
+            return self.random_walk6_move()
+
+    def random_walk6_move(self) -> tuple:
+        """
+        Returns the new location for a random_walk6 step in which the walker does not rest.
+
+        Returns:
+            tuple: The new location.
+        """
+
+        slope_radians = random.uniform(0, 2 * np.pi)
+        if self.is_slower is True:
+            return self.calc_new_location(slope_radians, UNIT / SLOW)
+        return self.calc_new_location(slope_radians, UNIT)
+
+    def sample_rests(self) -> int:
+        """
+        Samples how many consecutive steps a random_walk6 walker rests before its next move. Every step is a rest
+        with a probability of 50%, so the number of rests is geometric: P(rests >= n) = 0.5 ** n.
+
+        Returns:
+            int: The number of rests before the next move.
+        """
+
+        return int(math.log(1.0 - random.random()) / math.log(FIFTY_PERCENT))
 
     def calc_new_location(self, slope_radians: float, distance: Union[int,float]) -> tuple:
         """
@@ -217,6 +251,23 @@ class Walker:
         """gets the walker's current location"""
         return self.current_location
 
+    @property
+    def loc_history(self) -> list[tuple[float, float]]:
+        """the walker's kept location history, oldest first"""
+        if self.history_store is None:
+            return []
+        return [tuple(location) for location in self.history_store.last_locations(self.history_row).tolist()]
+
+    def attach_history(self, store, row: int) -> None:
+        """makes a store keep the walker's location history, in a row of its arrays (see walker_store.WalkerStore)"""
+        self.history_store = store
+        self.history_row = row
+
+    def record_history(self, location: tuple[float, float], count: int = 1) -> None:
+        """records a location in the walker's history, count times"""
+        if self.history_store is not None:
+            self.history_store.record_history(self.history_row, location, count)
+
     def get_loc_history(self) -> list:
         """gets the walker's location history"""
         return self.loc_history
@@ -238,10 +289,13 @@ class Walker:
         """resets the walker's speed"""
         self.is_slower = False
 
-    def check_restart(self) -> None:
-        """checks if the walker should restart by the restart option and a random chance of 10%"""
-        if self.restart_option and random.random() < TEN_PERCENT:
+    def check_restart(self) -> bool:
+        """checks if the walker should restart by the restart option and a random chance of 10%, returns whether it
+        restarted"""
+        self.restarted = self.restart_option and random.random() < TEN_PERCENT
+        if self.restarted:
             self.reset_walker()
+        return self.restarted
 
 
 if __name__ == '__main__':
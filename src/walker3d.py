@@ -4,6 +4,7 @@ from typing import Union
 
 import numpy as np
 import helper
+import levy
 
 UNIT = 1
 SLOW = 4
@@ -21,24 +22,38 @@ class Walker3d:
      Attributes:
          current_location_3d (tuple[float, float, float]): The current location of the walker.
          walker_type (int): The type of the walker.
-         loc_history (list[tuple[float, float, float]]): The history of the walker's locations.
+         loc_history (list[tuple[float, float, float]]): The history of the walker's locations, kept by the
+             simulation with its history policy (see walker_store.WalkerStore), empty if the walker is not attached
+             to a history.
+         history_store (WalkerStore): The store that keeps the history of the walker, None if it is not kept.
+         history_row (int): The row of the walker in the history store.
          walker_color (tuple[float, float, float]): The color of the walker.
          is_slower (bool): A flag indicating whether the walker is slower.
          restart_option (bool): A flag indicating whether the walker has the restart option.
+         restarted (bool): A flag indicating whether the walker restarted on its last step.
+         levy_sampler (levy.GlobalLevySampler or levy.LevySampler): The source of the steps of a type 5
+             walker, None for other types.
      """
 
-    def __init__(self, walker_type: int, restart_option=False) -> None:
+    def __init__(self, walker_type: int, restart_option=False,
+                 levy_sampler: Union[levy.GlobalLevySampler, levy.LevySampler] = None) -> None:
 
         """
-        Constructs a new Walker3d instance with a specific type and restart option.
+        Constructs a new Walker3d instance with a specific type and restart option. A type 5 walker without a
+        levy_sampler gets a GlobalLevySampler with the default parameters.
         """
 
         self.current_location_3d = (0, 0, 0)
         self.walker_type = walker_type
-        self.loc_history: list[tuple[float, float, float]] = []
+        self.history_store = None
+        self.history_row = 0
         self.walker_color = helper.generate_random_color()
         self.is_slower = False
         self.restart_option = restart_option
+        self.restarted = False
+        if levy_sampler is None and walker_type == 5:
+            levy_sampler = levy.GlobalLevySampler(3)
+        self.levy_sampler = levy_sampler
 
     def get_slope_from_direction(self, direction: str) -> float:
         """
@@ -97,7 +112,8 @@ class Walker3d:
         """
 
         if new_location3d is not None:
-            self.loc_history.append(self.current_location_3d)
+            if self.history_store is not None:
+                self.history_store.record_history(self.history_row, self.current_location_3d)
             self.set_current_location_3d(new_location3d)
         self.check_restart()
         return self.get_current_location_3d()
@@ -175,10 +191,7 @@ class Walker3d:
         Returns:
             tuple[float, float, float]: The new location.
         """
-        alpha = 1.5
-        step_length = np.random.pareto(alpha) + 1
-        theta = np.random.uniform(0, 2 * np.pi)
-        phi = np.random.uniform(0, np.pi)
+        step_length, theta, phi = self.levy_sampler.next_step()
         if self.is_slower is True:
             return self.calc_new_location_3d(theta, phi, step_length / SLOW)
         return self.calc_new_location_3d(theta, phi, step_length)
@@ -195,11 +208,32 @@ class Walker3d:
         if num < TEN_PERCENT:
             return self.get_current_location_3d()
         else:
-            theta = random.uniform(0, 2 * np.pi)
-            phi = random.uniform(0, math.pi)
-            if self.is_slower is True:
-                return self.calc_new_location_3d(theta, phi, UNIT / SLOW)
-            return self.calc_new_location_3d(theta, phi, UNIT)
+            return self.random_walk6_move_3d()
+
+    def random_walk6_move_3d(self) -> tuple[float, float, float]:
+        """
+        Returns the new location for a random_walk6 step in which the walker does not rest.
+
+        Returns:
+            tuple[float, float, float]: The new location.
+        """
+
+        theta = random.uniform(0, 2 * np.pi)
+        phi = random.uniform(0, math.pi)
+        if self.is_slower is True:
+            return self.calc_new_location_3d(theta, phi, UNIT / SLOW)
+        return self.calc_new_location_3d(theta, phi, UNIT)
+
+    def sample_rests(self) -> int:
+        """
+        Samples how many consecutive steps a random_walk6 walker rests before its next move. Every step is a rest
+        with a probability of 10%, so the number of rests is geometric: P(rests >= n) = 0.1 ** n.
+
+        Returns:
+            int: The number of rests before the next move.
+        """
+
+        return int(math.log(1.0 - random.random()) / math.log(TEN_PERCENT))
 
     def calc_new_location_3d(self, theta: float, phi: float, step_size: Union[int, float]) -> tuple[
         float, float, float]:
@@ -231,6 +265,23 @@ class Walker3d:
         """Returns the current location of the walker."""
         return self.current_location_3d
 
+    @property
+    def loc_history(self) -> list[tuple[float, float, float]]:
+        """The kept location history of the walker, oldest first."""
+        if self.history_store is None:
+            return []
+        return [tuple(location) for location in self.history_store.last_locations(self.history_row).tolist()]
+
+    def attach_history(self, store, row: int) -> None:
+        """Makes a store keep the location history of the walker, in a row of its arrays (see walker_store)."""
+        self.history_store = store
+        self.history_row = row
+
+    def record_history(self, location: tuple[float, float, float], count: int = 1) -> None:
+        """Records a location in the history of the walker, count times."""
+        if self.history_store is not None:
+            self.history_store.record_history(self.history_row, location, count)
+
     def get_loc_history(self) -> list:
         """Returns the location history of the walker."""
         return self.loc_history
@@ -252,10 +303,12 @@ class Walker3d:
         """Resets the walker's speed to normal."""
         self.is_slower = False
 
-    def check_restart(self) -> None:
-        """Checks if the walker should restart."""
-        if self.restart_option and random.random() < TEN_PERCENT:
+    def check_restart(self) -> bool:
+        """Checks if the walker should restart, and returns whether it restarted."""
+        self.restarted = self.restart_option and random.random() < TEN_PERCENT
+        if self.restarted:
             self.reset_walker()
+        return self.restarted
 
     def step_towards_location(self, location_to_reach: tuple[float, float, float]) -> tuple[float, float, float]:
         """
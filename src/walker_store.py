@@ -0,0 +1,119 @@
+import numpy as np
+
+HISTORY_POLICIES = ("none", "last", "full")
+HISTORY_LENGTH = 256  # the default number of positions kept by the "last" policy
+FULL_HISTORY_CAPACITY = 64  # the initial number of positions of the "full" policy, doubled whenever it is full
+
+
+class WalkerStore:
+    """
+    The WalkerStore class keeps the per-walker state of a simulation in arrays (struct of arrays) owned by the
+    simulation, instead of lists of walkers kept by every element. Rows are walkers (in the order of the
+    simulation's walker list), columns are elements (in the order of the simulation's element lists).
+
+    The location history of the walkers (the location before every step) is kept by one of the HISTORY_POLICIES:
+        none    nothing is kept, and recording costs nothing (the walkers are not attached to the store)
+        last    the last history_length locations of every walker, in a ring buffer that is allocated once
+        full    every location, in an array whose capacity is doubled when it is full
+
+    Attributes:
+        trapped (np.ndarray): A bool array of shape (walkers, traps), True where a walker is registered in a trap.
+        slowed (np.ndarray): A bool array of shape (walkers, slow zones), True where a slow zone slowed a walker.
+        history_policy (str): The history policy, one of HISTORY_POLICIES.
+        history (np.ndarray): The recorded locations, of shape (walkers, capacity, dimension). With the "last"
+            policy, location i of a walker is in column i % capacity.
+        history_counts (np.ndarray): The number of locations recorded for every walker.
+    """
+
+    def __init__(self, num_walkers: int, num_traps: int, num_slow_zones: int, dimension: int = 2,
+                 history_policy: str = "none", history_length: int = HISTORY_LENGTH) -> None:
+        """
+        Constructs a new WalkerStore instance in which no walker is trapped or slowed, and without history.
+
+        Parameters:
+            num_walkers (int): The number of walkers.
+            num_traps (int): The number of traps.
+            num_slow_zones (int): The number of slow zones.
+            dimension (int): The dimension of the locations, 2 or 3.
+            history_policy (str): The history policy, one of HISTORY_POLICIES.
+            history_length (int): The number of locations of every walker kept by the "last" policy.
+        """
+        if history_policy not in HISTORY_POLICIES:
+            raise ValueError(f'Invalid history policy: {history_policy}, expected one of {HISTORY_POLICIES}')
+        if history_policy == "last" and history_length < 1:
+            raise ValueError(f'The history length must be positive, got {history_length}')
+        self.trapped = np.zeros((num_walkers, num_traps), dtype=bool)
+        self.slowed = np.zeros((num_walkers, num_slow_zones), dtype=bool)
+        self.history_policy = history_policy
+        capacity = {"none": 0, "last": history_length, "full": FULL_HISTORY_CAPACITY}[history_policy]
+        self.history = np.zeros((num_walkers, capacity, dimension))
+        self.history_counts = np.zeros(num_walkers, dtype=np.int64)
+
+    def release(self, walkers) -> None:
+        """
+        Removes walkers from every trap and slow zone, e.g. when the simulation resets its walkers.
+
+        Parameters:
+            walkers (np.ndarray or slice): A bool mask, the indices or a slice of the rows of the walkers to release.
+        """
+        self.trapped[walkers] = False
+        self.slowed[walkers] = False
+
+    def record_history(self, row: int, location: tuple, count: int = 1) -> None:
+        """
+        Records a location in the history of a walker.
+
+        Parameters:
+            row (int): The row of the walker.
+            location (tuple): The location.
+            count (int): The number of times the location is recorded, e.g. for the steps of a resting walker.
+        """
+        if self.history_policy == "none" or count < 1:
+            return
+        recorded = self.history_counts[row]
+        if self.history_policy == "full" and recorded + count > self.history.shape[1]:
+            capacity = max(2 * self.history.shape[1], recorded + count)
+            grown = np.zeros((self.history.shape[0], capacity, self.history.shape[2]))
+            grown[:, :self.history.shape[1]] = self.history
+            self.history = grown
+        capacity = self.history.shape[1]
+        if count == 1:
+            self.history[row, recorded % capacity] = location
+        else:
+            self.history[row, (recorded + np.arange(min(count, capacity))) % capacity] = location
+        self.history_counts[row] = recorded + count
+
+    def last_locations(self, row: int, count: int = None) -> np.ndarray:
+        """
+        Returns the last recorded locations of a walker, oldest first.
+
+        Parameters:
+            row (int): The row of the walker.
+            count (int, optional): The number of locations, all kept locations if not provided.
+
+        Returns:
+            np.ndarray: The locations, of shape (locations, dimension).
+        """
+        kept = int(min(self.history_counts[row], self.history.shape[1]))
+        count = kept if count is None else min(count, kept)
+        end = int(self.history_counts[row])
+        columns = np.arange(end - count, end)
+        return self.history[row, columns % self.history.shape[1]] if self.history.shape[1] else self.history[row, :0]
+
+    def trails(self, count: int) -> np.ndarray:
+        """
+        Returns the last recorded locations of every walker, oldest first, e.g. for drawing their trails.
+
+        Parameters:
+            count (int): The number of locations of every walker.
+
+        Returns:
+            np.ndarray: The locations, of shape (walkers, count, dimension), padded at the start with nan for the
+            walkers with fewer kept locations.
+        """
+        trails = np.full((self.history.shape[0], count, self.history.shape[2]), np.nan)
+        for row in range(self.history.shape[0]):
+            locations = self.last_locations(row, count)
+            if len(locations):
+                trails[row, count - len(locations):] = locations
+        return trails